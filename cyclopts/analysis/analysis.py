@@ -20,6 +20,7 @@ import cyclopts.cyclopts_io as cycio
 import cyclopts.io_tools as io_tools
 import cyclopts.tools as tools
 from cyclopts.functionals import rms
+from cyclopts.exchange_family import dense_flows
 
 def find(a, predicate, chunk_size=1024):
     """
@@ -1174,9 +1175,12 @@ def flow_rms(fname, id_tree, species_name):
     with t.open_file(fname, mode='r') as f:
         for pid, pst in subtrees(id_tree):
             for iid, ist in subtrees(pst):
-                cprefs = f.get_node(cpath + '/' + convert(iid)).col('pref_c')
+                cprefs = cycio.get_node(
+                    f, cpath + '/' + convert(iid)).col('pref_c')
                 for sid, solver in subtrees(ist):
-                    flows = f.get_node(fpath + '/' + convert(sid)).col('flow')
+                    flows = dense_flows(
+                        cycio.get_node(f, fpath + '/' + convert(sid)), 
+                        len(cprefs))
                     ret['flows'][solver][i] = rms(flows)
                     ret['cflows'][solver][i] = rms(cprefs * flows)
                 i += 1
@@ -1209,9 +1213,12 @@ def flow_rms_diff(fname, id_tree, species_name, base_solver='cbc'):
     with t.open_file(fname, mode='r') as f:
         for pid, pst in subtrees(id_tree):
             for iid, ist in subtrees(pst):
-                cprefs = f.get_node(cpath + '/' + convert(iid)).col('pref_c')
+                cprefs = cycio.get_node(
+                    f, cpath + '/' + convert(iid)).col('pref_c')
                 flows = {
-                    solver: f.get_node(fpath + '/' + convert(sid)).col('flow') \
+                    solver: dense_flows(
+                        cycio.get_node(f, fpath + '/' + convert(sid)), 
+                        len(cprefs)) \
                         for sid, solver in subtrees(ist)}
                 for solver in solvers:
                     diff = flows[base_solver] - flows[solver]
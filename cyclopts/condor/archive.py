@@ -0,0 +1,188 @@
+"""This module defines the archive codecs used to bundle files that are sent to
+and retrieved from a condor submit node. Archives are tarballs that are either
+stored as is, compressed with gzip (by Python or by a multi-threaded pigz
+process, whose output is gzip-compatible), or compressed with multi-threaded
+zstd. HDF5 databases are already compressed, so storing them is often fastest.
+
+Archives are written as a stream, i.e., generated files are added from memory
+and need not be staged in a directory.
+
+:author: Matthew Gidden <matthew.gidden _at_ gmail.com>
+"""
+from __future__ import print_function
+
+import os
+import io
+import time
+import shutil
+import tarfile
+import tempfile
+import subprocess
+import multiprocessing as mp
+from collections import namedtuple
+from distutils.spawn import find_executable
+
+"""An archive codec: its file extension, the local compression program (None
+if compressed by the tarfile module), and the options given to a remote tar to
+create or extract an archive"""
+Codec = namedtuple('Codec', ['ext', 'program', 'create', 'extract'])
+
+codecs = {
+    'none': Codec('.tar', None, '', ''),
+    'gzip': Codec('.tar.gz', None, '-z', '-z'),
+    'pigz': Codec('.tar.gz', ['pigz', '-p', '{threads}', '-c'],
+                  '--use-compress-program=pigz', '-z'),
+    'zstd': Codec('.tar.zst', ['zstd', '-T{threads}', '-q', '-c'],
+                  '--use-compress-program=zstd',
+                  '--use-compress-program=zstd'),
+    }
+
+def available(codec):
+    """Returns whether a codec's compression program is available locally."""
+    program = codecs[codec].program
+    return program is None or find_executable(program[0]) is not None
+
+def _codec(codec):
+    if codec not in codecs:
+        raise ValueError('Unknown archive codec {0}, expected one of {1}'.format(
+                codec, ', '.join(sorted(codecs))))
+    if not available(codec):
+        raise ValueError('The {0} archive codec requires {1}, which was not '
+                         'found'.format(codec, codecs[codec].program[0]))
+    return codecs[codec]
+
+def archive_name(base, codec='gzip'):
+    """Returns the name of an archive of a base name using a codec."""
+    return base + codecs[codec].ext
+
+def strip_ext(fname):
+    """Returns an archive's name without its extension."""
+    for ext in sorted(set(c.ext for c in codecs.values()), key=len,
+                      reverse=True):
+        if fname.endswith(ext):
+            return fname[:-len(ext)]
+    return fname
+
+class ArchiveWriter(object):
+    """Writes a tarball using an archive codec. Files are added either from
+    disk or from memory. The archive is complete once it is closed.
+    """
+
+    def __init__(self, fname, codec='gzip', threads=None):
+        """Parameters
+        ----------
+        fname : str
+            the archive file name
+        codec : str, optional
+            the archive codec, one of none, gzip, pigz, or zstd
+        threads : int, optional
+            the number of compression threads for pigz and zstd, by default one
+            per core
+        """
+        c = _codec(codec)
+        self.fname = fname
+        self._out, self._proc = None, None
+        if c.program is None:
+            self.tar = tarfile.open(fname, 'w:gz' if codec == 'gzip' else 'w')
+        else:
+            threads = threads if threads is not None else mp.cpu_count()
+            cmd = [x.format(threads=threads) for x in c.program]
+            self._out = io.open(fname, 'wb')
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                          stdout=self._out)
+            self.tar = tarfile.open(fileobj=self._proc.stdin, mode='w|')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, path, arcname):
+        """Adds a file on disk to the archive."""
+        self.tar.add(path, arcname=arcname)
+
+    def add_bytes(self, arcname, data, mode=0o644):
+        """Adds a file with the given content (bytes or text) to the
+        archive."""
+        data = data if isinstance(data, bytes) else data.encode('utf-8')
+        info = tarfile.TarInfo(arcname)
+        info.size = len(data)
+        info.mode = mode
+        info.mtime = time.time()
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        """Finishes writing the archive."""
+        if self.tar.closed:
+            return
+        self.tar.close()
+        if self._proc is not None:
+            self._proc.stdin.close()
+            rtn = self._proc.wait()
+            self._out.close()
+            if rtn != 0:
+                raise IOError('Compressing {0} failed with return code '
+                              '{1}'.format(self.fname, rtn))
+
+def readable(fname):
+    """Returns the name of a tarball readable by the tarfile module given an
+    archive, decompressing zstd archives (which must be removed by the caller)
+    next to it."""
+    if not fname.endswith(codecs['zstd'].ext):
+        return fname
+    _codec('zstd')
+    tarname = strip_ext(fname) + codecs['none'].ext
+    subprocess.check_call(['zstd', '-d', '-q', '-f', fname, '-o', tarname])
+    return tarname
+
+def benchmark(files, names=None, threads=None, bandwidth=None,
+              verbose=False):
+    """Times creating an archive of files with each available codec.
+
+    Parameters
+    ----------
+    files : list of str
+        the files to archive
+    names : list of str, optional
+        the codecs to benchmark, by default all that are available
+    threads : int, optional
+        the number of compression threads for pigz and zstd
+    bandwidth : float, optional
+        the upload bandwidth in MB/s, if given the time to transfer each
+        archive is included in the time until it is uploaded
+    verbose : bool, optional
+        whether to print each result
+
+    Returns
+    -------
+    results : list of tuples
+        a (codec, seconds to create, archive size in bytes, seconds until
+        uploaded) tuple for each codec, fastest to upload first
+    """
+    names = names if names is not None else \
+        [c for c in sorted(codecs) if available(c)]
+    nbytes = sum(os.path.getsize(f) for f in files)
+    tmpdir = tempfile.mkdtemp(prefix='cyclopts-archive-')
+    results = []
+    try:
+        for codec in names:
+            fname = os.path.join(tmpdir, archive_name('bench', codec))
+            start = time.time()
+            with ArchiveWriter(fname, codec=codec, threads=threads) as w:
+                for f in files:
+                    w.add(f, os.path.basename(f))
+            dt = time.time() - start
+            size = os.path.getsize(fname)
+            ready = dt + size / (bandwidth * 1e6) if bandwidth is not None \
+                else dt
+            results.append((codec, dt, size, ready))
+            os.remove(fname)
+            if verbose:
+                print(("{0}: archived {1:.1f} MB in {2:.2f} s ({3:.1f} MB/s), "
+                       "ratio {4:.2f}, upload-ready in {5:.2f} s").format(
+                        codec, nbytes / 1e6, dt, nbytes / 1e6 / max(dt, 1e-9),
+                        float(size) / max(nbytes, 1), ready))
+    finally:
+        shutil.rmtree(tmpdir)
+    return sorted(results, key=lambda x: x[3])
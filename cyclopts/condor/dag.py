@@ -5,17 +5,22 @@
 from __future__ import print_function
 
 import os
-import io
 import paramiko as pm
-import glob
-import tarfile
-import shutil
 import uuid
+import shutil
+import tempfile
 
 from cyclopts import tools
-from cyclopts.condor.utils import exec_remote_cmd, batlab_base_dir_template
+from cyclopts.condor import archive
+from cyclopts.condor.utils import exec_remote_cmd, batlab_base_dir_template, \
+    upload_cached
+from cyclopts.condor.telemetry import dag_items_file, dag_item_cols
+from cyclopts.scheduling import default_memory
 
-job_template = u"""JOB J_{0} {0}.sub"""
+job_template = u"""JOB J_0 {0}"""
+
+"""the submit description of all jobs in a DAG run"""
+jobs_subfile = 'jobs.sub'
 
 # This submission file template includes a condor execute node requirement
 # called ForGidden. This requirement is used to target nonhyperthreaded cores in
@@ -23,23 +28,28 @@ job_template = u"""JOB J_{0} {0}.sub"""
 # future, if this tool is used by others, ForGidden should be changed on the
 # Condor side to ForCyclopts, ForTimeMeasurement, or an equivalent, and this
 # template should be updated. Contact chtc@cs.wisc.edu to do so.
+#
+# A job is queued for each line of the item list, whose last variable, instids,
+# takes the remainder of the line.
 sub_template = u"""
 universe = vanilla
 executable = run.sh
-arguments = "'{id}_out.h5' '{instids}'"
-output = {id}.out
-error = {id}.err
-log = {id}.log
+arguments = "'$(id)_out.h5' '$(instids)' '$(db)'"
+output = $(id).out
+error = $(id).err
+log = $(id).log
 requirements = (OpSysAndVer =?= "SL6") && Arch == "X86_64" && ( ForGidden == true )
 should_transfer_files = YES
 when_to_transfer_output = ON_EXIT
-transfer_input_files = {homedir}/cde-cyclopts-exec.tar.gz, {homedir}/CDE.tar.gz, {db}
-request_cpus = 1
-#request_memory = 2500
+transfer_input_files = {homedir}/cde-cyclopts-exec.tar.gz, {homedir}/CDE.tar.gz, $(dbpath)
+request_cpus = 1{memory}
 #request_disk = 10242880
-notification = never
+notification = never{max_time}
+queue {cols}, instids from {items}
 """
 
+item_template = u"""{id} {db} {dbpath} {memory} {maxtime} {instids}\n"""
+
 run_template = u"""#!/bin/bash
 pwd=$PWD
 ls -l
@@ -49,11 +59,11 @@ tar -xf cde-cyclopts-exec.tar.gz
 export PATH=$pwd/CDE/:$PATH
 ls -l
 
-mv {db} cde-package/cde-root
+mv $3 cde-package/cde-root
 cd cde-package/cde-root
 sed -i 's/..\/cde-exec/cde-exec/g' ../cyclopts.cde
 ls -l
-../cyclopts.cde exec --db {db} --solvers {solvers} \
+../cyclopts.cde exec --db $3 --solvers {solvers} \
 --solvers {solvers} --family_module {module} --family_class {cname} \
 --outdb $1 --instids $2
 mv $1 $pwd
@@ -64,48 +74,70 @@ ls -l
 
 submit_cmd = """
 mkdir -p {remotedir} && cd {remotedir} &&
-tar -xf {tarfile} && rm {tarfile} && cd {cddir} && 
+tar {tarflags} -xf {tarfile} && rm {tarfile} && cd {cddir} && 
 condor_submit_dag -maxidle 1000 {submit};
 """
 
-def _gen_files(prepdir, dbname, instids, module, cname, solvers, 
-               remotehome, subfile="dag.sub", max_time=None, verbose=False):
+def _gen_files(dbname, instids, module, cname, solvers, remotehome, 
+               subfile="dag.sub", max_time=None, dbnames=None, dbpath=None, 
+               memory=None, walltime=None, verbose=False):
     """Generates all files needed to run a DAGMan instance of the given input
-    database.
+    database. Each entry of instids is either a single instid or a collection
+    of instids to run in the same job. If dbnames are given, each job uses its
+    own input database rather than dbname. If a dbpath is given, jobs transfer
+    the input database from it (e.g., from the upload cache) rather than from
+    the run directory. If memory (in MB) or walltime (in seconds) is given for
+    each job, it is requested for that job, otherwise no memory is requested
+    and max_time is used. Jobs running for longer than their walltime are
+    held.
+
+    All jobs share a single submit description and are queued from an item
+    list with a line per job, so the number of files generated does not depend
+    on the number of jobs.
+
+    Returns
+    -------
+    files : list of tuples
+        the name, content, and mode of each file
     """    
     if verbose:
-        print("generating files for {0} runs".format(len(instids)))
+        print("generating files for {0} jobs".format(len(instids)))
+
+    # item list
+    items = []
+    for i in range(len(instids)):
+        ids = instids[i] if isinstance(instids[i], basestring) \
+            else " ".join(instids[i])
+        db = dbnames[i] if dbnames is not None else dbname
+        path = dbpath if dbpath is not None and dbnames is None else db
+        mem = memory[i] if memory is not None else default_memory
+        maxtime = walltime[i] if walltime is not None else max_time
+        items.append(item_template.format(id=i, db=db, dbpath=path, 
+                                          memory=mem, maxtime=maxtime, 
+                                          instids=ids))
 
-    # dag submit files
+    # submit description
     max_time_line = ("\nperiodic_hold = (JobStatus == 2) && "
                      "((CurrentTime - EnteredCurrentStatus) > "
-                     "({0}))").format(max_time) if max_time is not None \
-                     else ""
-    lines = ""
-    nfiles = len(instids)
-    for i in range(len(instids)):
-        subname = os.path.join(prepdir, "{0}.sub".format(i))
-        with io.open(subname, 'w') as f:
-            sublines = sub_template.format(id=i, instids=instids[i], db=dbname,
-                                           homedir=remotehome)
-            sublines += max_time_line + '\nqueue'
-            f.write(sublines)
-        lines += job_template.format(i) + '\n'
-    dagfile = os.path.join(prepdir, subfile)
-    nfiles += 1
-    with io.open(dagfile, 'w') as f:
-        f.write(lines)
-        
+                     "($(maxtime)))") if max_time is not None or \
+                     walltime is not None else ""
+    memory_line = "\nrequest_memory = $(memory)" if memory is not None \
+        else ""
+    sub = sub_template.format(homedir=remotehome, max_time=max_time_line, 
+                              memory=memory_line, 
+                              items=dag_items_file, 
+                              cols=", ".join(dag_item_cols))
+    
     # run script
-    runfile = os.path.join(prepdir, "run.sh")
-    nfiles += 1 
-    with io.open(runfile, 'w') as f:
-        f.write(run_template.format(db=dbname, module=module, cname=cname,
-                                    solvers=" ".join(solvers)))
+    run = run_template.format(module=module, cname=cname, 
+                              solvers=" ".join(solvers))
     
-    return nfiles
+    return [(dag_items_file, u"".join(items), 0o644), 
+            (jobs_subfile, sub, 0o644),
+            (subfile, job_template.format(jobs_subfile) + u'\n', 0o644),
+            ("run.sh", run, 0o755)]
 
-def _submit(client, remotedir, tarname, subfile="dag.sub", 
+def _submit(client, remotedir, tarname, subfile="dag.sub", codec='gzip', 
                 verbose=False):
     """Performs a condor DAG sumbission on a client using a tarball of all
     submission-related data.
@@ -120,6 +152,8 @@ def _submit(client, remotedir, tarname, subfile="dag.sub",
         the name of the tarfile
     subfile : str, optional
         the name of the submit file
+    codec : str, optional
+        the archive codec of the tarfile
     verbose : bool, optional
         whether to print information regarding the submission process    
     """
@@ -137,9 +171,10 @@ def _submit(client, remotedir, tarname, subfile="dag.sub",
         raise IOError(
             'Could not find {0} on the submit node.'.format(remotedir))
     
-    cddir = tarname.split(".tar.gz")[0]
-    cmd = submit_cmd.format(tarfile=tarname, cddir=cddir, 
-                            submit=subfile, remotedir=remotedir)
+    cddir = archive.strip_ext(tarname)
+    cmd = submit_cmd.format(tarfile=tarname, cddir=cddir, submit=subfile, 
+                            remotedir=remotedir, 
+                            tarflags=archive.codecs[codec].extract)
     stdin, stdout, stderr = exec_remote_cmd(client, cmd, verbose=verbose)
     
     checkfile = '/'.join([remotedir, cddir, subfile + '.dagman.out'])
@@ -149,39 +184,57 @@ def _submit(client, remotedir, tarname, subfile="dag.sub",
     return pid
 
 def gen_tar(rundir, db, instids, module, cname, solvers, 
-            user="gidden", verbose=False):
-    prepdir = '.tmp_{0}'.format(rundir)
-    if not os.path.exists(prepdir):
-        os.makedirs(prepdir)
-    else:
-        raise IOError("File preparation directory {0} already exists".format(
-                prepdir))
-    
+            user="gidden", subset=True, dbpath=None, codec='gzip', 
+            memory=None, walltime=None, verbose=False):
+    """Generates a tarball of all files needed to run a DAGMan instance. If
+    subsetting, each job is given an input database with only the data of its
+    instances, otherwise all jobs are given the full input database. If not
+    subsetting and a remote dbpath of the full input database is given, the
+    database is not included in the tarball. Files are streamed into the
+    tarball, which is compressed with the given archive codec. The memory and
+    walltime of each job may be given, see _gen_files()."""
     max_time = 60 * 60 * 5 # 5 hours
     remotehome = batlab_base_dir_template.format(user=user)
-    nfiles = _gen_files(prepdir, os.path.basename(db), instids, module, cname, 
-                        solvers, remotehome, max_time=max_time, verbose=verbose)
-    
-    subfiles = glob.iglob(os.path.join(prepdir, '*.sub'))
-    shfiles = glob.iglob(os.path.join(prepdir, '*.sh'))
+    dbnames = None
+    if subset:
+        dbnames = ['{0}_in.h5'.format(i) for i in range(len(instids))]
+    files = _gen_files(os.path.basename(db), instids, module, cname, solvers, 
+                       remotehome, max_time=max_time, dbnames=dbnames, 
+                       dbpath=dbpath, memory=memory, walltime=walltime, 
+                       verbose=verbose)
 
-    nfiles += 1 # add db
+    tarname = archive.archive_name(rundir, codec)
+    arcname = lambda x: "{0}/{1}".format(rundir, x)
+    with archive.ArchiveWriter(tarname, codec=codec) as tar:
+        for name, content, mode in files:
+            tar.add_bytes(arcname(name), content, mode=mode)
+        if subset:
+            # each job database is added and removed as soon as it is written
+            tmpdir = tempfile.mkdtemp(prefix='cyclopts-subset-')
+            try:
+                for name, ids in zip(dbnames, instids):
+                    ids = [ids] if isinstance(ids, basestring) else ids
+                    tmp = os.path.join(tmpdir, name)
+                    tools.subset_db(db, [uuid.UUID(x) for x in ids], tmp)
+                    tar.add(tmp, arcname(name))
+                    os.remove(tmp)
+            finally:
+                shutil.rmtree(tmpdir)
+            if verbose:
+                print("subset {0} into {1} job databases".format(
+                        db, len(dbnames)))
+        elif dbpath is None:
+            tar.add(db, arcname(os.path.basename(db)))
     if verbose:
-        print("tarring {0} files".format(nfiles))
-    tarname = "{0}.tar.gz".format(rundir)
-    with tarfile.open(tarname, 'w:gz') as tar:
-        tar.add(db, arcname="{0}/{1}".format(rundir, os.path.basename(db)))
-        for f in subfiles:
-            basename = os.path.basename(f)
-            tar.add(f, arcname="{0}/{1}".format(rundir, basename))
-        for f in shfiles:
-            basename = os.path.basename(f)
-            tar.add(f, arcname="{0}/{1}".format(rundir, basename))
-    shutil.rmtree(prepdir)
+        print("archived {0} files into {1}".format(
+                len(files) + (len(dbnames) if subset else int(dbpath is None)), 
+                tarname))
     return tarname
 
 def submit(user, db, instids, module, cname, solvers, remotedir, 
-           host="submit-3.chtc.wisc.edu", keyfile=None, verbose=False):
+           host="submit-3.chtc.wisc.edu", keyfile=None, subset=True, 
+           cache=True, codec='gzip', memory=None, walltime=None, 
+           verbose=False):
     """Connects via SSH to a condor submit node, and executes a Cyclopts DAG
     run.
     
@@ -191,8 +244,9 @@ def submit(user, db, instids, module, cname, solvers, remotedir,
         the user on the condor submit host
     db : str
         the problem instance database
-    instids : set
-        the set of instances to run
+    instids : list
+        the instances to run, each entry is either an instid or a list of
+        instids to run in a single job
     module : str
         the ProblemFamily module
     cname : str
@@ -206,23 +260,32 @@ def submit(user, db, instids, module, cname, solvers, remotedir,
         the condor submit host
     keyfile : str, optional
         the public key file    
+    subset : bool, optional
+        whether to give each job a database with only its instances' data
+    cache : bool, optional
+        whether to upload the full input database to the remote upload cache
+        rather than with the submission, if not subsetting
+    codec : str, optional
+        the archive codec of the submission tarball
+    memory : list of int, optional
+        the memory (MB) to request for each job
+    walltime : list of int, optional
+        the walltime (s) after which each job is held
     verbose : bool, optional
         whether to print information regarding the submission process    
     """
-    client = pm.SSHClient()
-    client.set_missing_host_key_policy(pm.AutoAddPolicy())
-    _, keyfile, pw = tools.ssh_test_connect(client, host, user, keyfile, auth=True)
+    client = tools.ssh_sessions.client(host, user, keyfile=keyfile)
 
+    dbpath = None
+    if cache and not subset:
+        dbpath = upload_cached(db, user, host=host, keyfile=keyfile, 
+                               verbose=verbose)
     localtar = gen_tar(remotedir, db, instids, module, cname, solvers, user, 
-                       verbose=verbose)
+                       subset=subset, dbpath=dbpath, codec=codec, 
+                       memory=memory, walltime=walltime, verbose=verbose)
 
-    if verbose:
-        print("connecting to {0}@{1}".format(user, host))
-    client.connect(host, username=user, key_filename=keyfile, password=pw)
-    
     pid = _submit(client, tools.cyclopts_remote_run_dir, localtar, 
-                      verbose=verbose)
-    client.close()
+                      codec=codec, verbose=verbose)
     if verbose:
         print("Submitted job in {0}@{1}:~/cyclopts-runs/{2} with pid: {3}".format(
                 user, host, remotedir, pid)) 
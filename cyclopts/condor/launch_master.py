@@ -4,11 +4,24 @@ import operator
 import os
 import sys
 import subprocess
-import work_queue as wq
 import io
 import time
 import re
 import math
+import functools
+import warnings
+
+try:
+    import work_queue as wq
+except ImportError:
+    warnings.warn(("The Work Queue master was not able to import work_queue"), 
+                  ImportWarning)
+
+"""the memory (MB) and cores of an execute node"""
+node_memory, node_cores = 125 * 1e3, 16
+
+"""the memory (MB) of a worker by default, i.e., an even split of a node"""
+default_memory = int(math.floor(node_memory / node_cores))
 
 mv_sh = u"""#!/bin/bash
 echo "pwd: $PWD"
@@ -150,6 +163,11 @@ def assign_workers_new(open_cores, n_tasks=1, n_threads=16, use_max_threads=True
         open_cores[node] -= 1
     return dict((k, v) for k, v in workers.iteritems() if v > 0)
 
+def workers_per_node(memory):
+    """returns the number of workers with the given memory (MB) whose total
+    memory does not exceed that of a node, but at least one"""
+    return max(1, min(node_cores, int(node_memory // memory)))
+
 def _start_workers(node, n, port, memory=None):
     cmd_pre = ("""condor_submit_workers -t 600 --cores 1""")
     cmd_post = ("""{machine}.chtc.wisc.edu {port} {n}""") # machine is the submit node
@@ -174,7 +192,7 @@ def start_workers(pids, worker_nodes, port, memory=None, timeout=5):
     nodes = dict((pid, node) for node, pid in pids.iteritems())
     pids = set(pids.values())
     if memory is None:
-        memory = int(math.floor(125 * 1e3 / 16.0)) # 125 GB per 16 cores (in Mbs)
+        memory = default_memory
     while not done:
         cmd = 'condor_q {0}'.format(" ".join(pids))
         out = condor_cmd(cmd)
@@ -235,38 +253,205 @@ def exec_rm(nodes):
         pids[node] = lines[1].split('cluster')[1].split('.')[0].strip()    
     return pids
 
-def start_queue(q, n_tasks, idgen, indb, bring_files, memory=None):
+def make_task(cmd, instid, outdb, bring_files, memory):
+    t = wq.Task(cmd)
+    t.specify_tag(instid)
+    t.specify_cores(1) # 1 core
+    t.specify_memory(memory)
+    f = bring_files['cyclopts_tar']
+    t.specify_input_file(f, os.path.basename(f), cache=True)
+    f = bring_files['cde_tar']
+    t.specify_input_file(f, os.path.basename(f), cache=True)
+    f = bring_files['run_file']
+    t.specify_input_file(f, os.path.basename(f), cache=False)
+    t.specify_output_file(outdb, outdb, cache=False)
+    return t
+
+def start_queue(q, n_tasks, idgen, indb, bring_files, memory=None, 
+                stragglers=None, make=make_task, memories=None):
     runfile = bring_files['run_file']
     exec_cmd = """./{runfile} {outdb} {uuid} {indb}"""
     if memory is None:
-        memory = int(math.floor(125 * 1e3 / 16.0)) # 125 GB per 16 cores (in Mbs)
+        memory = default_memory
     for i in range(n_tasks):
         outdb = '{0}_out.h5'.format(i)
-        cmd = exec_cmd.format(runfile=runfile, indb=indb, uuid=idgen.next().strip(), outdb=outdb)
-        t = wq.Task(cmd)
-        t.specify_cores(1) # 1 core
-        t.specify_memory(memory)
-        f = bring_files['cyclopts_tar']
-        t.specify_input_file(f, os.path.basename(f), cache=True)
-        f = bring_files['cde_tar']
-        t.specify_input_file(f, os.path.basename(f), cache=True)
-        f = runfile
-        t.specify_input_file(f, os.path.basename(f), cache=False)
-        t.specify_output_file(outdb, outdb, cache=False)
-        q.submit(t)
+        instid = idgen.next().strip()
+        mem = memory if memories is None else \
+            int(math.ceil(memories.get(instid, memory)))
+        factory = functools.partial(make_copy, make, exec_cmd, runfile, indb, 
+                                    instid, bring_files, mem)
+        if stragglers is None:
+            q.submit(factory(outdb))
+        else:
+            stragglers.submit(q, factory, outdb)
+
+def make_copy(make, exec_cmd, runfile, indb, instid, bring_files, memory, 
+              outdb):
+    """makes a task that writes to the given output database"""
+    cmd = exec_cmd.format(runfile=runfile, indb=indb, uuid=instid, outdb=outdb)
+    return make(cmd, instid, outdb, bring_files, memory)
+
+def usec(x):
+    """converts a work queue time stamp in microseconds to seconds"""
+    return float(x) / 1e6 if x else float('nan')
+
+def median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    return xs[n / 2] if n % 2 == 1 else (xs[n / 2 - 1] + xs[n / 2]) / 2.0
+
+def read_values(fname):
+    """reads a file of whitespace separated instid, value lines (e.g., the
+    predicted cost or memory of an instance)"""
+    values = {}
+    with io.open(fname) as f:
+        for line in f:
+            if len(line.split()) == 2:
+                instid, value = line.split()
+                values[instid] = float(value)
+    return values
+
+class Stragglers(object):
+    """Tracks the runtime of tasks and speculatively resubmits stragglers,
+    i.e., tasks that have been running for more than factor times their
+    expected runtime, to idle workers once no tasks are waiting. A task's
+    expected runtime is the median runtime per unit of predicted cost of all
+    successfully completed tasks times its predicted cost (or the median
+    runtime if costs are not known). The first copy of a task to finish is kept
+    and all other copies are cancelled. Each copy writes to its own output
+    database, the kept copy's is renamed to the task's output database and the
+    others are removed.
+    """
     
-def finish_queue(q):
+    def __init__(self, costs=None, factor=3.0, min_done=10, max_copies=2, 
+                 clock=time.time):
+        self.costs = costs if costs is not None else {}
+        self.factor = factor
+        self.min_done = min_done
+        self.max_copies = max_copies
+        self.clock = clock
+        self.running = {} # task id -> task
+        self.copies = {} # tag -> task ids
+        self.factories = {} # tag -> task factory
+        self.outdbs = {} # tag -> output database
+        self.copy_outdbs = {} # task id -> output database of the copy
+        self.n_copies = {} # output database -> copies submitted
+        self.done = set() # tags
+        self.rates = [] # runtime per unit cost
+        self.n_spec = 0
+
+    def submit(self, q, factory, outdb):
+        """submits a copy of a task, made by factory(copy_outdb), and returns
+        it"""
+        root, ext = os.path.splitext(outdb)
+        n = self.n_copies.get(outdb, 0)
+        self.n_copies[outdb] = n + 1
+        copy_outdb = '{0}_{1}{2}'.format(root, n, ext)
+        t = factory(copy_outdb)
+        q.submit(t)
+        self.running[t.id] = t
+        self.copies.setdefault(t.tag, set()).add(t.id)
+        self.factories[t.tag] = factory
+        self.outdbs[t.tag] = outdb
+        self.copy_outdbs[t.id] = copy_outdb
+        return t
+
+    def expected(self, tag):
+        """returns the expected runtime of a task, or None if too few tasks have
+        completed"""
+        if len(self.rates) < self.min_done:
+            return None
+        return median(self.rates) * self.costs.get(tag, 1.0)
+
+    def resubmit(self, q):
+        """resubmits stragglers to idle workers and returns the new tasks"""
+        idle = getattr(q.stats, 'workers_idle', 0)
+        if q.stats.tasks_waiting > 0 or idle <= 0:
+            return []
+        now = self.clock()
+        new = []
+        for tid, t in sorted(self.running.items()):
+            if idle <= 0:
+                break
+            if len(self.copies[t.tag]) >= self.max_copies:
+                continue
+            start = usec(getattr(t, 'send_input_start', 0))
+            expected = self.expected(t.tag)
+            if math.isnan(start) or expected is None or \
+                    now - start <= self.factor * expected:
+                continue
+            print "task (id# {0}) has run for {1:.0f} s, {2:.0f} s are expected, resubmitting it".format(
+                tid, now - start, expected)
+            copy = self.submit(q, self.factories[t.tag], self.outdbs[t.tag])
+            self.n_spec += 1
+            idle -= 1
+            new.append(copy)
+        return new
+
+    def complete(self, q, t):
+        """records a returned task and returns whether it is the copy of its
+        task to keep, all other copies are cancelled if so"""
+        self.running.pop(t.id, None)
+        copies = self.copies.get(t.tag, set())
+        copies.discard(t.id)
+        copy_outdb = self.copy_outdbs.pop(t.id, None)
+        if t.tag in self.done or (t.return_status != 0 and len(copies) > 0):
+            # a losing copy, or a failed one while other copies run
+            if copy_outdb is not None and os.path.exists(copy_outdb):
+                os.remove(copy_outdb)
+            return False
+        self.done.add(t.tag)
+        if copy_outdb is not None and os.path.exists(copy_outdb):
+            os.rename(copy_outdb, self.outdbs[t.tag])
+        if t.return_status == 0:
+            runtime = usec(getattr(t, 'finish_time', 0)) - \
+                usec(getattr(t, 'send_input_start', 0))
+            if not math.isnan(runtime):
+                self.rates.append(runtime / self.costs.get(t.tag, 1.0))
+        for tid in copies:
+            print "cancelling task (id# {0}), a copy has completed".format(tid)
+            q.cancel_by_taskid(tid)
+            self.running.pop(tid, None)
+        copies.clear()
+        return True
+
+jobs_header = u"# id host submit start end memory exit instid\n"
+
+def task_line(t):
+    """returns a line of telemetry for a completed task, times are in seconds
+    since the epoch and memory is in MB"""
+    measured = getattr(t, 'resources_measured', None)
+    mem = getattr(measured, 'memory', None)
+    mem = float(mem) if mem is not None and mem >= 0 else float('nan')
+    return u"{0} {1} {2} {3} {4} {5} {6} {7}\n".format(
+        t.id, t.hostname or 'unknown', usec(getattr(t, 'submit_time', 0)), 
+        usec(getattr(t, 'send_input_start', 0)), 
+        usec(getattr(t, 'finish_time', 0)), mem, t.return_status, t.tag)
+
+def finish_queue(q, jobs_file='jobs', stragglers=None, timeout=5):
     print "waiting for tasks to complete..."
-    while not q.empty():
-      t = q.wait(5)
-      print "listening on port: {0}".format(q.port)
-      print "waiting on tasks, number: {0}".format(q.stats.tasks_waiting)
-      print "active workers: {0}".format(q.stats.total_workers_joined)
-      if t:
-          print "task (id# %d) on host %s complete: %s (return code %d)" % (t.id, t.hostname, t.command, t.return_status)
-          #print "task output: {0}".format(t.output)
-          if t.return_status != 0:
-            print "task failed: {0}".format(t.result)      
+    with io.open(jobs_file, 'w') as jobs:
+      jobs.write(jobs_header)
+      while not q.empty():
+        t = q.wait(timeout)
+        print "listening on port: {0}".format(q.port)
+        print "waiting on tasks, number: {0}".format(q.stats.tasks_waiting)
+        print "active workers: {0}".format(q.stats.total_workers_joined)
+        if t:
+            print "task (id# %d) on host %s complete: %s (return code %d)" % (t.id, t.hostname, t.command, t.return_status)
+            #print "task output: {0}".format(t.output)
+            if t.return_status != 0:
+              print "task failed: {0}".format(t.result)      
+            # only the kept copy of a speculatively resubmitted task is recorded
+            keep = stragglers.complete(q, t) if stragglers is not None \
+                else True
+            if keep:
+                jobs.write(task_line(t))
+                jobs.flush()
+        if stragglers is not None:
+            stragglers.resubmit(q)
+    if stragglers is not None:
+        print "{0} straggling tasks were resubmitted".format(stragglers.n_spec)
     print "all tasks complete!"
 
 def main():
@@ -289,11 +474,29 @@ def main():
     log = False if 'log' not in args.keys() else bool(args['log'])
     run_file = 'run.sh' if 'run_file' not in args.keys() else args['run_file']
     uuidfile = 'uuids' if 'uuids' not in args.keys() else args['uuids']
+    costfile = 'costs' if 'costs' not in args.keys() else args['costs']
+    memfile = 'memory' if 'memory_file' not in args.keys() else args['memory_file']
+    factor = 3.0 if 'straggler_factor' not in args.keys() \
+        else float(args['straggler_factor'])
     
     msg = 'logging output' if log else 'not logging output'
     print(msg)
     
     idgen = open(uuidfile)
+    costs = read_values(costfile) if os.path.exists(costfile) else None
+    memories = read_values(memfile) if os.path.exists(memfile) else None
+    if memories is not None and memory is None:
+        # workers must be large enough for any task, so fewer may fit on a node
+        memory = max(default_memory, int(math.ceil(max(memories.values()))))
+        print("Requesting between {0} and {1} MB of memory per task".format(
+                int(min(memories.values())), 
+                int(math.ceil(max(memories.values())))))
+    if memory is not None and memory > node_memory:
+        print("Tasks request up to {0} MB of memory, but nodes only have "
+              "{1} MB".format(memory, int(node_memory)))
+        memory = int(node_memory)
+    n_threads = node_cores if memory is None else workers_per_node(memory)
+    stragglers = Stragglers(costs=costs, factor=factor) if factor > 0 else None
     bring_files = {
         'run_file': run_file,
         'cyclopts_tar': '/home/gidden/cde-cyclopts-exec.tar.gz', 
@@ -302,7 +505,11 @@ def main():
 
     # get workers to launch  
     cores = open_cores(user, exec_nodes)
-    workers = assign_workers_new(cores, n_tasks=nids)
+    cores = dict((node, min(n, n_threads)) for node, n in cores.iteritems())
+    workers = assign_workers_new(cores, n_tasks=nids, n_threads=n_threads)
+    print("Starting at most {0} workers per node, each with {1} MB of "
+          "memory".format(n_threads, 
+                          memory if memory is not None else default_memory))
     if sum([n for _, n in workers.iteritems()]) == 0:
         raise ValueError("No available cores for workers were found")
     config = ", ".join(["{0}: {1}".format(node, n) for node, n in workers.iteritems()])
@@ -323,13 +530,14 @@ def main():
     if log:
         q.specify_log("queue.log")
         q.enable_monitoring("tasks.log");
-    start_queue(q, nids, idgen, '/'.join([indbpath, indb]), bring_files, memory=memory)
+    start_queue(q, nids, idgen, '/'.join([indbpath, indb]), bring_files, memory=memory, 
+                stragglers=stragglers, memories=memories)
 
     # wait till each mv is done and then launch its workers
     start_workers(pids, workers, port, memory=memory, timeout=timeout)    
 
     # wait till its done
-    finish_queue(q)
+    finish_queue(q, stragglers=stragglers)
 
     # tear down nodes with input    
     pids = exec_rm(workers.keys())    
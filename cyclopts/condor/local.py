@@ -0,0 +1,127 @@
+"""This module defines methods to run Cyclopts jobs in a local pool of worker
+processes, mirroring a condor submission. Each job executes `cyclopts exec` on
+a subset of instances, as run.sh does on an execute node, writing its own
+output database, and all output is combined when all jobs are complete.
+
+:author: Matthew Gidden <matthew.gidden _at_ gmail.com>
+"""
+from __future__ import print_function
+
+import os
+import io
+import time
+import subprocess
+import multiprocessing as mp
+from multiprocessing.pool import ThreadPool
+
+from cyclopts import tools
+
+def exec_args(db, outdb, instids, solvers, module, cname):
+    """Returns the arguments of a `cyclopts exec` command that runs instances,
+    given as a list so that paths may contain spaces."""
+    return ['cyclopts', 'exec', '--db', db, '--outdb', outdb, 
+            '--instids'] + list(instids) + ['--solvers'] + list(solvers) + \
+            ['--family_module', module, '--family_class', cname]
+
+def n_workers(n_tasks=1, ncores=None):
+    """Returns the number of workers to use given a number of tasks, one per
+    core.
+
+    Parameters
+    ----------
+    n_tasks : int, optional
+        the number of tasks
+    ncores : int, optional
+        the number of available cores, by default all cores
+    """
+    ncores = ncores if ncores is not None else mp.cpu_count()
+    return max(1, min(n_tasks, ncores))
+
+def _run(args):
+    """Runs a command (a list of arguments) in a directory, logging output to
+    files named by an id, and returns the id, return code, and execution
+    time."""
+    i, cmd, rundir = args
+    start = time.time()
+    with io.open(os.path.join(rundir, '{0}.out'.format(i)), 'wb') as out, \
+            io.open(os.path.join(rundir, '{0}.err'.format(i)), 'wb') as err:
+        rc = subprocess.call(cmd, stdout=out, stderr=err, cwd=rundir)
+    return i, rc, time.time() - start
+
+def submit(db, instids, module, cname, solvers, rundir,
+           outdb='cyclopts_results.h5', jobs=None, clean=True, verbose=False):
+    """Executes instances in a pool of local worker processes and combines their
+    output.
+
+    Parameters
+    ----------
+    db : str
+        the problem instance database
+    instids : list
+        the instances to run, each entry is either an instid or a list of
+        instids to run in a single job
+    module : str
+        the ProblemFamily module
+    cname : str
+        the ProblemFamily cname
+    solvers : list
+        the solvers to use
+    rundir : str
+        the directory in which job output is written
+    outdb : str, optional
+        the database into which all job output is combined, relative to the
+        run directory
+    jobs : int, optional
+        the number of worker processes, by default one per core
+    clean : bool, optional
+        whether to remove each job's output database once it is combined
+    verbose : bool, optional
+        whether to print information regarding the execution process
+
+    Returns
+    -------
+    failed : list of int
+        the ids of jobs that did not execute successfully
+    """
+    if not os.path.exists(rundir):
+        os.makedirs(rundir)
+    db = os.path.abspath(db)
+    cmds = []
+    for i, ids in enumerate(instids):
+        ids = [ids] if isinstance(ids, basestring) else ids
+        cmd = exec_args(db, '{0}_out.h5'.format(i), ids, solvers, module, 
+                        cname)
+        cmds.append((i, cmd, rundir))
+
+    nworkers = n_workers(len(cmds), jobs)
+    print("Executing {0} jobs with {1} local workers in {2}".format(
+            len(cmds), nworkers, rundir))
+    start = time.time()
+    failed = []
+    pool = ThreadPool(nworkers)
+    try:
+        for n, (i, rc, dt) in enumerate(pool.imap_unordered(_run, cmds)):
+            if rc != 0:
+                failed.append(i)
+                print("job {0} failed with return code {1}, see {0}.err".format(
+                        i, rc))
+            if verbose:
+                print("job {0} complete in {1:.2f} s, {2} of {3}".format(
+                        i, dt, n + 1, len(cmds)))
+    finally:
+        pool.close()
+        pool.join()
+    if verbose:
+        print("executed {0} jobs in {1:.2f} s".format(
+                len(cmds), time.time() - start))
+
+    # combine output in job order
+    files = [os.path.join(rundir, '{0}_out.h5'.format(i)) \
+                 for i in range(len(cmds))]
+    files = [f for f in files if os.path.exists(f)]
+    if len(files) > 0:
+        outdb = os.path.join(rundir, outdb)
+        print("Combining {0} databases into {1}".format(len(files), outdb))
+        tools.combine(iter(files), new_file=outdb, clean=clean,
+                      verbose=verbose)
+    return failed
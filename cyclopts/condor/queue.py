@@ -6,13 +6,11 @@ from __future__ import print_function
 
 import paramiko as pm
 import os
-import io
-import tarfile 
-import shutil 
-import stat
 
 from cyclopts import tools
-from cyclopts.condor.utils import exec_remote_cmd, batlab_base_dir_template
+from cyclopts.condor import archive
+from cyclopts.condor.utils import exec_remote_cmd, batlab_base_dir_template, \
+    upload_cached
 
 run_lines = u"""#!/bin/bash
 pwd=$PWD
@@ -71,56 +69,52 @@ ls -l
 """
 
 def gen_tar(remotedir, db, instids, module, cname, solvers, 
-            user="gidden", verbose=False):
-    prepdir = '.tmp_{0}'.format(remotedir)
-    if not os.path.exists(prepdir):
-        os.makedirs(prepdir)
-    else:
-        raise IOError("File preparation directory {0} already exists".format(
-                prepdir))
-    remotehome = batlab_base_dir_template.format(user=user)
-    
-    nfiles = 0
+            user="gidden", include_db=True, costs=None, codec='gzip', 
+            memory=None, verbose=False):
+    """Generates a tarball of all files needed to run a Work Queue instance.
+    Files are streamed into the tarball, which is compressed with the given
+    archive codec. If given, the predicted costs and memory (MB) of instances
+    are included for the master."""
+    files = []
     runlines = run_lines.format(solvers=" ".join(solvers), module=module, 
                                 cname=cname)
-    runfile = os.path.join(prepdir, 'run.sh')
-    with io.open(runfile, mode='w') as f:
-        f.write(runlines)
     # chmod 775
-    os.chmod(runfile, stat.S_IRWXG | stat.S_IRWXU | stat.S_IXOTH | stat.S_IROTH)
-    nfiles += 1
-    idfile = os.path.join(prepdir, 'uuids')
-    with io.open(idfile, mode='w') as f:
-        for i in instids:
-            f.write(u'{0}\n'.format(i))
-    nfiles += 1
+    files.append(('run.sh', runlines, 0o775))
+    ids = u''.join(u'{0}\n'.format(i) for i in instids)
+    files.append(('uuids', ids, 0o644))
+    if costs is not None:
+        # predicted costs are used to detect straggling tasks
+        lines = u''.join(u'{0} {1}\n'.format(i, costs[i]) for i in instids)
+        files.append(('costs', lines, 0o644))
+    if memory is not None:
+        # memory is requested for each task
+        lines = u''.join(u'{0} {1}\n'.format(i, memory[i]) for i in instids)
+        files.append(('memory', lines, 0o644))
     base = os.path.dirname(os.path.abspath(__file__))
     mastername = 'launch_master.py'
     masterfile = os.path.join(base, mastername)
-    nfiles += 1
-    nfiles += 1 # add db
+    nfiles = len(files) + 1 + int(include_db)
     if verbose:
         print("tarring {0} files".format(nfiles))
-    tarname = "{0}.tar.gz".format(remotedir)
-    with tarfile.open(tarname, 'w:gz') as tar:
-        tar.add(db, arcname="{0}/{1}".format(remotedir, os.path.basename(db)))
-        tar.add(runfile, arcname="{0}/{1}".format(remotedir, 
-                                                  os.path.basename(runfile)))
-        tar.add(idfile, arcname="{0}/{1}".format(remotedir, 
-                                                  os.path.basename(idfile)))
-        tar.add(masterfile, arcname="{0}/{1}".format(remotedir, 
-                                                     os.path.basename(masterfile)))
-    shutil.rmtree(prepdir)
+    tarname = archive.archive_name(remotedir, codec)
+    arcname = lambda x: "{0}/{1}".format(remotedir, x)
+    with archive.ArchiveWriter(tarname, codec=codec) as tar:
+        if include_db:
+            tar.add(db, arcname(os.path.basename(db)))
+        for name, content, mode in files:
+            tar.add_bytes(arcname(name), content, mode=mode)
+        tar.add(masterfile, arcname(mastername))
     return tarname
 
 submit_cmd = """
 mkdir -p {remotedir} && cd {remotedir} &&
-tar -xf {tarfile} && rm {tarfile} && cd {cddir} && 
+tar {tarflags} -xf {tarfile} && rm {tarfile} && cd {cddir} && {link}
 nohup python -u launch_master.py port={port} user={user} nids={nids} indb={indb} nodes={nodes} --log={log} > launch_master.out 2>&1 &
 """
 
 def _submit(client, remotedir, tarname, nids, indb, log=False,
-            port='5422', user='gidden', nodes=None, verbose=False):
+            port='5422', user='gidden', nodes=None, dbpath=None, codec='gzip', 
+            verbose=False):
     """Performs a condor Work Queue sumbission on a client using a tarball of all
     submission-related data.
 
@@ -144,6 +138,11 @@ def _submit(client, remotedir, tarname, nids, indb, log=False,
         the user to run the jobs on
     nodes : list, optional
         a list of execute nodes prefixes (e.g., e121.chtc.wisc.edu -> e121)
+    dbpath : str, optional
+        the remote path of the input database if it is not in the tarball, it
+        is linked into the run directory
+    codec : str, optional
+        the archive codec of the tarfile
     verbose : bool, optional
         whether to print information regarding the submission process    
     """
@@ -163,12 +162,14 @@ def _submit(client, remotedir, tarname, nids, indb, log=False,
             ('Error transferring files to {0}: {1}.').format(remotedir, 
                                                              e.message))
     
-    cddir = tarname.split(".tar.gz")[0]
+    cddir = archive.strip_ext(tarname)
     
 
+    link = '' if dbpath is None else 'ln -sf {0} {1} &&'.format(dbpath, indb)
     cmd = submit_cmd.format(tarfile=tarname, cddir=cddir, 
                             remotedir=remotedir, port=port, user=user, 
-                            nids=nids, indb=indb, log=log, 
+                            nids=nids, indb=indb, log=log, link=link,
+                            tarflags=archive.codecs[codec].extract,
                             nodes=",".join(nodes))    
     print("Remotely executing '{0}'".format(cmd))
     stdin, stdout, stderr = client.exec_command(cmd)
@@ -177,7 +178,8 @@ def _submit(client, remotedir, tarname, nids, indb, log=False,
 def submit(user, db, instids, module, cname, solvers, remotedir, log=False,
            host="submit-3.chtc.wisc.edu", keyfile=None, 
            nodes=None,
-           port='5422', verbose=False):
+           port='5422', cache=True, costs=None, codec='gzip', memory=None, 
+           verbose=False):
     """Connects via SSH to a condor submit node, and executes a Cyclopts Work
     Queue run.
     
@@ -208,24 +210,30 @@ def submit(user, db, instids, module, cname, solvers, remotedir, log=False,
         a list of execute nodes prefixes (e.g., e121.chtc.wisc.edu -> e121)
     port : str, optional
         the port to use for master/worker communication    
+    cache : bool, optional
+        whether to upload the input database to the remote upload cache rather
+        than with the submission
+    costs : dict, optional
+        a mapping from instids to their predicted costs, used by the master to
+        detect straggling tasks
+    codec : str, optional
+        the archive codec of the submission tarball
+    memory : dict, optional
+        a mapping from instids to the memory (MB) to request for their tasks
     verbose : bool, optional
         whether to print information regarding the submission process    
     """
-    client = pm.SSHClient()
-    client.set_missing_host_key_policy(pm.AutoAddPolicy())
-    _, keyfile, pw = tools.ssh_test_connect(client, host, user, keyfile, auth=True)
+    client = tools.ssh_sessions.client(host, user, keyfile=keyfile)
     
+    dbpath = upload_cached(db, user, host=host, keyfile=keyfile, 
+                           verbose=verbose) if cache else None
     localtar = gen_tar(remotedir, db, instids, module, cname, solvers, user, 
-                       verbose=verbose)
+                       include_db=dbpath is None, costs=costs, codec=codec,
+                       memory=memory, verbose=verbose)
 
-    if verbose:
-        print("connecting to {0}@{1}".format(user, host))
-    client.connect(host, username=user, key_filename=keyfile, password=pw)
-    
     rtn = _submit(client, tools.cyclopts_remote_run_dir, localtar, 
                   len(instids), os.path.basename(db), log=log, nodes=nodes,
-                  port=port, verbose=verbose)
-    client.close()
+                  port=port, dbpath=dbpath, codec=codec, verbose=verbose)
     if verbose:
         print("Submitted job in {0}@{1}:~/cyclopts-runs/{2} with exit "
               "code: {rtn}".format(
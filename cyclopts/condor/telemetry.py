@@ -0,0 +1,276 @@
+"""This module defines methods to parse the logs of condor jobs and Work Queue
+tasks into a table of job telemetry, i.e., when each job was submitted,
+started, and ended, where it ran, how much memory it used, and with what code
+it exited. A row is recorded for each instance executed by a job, so that
+telemetry can be joined with the Results table by instid.
+
+DAG jobs are described by their condor user logs (`{id}.log`) and the item list
+from which they are queued (or, for older runs, their submit files,
+`{id}.sub`). Work Queue tasks are described by the jobs file written by
+launch_master.py.
+
+:author: Matthew Gidden <matthew.gidden _at_ gmail.com>
+"""
+from __future__ import print_function
+
+import os
+import io
+import re
+import glob
+import time
+import uuid
+import numpy as np
+import tables as t
+
+from cyclopts import cyclopts_io as cycio
+
+"""the path of the job telemetry table"""
+jobs_path = '/Meta/Jobs'
+
+jobs_dt = np.dtype([
+        ("jobid", ('str', 32)),
+        ("instid", ('str', 16)), # 16 bytes for uuid
+        ("kind", ('str', 8)), # dag or queue
+        ("host", ('str', 64)),
+        ("submit", np.float64), # seconds since the epoch
+        ("start", np.float64), # seconds since the epoch
+        ("end", np.float64), # seconds since the epoch
+        ("wait", np.float64), # start - submit
+        ("runtime", np.float64), # end - start
+        ("memory", np.float64), # peak memory usage in MB
+        ("exit", np.int32), # 128 + N for signal N, -1 if unknown
+        ])
+
+"""the name of the jobs file written by launch_master.py"""
+queue_jobs_file = 'jobs'
+
+"""the name of the item list from which DAG jobs are queued"""
+dag_items_file = 'items'
+
+"""the variables given for each DAG job in the item list, which are followed
+by the job's instids"""
+dag_item_cols = ['id', 'db', 'dbpath', 'memory', 'maxtime']
+
+_event = re.compile(
+    r'^(\d{3}) \((\d+)\.(\d+)\.\d+\) (\S+) (\d+:\d+:\d+) (.*)$')
+_addr = re.compile(r'<(\d+\.\d+\.\d+\.\d+)[:>]')
+_slot = re.compile(r'SlotName:\s*\S+@(\S+)')
+_return = re.compile(r'\(return value (\d+)\)')
+_signal = re.compile(r'\(signal (\d+)\)')
+_mem_usage = re.compile(r'^\s*(\d+)\s+-\s+MemoryUsage of job \(MB\)')
+_mem_resource = re.compile(r'^\s*Memory \(MB\)\s*:\s*(\d+)')
+_args = re.compile(r"""^arguments\s*=\s*"'[^']*' '([^']*)'""")
+
+def _log_time(date, clock, year=None):
+    """Returns seconds since the epoch for a condor user log time stamp, which
+    is either of the form YYYY-MM-DD HH:MM:SS or MM/DD HH:MM:SS."""
+    if '/' in date:
+        year = year if year is not None else time.localtime().tm_year
+        stamp = time.strptime('{0}/{1} {2}'.format(year, date, clock),
+                              '%Y/%m/%d %H:%M:%S')
+    else:
+        stamp = time.strptime('{0} {1}'.format(date, clock),
+                              '%Y-%m-%d %H:%M:%S')
+    return time.mktime(stamp)
+
+def _new_record():
+    return {'submit': np.nan, 'start': np.nan, 'end': np.nan, 'host': '',
+            'memory': np.nan, 'exit': -1}
+
+def parse_user_log(fname, year=None):
+    """Parses a condor user log.
+
+    Parameters
+    ----------
+    fname : str
+        the log file
+    year : int, optional
+        the year of events in logs whose time stamps do not include one, by
+        default the current year
+
+    Returns
+    -------
+    jobs : dict
+        a mapping from condor job ids (cluster.proc) to records with submit,
+        start, and end times, host, peak memory, and exit code. If a job was
+        evicted and restarted, its last execution is recorded.
+    """
+    jobs = {}
+    rec, code = None, None
+    with io.open(fname, 'r') as f:
+        for line in f:
+            m = _event.match(line)
+            if m is not None:
+                code, cluster, proc, date, clock, msg = m.groups()
+                jobid = '{0}.{1}'.format(int(cluster), int(proc))
+                rec = jobs.setdefault(jobid, _new_record())
+                stamp = _log_time(date, clock, year=year)
+                if code == '000':
+                    rec['submit'] = stamp
+                elif code == '001':
+                    rec['start'], rec['end'] = stamp, np.nan
+                    addr = _addr.search(msg)
+                    rec['host'] = addr.group(1) if addr is not None else ''
+                elif code == '005':
+                    rec['end'] = stamp
+                continue
+            if line.startswith('...'):
+                rec, code = None, None
+                continue
+            if rec is None:
+                continue
+            if code == '001':
+                slot = _slot.search(line)
+                if slot is not None:
+                    rec['host'] = slot.group(1)
+            elif code == '005':
+                rtn, sig = _return.search(line), _signal.search(line)
+                if rtn is not None:
+                    rec['exit'] = int(rtn.group(1))
+                elif sig is not None:
+                    rec['exit'] = 128 + int(sig.group(1))
+            mem = _mem_usage.match(line) if code == '006' else \
+                _mem_resource.match(line) if code == '005' else None
+            if mem is not None:
+                rec['memory'] = np.nanmax([rec['memory'], float(mem.group(1))])
+    return jobs
+
+def sub_instids(fname):
+    """Returns the instids executed by a DAG job given its submit file."""
+    with io.open(fname, 'r') as f:
+        for line in f:
+            m = _args.match(line)
+            if m is not None:
+                return m.group(1).split()
+    return []
+
+def item_instids(fname):
+    """Returns a mapping from DAG job ids to the instids they execute given the
+    item list from which the jobs were queued."""
+    instids = {}
+    with io.open(fname, 'r') as f:
+        for line in f:
+            items = line.split()
+            if len(items) > len(dag_item_cols):
+                instids[items[0]] = items[len(dag_item_cols):]
+    return instids
+
+def _rows(jobid, kind, rec, instids):
+    wait = rec['start'] - rec['submit']
+    runtime = rec['end'] - rec['start']
+    return [(jobid, uuid.UUID(x).bytes, kind, rec['host'], rec['submit'],
+             rec['start'], rec['end'], wait, runtime, rec['memory'],
+             rec['exit']) for x in instids]
+
+def dag_jobs(dirname, year=None):
+    """Returns telemetry rows for all DAG jobs in a directory with a user log
+    and either an entry in the item list or a submit file.
+
+    Parameters
+    ----------
+    dirname : str
+        the directory
+    year : int, optional
+        the year of events in logs whose time stamps do not include one
+
+    Returns
+    -------
+    rows : list of tuples
+        rows of the job telemetry table
+    """
+    rows = []
+    fname = os.path.join(dirname, dag_items_file)
+    items = item_instids(fname) if os.path.exists(fname) else {}
+    for log in sorted(glob.iglob(os.path.join(dirname, '*.log'))):
+        base = os.path.splitext(log)[0]
+        name, sub = os.path.basename(base), base + '.sub'
+        if name in items:
+            instids = items[name]
+        elif name.isdigit() and os.path.exists(sub):
+            instids = sub_instids(sub)
+        else:
+            continue
+        jobs = parse_user_log(log, year=year)
+        for jobid, rec in jobs.items():
+            rows += _rows(jobid, 'dag', rec, instids)
+    return rows
+
+def queue_jobs(fname):
+    """Returns telemetry rows for all Work Queue tasks in a jobs file written by
+    launch_master.py.
+
+    Parameters
+    ----------
+    fname : str
+        the jobs file, with a whitespace-separated line of task id, host,
+        submit, start, and end times, memory, exit code, and instid for each
+        task
+
+    Returns
+    -------
+    rows : list of tuples
+        rows of the job telemetry table
+    """
+    rows = []
+    with io.open(fname, 'r') as f:
+        for line in f:
+            if line.startswith('#') or len(line.split()) == 0:
+                continue
+            jobid, host, submit, start, end, mem, rtn, instid = line.split()
+            rec = {'host': host, 'submit': float(submit),
+                   'start': float(start), 'end': float(end),
+                   'memory': float(mem), 'exit': int(rtn)}
+            rows += _rows('wq.{0}'.format(jobid), 'queue', rec, [instid])
+    return rows
+
+def ingest(dirname, h5file, year=None, verbose=False):
+    """Parses the logs of all DAG jobs and Work Queue tasks in a directory and
+    appends their telemetry to the job telemetry table of a database. Rows
+    whose job id and instid are already in the table are skipped, e.g., if
+    the same logs are collected more than once.
+
+    Parameters
+    ----------
+    dirname : str
+        the directory with job logs
+    h5file : str or PyTables File
+        the database
+    year : int, optional
+        the year of events in logs whose time stamps do not include one
+    verbose : bool, optional
+        whether to print information regarding ingestion
+
+    Returns
+    -------
+    nrows : int
+        the number of rows added
+    """
+    rows = dag_jobs(dirname, year=year)
+    fname = os.path.join(dirname, queue_jobs_file)
+    if os.path.exists(fname):
+        rows += queue_jobs(fname)
+    if len(rows) == 0:
+        return 0
+
+    opened = isinstance(h5file, basestring)
+    h5file = t.open_file(h5file, mode='a') if opened else h5file
+    rows = np.array(rows, dtype=jobs_dt)
+    nparsed = len(rows)
+    if jobs_path in h5file:
+        node = h5file.get_node(jobs_path)
+        known = set(zip(node.read(field='jobid'), node.read(field='instid')))
+        rows = rows[np.array([x not in known for x in \
+                                  zip(rows['jobid'], rows['instid'])], 
+                             dtype=np.bool_)]
+    if len(rows) > 0:
+        tbl = cycio.Table(h5file, jobs_path, jobs_dt)
+        tbl.cond_create()
+        tbl.append_data(rows)
+        tbl.flush()
+    if opened:
+        h5file.close()
+    if verbose:
+        print("recorded telemetry of {0} job instances in {1}, skipped {2} "
+              "already recorded".format(len(rows), jobs_path, 
+                                        nparsed - len(rows)))
+    return len(rows)
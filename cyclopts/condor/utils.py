@@ -14,6 +14,10 @@ import io
 import glob 
 import uuid
 import re
+import threading
+import hashlib
+import Queue
+from multiprocessing.pool import ThreadPool
 
 try:
     import paramiko as pm
@@ -26,12 +30,25 @@ except ImportError:
                    "import its necessary modules"), ImportWarning)
 
 from cyclopts import tools
+from cyclopts.condor import telemetry
+from cyclopts.condor import archive
 
 batlab_base_dir_template = u"""/home/{user}"""
 
-tar_output_cmd = """cd {remotedir} && tar -czf {tardir}.tar.gz {re}"""
+tar_output_cmd = """cd {remotedir} && tar {tarflags} -cf {tarname} {re}"""
 
-def _get_files(client, remotedir, localdir, re, verbose=False):
+tar_logs_cmd = """cd {remotedir} && find . -maxdepth 1 \\( -name '[0-9]*.log' \
+-o -name '[0-9]*.sub' -o -name '{jobs}' -o -name '{items}' \\) -print0 | \
+tar {tarflags} -cf {tarname} --null -T -"""
+
+"""the directory, relative to a remote user's home directory, of the content
+addressed upload cache"""
+remote_cache_dir = 'cyclopts-cache'
+
+manifest_cmd = """cd {remotedir} && date +%s && \
+find . -maxdepth 1 -name '{re}' -printf '%f %s %T@\\n'"""
+
+def _get_files(client, remotedir, localdir, re, codec='gzip', verbose=False):
     """Retrieves all files matching an expression on a remote site.
 
     Parameters
@@ -44,15 +61,47 @@ def _get_files(client, remotedir, localdir, re, verbose=False):
         the output directory on the local macine
     re : str
         the pattern to match
+    codec : str, optional
+        the archive codec used to bundle files on the remote site
     verbose : str, optional
         print information about the command
     """
-    tardir = 'outfiles'
-    cmd = tar_output_cmd.format(remotedir=remotedir, tardir=tardir, re=re)
+    tarname = archive.archive_name('outfiles', codec)
+    cmd = tar_output_cmd.format(remotedir=remotedir, tarname=tarname, re=re,
+                                tarflags=archive.codecs[codec].create)
     exec_remote_cmd(client, cmd, verbose=verbose)
-    
-    remotetar = os.path.join(remotedir, '{0}.tar.gz'.format(tardir))
-    localtar = os.path.join(localdir, '{0}.tar.gz'.format(tardir))
+    return _get_tar(client, remotedir, localdir, tarname, verbose=verbose)
+
+def _get_logs(client, remotedir, localdir, codec='gzip', verbose=False):
+    """Retrieves the logs, submit files, and item list of all DAG jobs and the
+    jobs file of a Work Queue run on a remote site.
+
+    Parameters
+    ----------
+    client : paramiko SSHClient
+        the client
+    remotedir : str
+        the output directory on the client machine
+    localdir : str
+        the output directory on the local macine
+    codec : str, optional
+        the archive codec used to bundle files on the remote site
+    verbose : str, optional
+        print information about the command
+    """
+    tarname = archive.archive_name('logfiles', codec)
+    cmd = tar_logs_cmd.format(remotedir=remotedir, tarname=tarname, 
+                              jobs=telemetry.queue_jobs_file, 
+                              items=telemetry.dag_items_file, 
+                              tarflags=archive.codecs[codec].create)
+    exec_remote_cmd(client, cmd, verbose=verbose)
+    return _get_tar(client, remotedir, localdir, tarname, verbose=verbose)
+
+def _get_tar(client, remotedir, localdir, tarname, verbose=False):
+    """Retrieves and extracts a tarball from a remote site and returns the
+    number of files it contained."""
+    remotetar = os.path.join(remotedir, tarname)
+    localtar = os.path.join(localdir, tarname)
     ftp = client.open_sftp()
     if verbose:
         print("Copying {0} from condor submit node to {1}.".format(
@@ -60,7 +109,8 @@ def _get_files(client, remotedir, localdir, re, verbose=False):
     ftp.get(remotetar, localtar)
     ftp.close()
 
-    with tarfile.open(localtar, 'r:gz') as f:
+    readable = archive.readable(localtar)
+    with tarfile.open(readable, 'r:*') as f:
         files = f.getnames()
         nfiles = len(files)
         def is_within_directory(directory, target):
@@ -88,8 +138,168 @@ def _get_files(client, remotedir, localdir, re, verbose=False):
         print("retrived {0} files from tarball".format(nfiles))
 
     os.remove(localtar)
+    if readable != localtar:
+        os.remove(readable)
     return nfiles
 
+def file_hash(fname, bufsize=1024 * 1024):
+    """Returns the SHA-1 hex digest of a file's content."""
+    h = hashlib.sha1()
+    with io.open(fname, 'rb') as f:
+        for data in iter(lambda: f.read(bufsize), b''):
+            h.update(data)
+    return h.hexdigest()
+
+def upload_cached(fname, user, host="submit-3.chtc.wisc.edu", keyfile=None, 
+                  home=None, sessions=None, verbose=False):
+    """Uploads a file to a content addressed cache on a remote site, i.e., to
+    ~/cyclopts-cache/<hash>/<name>, unless it is already present.
+
+    Parameters
+    ----------
+    fname : str
+        the local file
+    user : str
+        the remote machine user name
+    host : str, optional
+        the remote machine host name
+    keyfile : str, optional
+        the ssh key file
+    home : str, optional
+        the remote home directory, by default that of the user on batlab
+    sessions : tools.SSHSessions, optional
+        the pooled SSH sessions to use, by default tools.ssh_sessions
+    verbose : str, optional
+        print information about the upload
+
+    Returns
+    -------
+    path : str
+        the absolute path of the file on the remote site
+    """
+    sessions = sessions if sessions is not None else tools.ssh_sessions
+    home = home if home is not None else \
+        batlab_base_dir_template.format(user=user)
+    remotedir = '/'.join([home, remote_cache_dir, file_hash(fname)])
+    path = '/'.join([remotedir, os.path.basename(fname)])
+    client = sessions.client(host, user, keyfile=keyfile)
+    ftp = sessions.sftp(host, user, keyfile=keyfile)
+    try:
+        cached = ftp.stat(path).st_size == os.path.getsize(fname)
+    except IOError:
+        cached = False
+    if cached:
+        if verbose:
+            print("Found {0} in the upload cache at {1}".format(fname, path))
+    else:
+        if verbose:
+            print("Uploading {0} to the upload cache at {1}".format(
+                    fname, path))
+        exec_remote_cmd(client, 'mkdir -p {0}'.format(remotedir))
+        # rename once complete so partial uploads are never cached
+        ftp.put(fname, path + '.part')
+        ftp.posix_rename(path + '.part', path)
+    return path
+
+def _manifest(client, remotedir, re, verbose=False):
+    """Returns the current time on a remote site and a mapping of all files
+    matching an expression in a remote directory to their size and
+    modification time."""
+    cmd = manifest_cmd.format(remotedir=remotedir, re=re)
+    stdin, stdout, stderr = exec_remote_cmd(client, cmd, verbose=verbose)
+    lines = stdout.readlines()
+    now = float(lines[0])
+    files = {}
+    for l in lines[1:]:
+        name, size, mtime = l.rsplit(None, 2)
+        files[name] = (int(size), float(mtime))
+    return now, files
+
+def _stream_files(client, remotedir, localdir, re, threads=4, nfiles=None, 
+                  settle=10, t_sleep=5, verbose=False):
+    """A generator that retrieves files matching an expression on a remote site
+    in parallel as they are finished, yielding their local paths as they are
+    downloaded. A file is finished once it has not been modified for some time.
+
+    Parameters
+    ----------
+    client : paramiko SSHClient
+        the client
+    remotedir : str
+        the output directory on the client machine
+    localdir : str
+        the output directory on the local macine
+    re : str
+        the pattern to match
+    threads : int, optional
+        the number of files downloaded at once, each over its own SFTP channel
+    nfiles : int, optional
+        the number of files expected, if provided, the remote directory is
+        polled until this many files are retrieved, otherwise, retrieval stops
+        once all files present are finished and retrieved
+    settle : float, optional
+        the time in seconds after which an unmodified file is finished
+    t_sleep : float, optional
+        the amount of time to wait between polling the remote directory
+    verbose : str, optional
+        print information about the command
+    """
+    local = threading.local()
+    channels = []
+    def fetch(name):
+        try:
+            if not hasattr(local, 'sftp'):
+                local.sftp = client.open_sftp()
+                channels.append(local.sftp)
+            path = os.path.join(localdir, name)
+            local.sftp.get('/'.join([remotedir, name]), path + '.part')
+            os.rename(path + '.part', path)
+            return path
+        except Exception as e:
+            return e
+
+    pool = ThreadPool(threads)
+    done = Queue.Queue()
+    seen = set()
+    pending = 0
+    try:
+        while True:
+            now, files = _manifest(client, remotedir, re)
+            new = [name for name, (size, mtime) in sorted(files.items()) \
+                       if name not in seen and now - mtime >= settle]
+            for name in new:
+                seen.add(name)
+                pool.apply_async(fetch, (name,), callback=done.put)
+                pending += 1
+            if verbose and len(new) > 0:
+                print('Retrieving {0} new files, {1} total'.format(
+                        len(new), len(seen)))
+            finished = len(seen) >= nfiles if nfiles is not None else \
+                len(seen) == len(files)
+            
+            # hand off downloaded files until the next poll
+            deadline = time.time() + t_sleep
+            while pending > 0:
+                timeout = None if finished else deadline - time.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    path = done.get(timeout=timeout)
+                except Queue.Empty:
+                    break
+                pending -= 1
+                if isinstance(path, Exception):
+                    raise path
+                yield path
+            if finished and pending == 0:
+                break
+            time.sleep(max(0, deadline - time.time()))
+    finally:
+        pool.terminate()
+        pool.join()
+        for sftp in channels:
+            sftp.close()
+
 def exec_remote_cmd_with_retry(client, cmd, t_sleep=5, verbose=False, retry=5, 
                                error=IOError):
     """A wrapper function around paramiko.client.exec_command that helps with
@@ -174,12 +384,8 @@ def rm(user, host="submit-3.chtc.wisc.edu", keyfile=None, expr=None,
     verbose : str, optional
         print information    
     """
-    client = pm.SSHClient()
-    client.set_missing_host_key_policy(pm.AutoAddPolicy())
-    _, keyfile, pw = tools.ssh_test_connect(client, host, user, keyfile=keyfile, 
-                                            auth=False)
-    client.connect(host, username=user, key_filename=keyfile, password=pw)
     print("connecting to {0}@{1}".format(user, host))
+    client = tools.ssh_sessions.client(host, user, keyfile=keyfile, auth=False)
     
     cmd = "condor_q {user}".format(user=user)
     stdin, stdout, stderr = exec_remote_cmd(client, cmd, verbose=verbose)
@@ -193,13 +399,17 @@ def rm(user, host="submit-3.chtc.wisc.edu", keyfile=None, expr=None,
         stdin, stdout, stderr = exec_remote_cmd(client, cmd, verbose=verbose)
     else:
         print("No jobs found matching {0}.".format(expr))
-    client.close()
         
 def collect(localdir, remotedir, user, host="submit-3.chtc.wisc.edu", 
             outdb='cyclopts_results.h5', clean=False, keyfile=None,
-            verbose=False):
+            verbose=False, stream=False, threads=4, nfiles=None, logs=True, 
+            codec='gzip'):
     """Collects all cyclopts output on a remote site and collapses it into a
-    single data base on a local machine.
+    single data base on a local machine. By default, all output is tarred and
+    retrieved before it is combined. If streaming, output files are retrieved
+    in parallel as they are finished and combined while others are still being
+    retrieved. By default, the logs of all jobs are also retrieved and their
+    telemetry is recorded in the job telemetry table of the output database.
     
     Parameters
     ----------
@@ -219,27 +429,66 @@ def collect(localdir, remotedir, user, host="submit-3.chtc.wisc.edu",
         a SSH private key file to use
     verbose : str, optional
         print information
+    stream : bool, optional
+        whether to stream output files rather than tar them
+    threads : int, optional
+        the number of files retrieved at once when streaming
+    nfiles : int, optional
+        the number of output files expected when streaming, if provided, 
+        collection waits for unfinished jobs
+    logs : bool, optional
+        whether to retrieve job logs and record their telemetry
+    codec : str, optional
+        the archive codec used to bundle output on the remote site, e.g.,
+        none is fastest if output databases are already compressed
     """
-    client = pm.SSHClient()
-    client.set_missing_host_key_policy(pm.AutoAddPolicy())
-    _, keyfile, pw = tools.ssh_test_connect(client, host, user, keyfile, auth=True)
-
-    client.connect(host, username=user, key_filename=keyfile, password=pw)
+    if stream and os.path.exists(outdb):
+        raise ValueError('Cannot write combined hdf5 files to an existing location.')
     print("connecting to {0}@{1}".format(user, host))
+    client = tools.ssh_sessions.client(host, user, keyfile=keyfile)
 
     if not os.path.exists(localdir):
         os.makedirs(localdir)    
 
+    if stream:
+        # combine files as they are retrieved
+        start = time.time()
+        combiner = tools.Combiner(outdb, verbose=verbose)
+        n = 0
+        try:
+            for f in _stream_files(client, remotedir, localdir, '*_out.h5', 
+                                   threads=threads, nfiles=nfiles, 
+                                   verbose=verbose):
+                combiner.add(f, clean=True)
+                n += 1
+        finally:
+            combiner.close()
+        if logs:
+            _get_logs(client, remotedir, localdir, codec=codec, 
+                      verbose=verbose)
+            telemetry.ingest(localdir, outdb, verbose=verbose)
+        if clean:
+            cmd = "rm -r {0}".format(remotedir)
+            stdin, stdout, stderr = exec_remote_cmd(client, cmd, 
+                                                    verbose=verbose)
+        print("Collected and combined {0} databases into {1} in {2:.1f} s".format(
+                n, outdb, time.time() - start))
+        return
+
     # get files and clean up
-    nfiles = _get_files(client, remotedir, localdir, '*_out.h5')
+    nfiles = _get_files(client, remotedir, localdir, '*_out.h5', codec=codec)
+    if logs:
+        _get_logs(client, remotedir, localdir, codec=codec, verbose=verbose)
     
     if clean:
-        cmd = "rm -r {0} && rm {0}.tar.gz".format(remotedir)
+        cmd = "rm -r {0} && rm -f {1}".format(
+            remotedir, archive.archive_name(remotedir, codec))
         stdin, stdout, stderr = exec_remote_cmd(client, cmd, verbose=verbose)
-    client.close()
     
     # combine files and clean up
     files = glob.iglob(os.path.join(localdir, '*_out.h5'))
     stmt = "Combining {0} databases into {1}".format(nfiles, outdb)
     print(stmt)
     tools.combine(files, new_file=outdb, clean=True)
+    if logs:
+        telemetry.ingest(localdir, outdb, verbose=verbose)
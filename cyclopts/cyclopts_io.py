@@ -2,6 +2,7 @@
 
 :author: Matthew Gidden <matthew.gidden _at_ gmail.com>
 """
+import os
 import numpy as np
 import tables as t
 import math
@@ -21,6 +22,50 @@ def uuid_rows(tbl, uuid, colname='instid'):
     return rows_where(tbl, """{0} == uuid""".format(colname), 
                       condvars=condvars)
 
+# external files opened when dereferencing links, by absolute file name
+_linked_files = {}
+
+def deref(node):
+    """Returns the node an external link points to, or the node itself if it is
+    not a link. Linked files are opened read-only once and cached, and relative
+    link targets are relative to the directory of the linking file.
+
+    Parameters
+    ----------
+    node : PyTables Node
+        a node, possibly an ExternalLink
+
+    Returns
+    -------
+    node : PyTables Node
+        the dereferenced node
+    """
+    if not isinstance(node, t.link.ExternalLink):
+        return node
+    fname, path = node.target.rsplit(':/', 1)
+    if not os.path.isabs(fname):
+        base = os.path.dirname(os.path.abspath(node._v_file.filename))
+        fname = os.path.join(base, fname)
+    h5file = _linked_files.get(fname)
+    if h5file is None or not h5file.isopen:
+        h5file = _linked_files[fname] = t.open_file(fname, mode='r')
+    return h5file.get_node('/' + path)
+
+def get_node(h5file, path):
+    """Returns the node at a path in a file, dereferencing external links."""
+    return deref(h5file.get_node(path))
+
+def get_child(grp, name):
+    """Returns the child of a group, dereferencing external links."""
+    return deref(grp._f_get_child(name))
+
+def close_linked_files():
+    """Closes all files opened when dereferencing external links."""
+    for h5file in _linked_files.values():
+        if h5file.isopen:
+            h5file.close()
+    _linked_files.clear()
+
 TblDesc = namedtuple('TblDesc', ['path', 'kind', 'idcol'])
         
 class Group(object):
@@ -221,6 +266,7 @@ _result_dt = np.dtype([
                 ("cyclopts_version", ('str', 12)),
                 # len(dtime.datetime.now().isoformat(' ')) == 26
                 ("timestamp", ('str', 26)), 
+                ("cancelled", np.bool_), # e.g., a loser in portfolio mode
                 ])
         
 class ResultTable(Table):
@@ -239,8 +285,12 @@ class ResultTable(Table):
             default
         """
         super(ResultTable, self).__init__(h5file, path, _result_dt, chunksize)
+        # tables written by earlier versions lack columns, e.g., cancelled
+        if self._tbl is not None and self.h5file.mode != 'r' and \
+                not set(self.dt.names) <= set(self._tbl.dtype.names):
+            self._tbl = tools.upgrade_table(self._tbl, self.dt)
 
-    def record_soln(self, soln, soln_uuid, inst_uuid, solver):
+    def record_soln(self, soln, soln_uuid, inst_uuid, solver, cancelled=False):
         self.append_data([(
                     soln_uuid.bytes, 
                     inst_uuid.bytes, 
@@ -250,6 +300,7 @@ class ResultTable(Table):
                     soln.objective, 
                     cyclopts.__version__, 
                     datetime.datetime.now().isoformat(' '),
+                    cancelled,
                     )])
 
 class PathMap(io_tools.PathMap):
@@ -2,14 +2,16 @@
 
 :author: Matthew Gidden <matthew.gidden _at_ gmail.com>
 """
+import uuid
 import numpy as np
-from collections import Iterable
+from collections import Iterable, namedtuple
 
 from cyclopts.problems import ProblemFamily
 import cyclopts.cyclopts_io as cycio
 import cyclopts.io_tools as io_tools
 import cyclopts.tools as tools
 import cyclopts.exchange_instance as exinst
+import cyclopts.exchange_solvers as exsolvers
 
 _N_CAPS_MAX = 4
 
@@ -139,6 +141,26 @@ def prop_tpl(instid, paramid, species, groups, nodes, arcs):
     return (paramid.bytes, instid.bytes, species, len(arcs), nu_grps, nv_grps, 
             nu_nodes, nv_nodes, nconstr, excl_frac)
 
+def inst_to_arrays(inst):
+    """Returns an instance as structured arrays of groups, nodes, and arcs (with
+    the same dtypes as persisted instances), which is the representation used by
+    native solvers. Members that are already arrays are returned as is."""
+    nil = uuid.UUID(int=0)
+    groups, nodes, arcs = inst
+    if not isinstance(groups, np.ndarray) or groups.dtype != _dtypes['ExGroup']:
+        groups = np.array([grp_tpl(nil, x) for x in groups], 
+                          dtype=_dtypes['ExGroup'])
+    if not isinstance(nodes, np.ndarray) or nodes.dtype != _dtypes['ExNode']:
+        nodes = np.array([node_tpl(nil, x) for x in nodes], 
+                         dtype=_dtypes['ExNode'])
+    return groups, nodes, _arc_array(arcs)
+
+def _arc_array(arcs):
+    """return arcs as a structured array"""
+    if isinstance(arcs, np.ndarray) and arcs.dtype == _dtypes['ExArc']:
+        return arcs
+    return np.array([arc_tpl(x) for x in arcs], dtype=_dtypes['ExArc'])
+
 def _iid_to_prefs(iid, tbl, narcs, strategy='col'):
     """return a numpy array of preferences"""
     if strategy == 'grp':
@@ -151,6 +173,31 @@ def _iid_to_prefs(iid, tbl, narcs, strategy='col'):
     #     ret[x['id']] = x['pref']
     return ret
     
+def dense_flows(tbl, narcs):
+    """Returns a numpy array of the flow on each arc given a solution table,
+    which may hold the flows of all arcs (dense) or only non-zero flows
+    (sparse).
+
+    Parameters
+    ----------
+    tbl : PyTables Table
+        a solution table, i.e., a child of the ExchangeInstSolutions group
+    narcs : int
+        the number of arcs in the solution's instance
+
+    Returns
+    -------
+    flows : numpy array
+        the flow on each arc, indexed by arc id
+    """
+    if tbl.nrows == narcs:
+        # fast
+        return tbl.read(field='flow')
+    ret = np.zeros(narcs)
+    rows = tbl.read()
+    ret[rows['arc_id']] = rows['flow']
+    return ret
+
 def _sid_to_flows(sid, tbl, narcs, strategy='col'):
     """return a numpy array of flows"""
     if strategy == 'col':
@@ -158,13 +205,7 @@ def _sid_to_flows(sid, tbl, narcs, strategy='col'):
         rows = cycio.uuid_rows(tbl, sid, colname='solnid')
         ret[rows['arc_id']] = rows['flow']
     elif strategy == 'grp':
-        # conditional can be removed when all legacy dbs are converted
-        if tbl.nrows == narcs:
-            # fast
-            return tbl.read(field='flow')
-        else:
-            ret = np.zeros(narcs)
-            ret[tbl.read(field='arc_id')] = tbl.read(field='flow')
+        ret = dense_flows(tbl, narcs)
     # for x in rows:
     #     ret[x['arc_id']] = x['flow']
     return ret
@@ -186,7 +227,7 @@ def _pp_work_grp(instid, solnids, prop_tbl, arc_tbl, soln_tbl):
     sid_to_flows = {}
     data = []
     for sid in solnids:
-        tbl = soln_tbl._f_get_child('id_' + sid.hex)
+        tbl = cycio.get_child(soln_tbl, 'id_' + sid.hex)
         flows = _sid_to_flows(sid, tbl, narcs, strategy='grp')
         data.append((sid.bytes, np.dot(prefs, flows)))
         sid_to_flows[sid] = flows
@@ -198,6 +239,79 @@ def _pp_work(instid, solnids, prop_tbl, arc_tbl, soln_tbl, strategy='col'):
     else:
         return _pp_work_grp(instid, solnids, prop_tbl, arc_tbl, soln_tbl)
 
+def _cat(arys, dtype=np.float64):
+    """concatenates arrays, allowing for an empty collection"""
+    return np.concatenate(arys) if len(arys) > 0 else np.empty(0, dtype=dtype)
+
+class FlowBlock(namedtuple('FlowBlock', ['instids', 'arc_offsets', 'solnids', 
+                                         'inst_offsets', 'soln_offsets', 
+                                         'arc_idx', 'flows'])):
+    """The (sparse) arc flows of all solutions of a chunk of instances.
+
+    Arcs of all instances are indexed contiguously, with the arcs of instance i
+    beginning at arc_offsets[i]. Solutions are ordered by instance, with the
+    solutions of instance i beginning at inst_offsets[i]. The flows of solution
+    j are flows[k] for k in [soln_offsets[j], soln_offsets[j + 1]), on arcs
+    arc_idx[k].
+    """
+
+    def __new__(cls, *args, **kwargs):
+        self = super(FlowBlock, cls).__new__(cls, *args, **kwargs)
+        self._inst_idx = dict((iid, i) for i, iid in enumerate(self.instids))
+        return self
+
+    def instance(self, iid):
+        """Returns the properties of an instance as given by
+        ResourceExchange.post_process(), i.e., its number of arcs and a mapping
+        of its solution UUIDs to (dense) arrays of arc flows."""
+        i = self._inst_idx[iid]
+        lo, narcs = self.arc_offsets[i], self.arc_offsets[i + 1] - \
+            self.arc_offsets[i]
+        sid_to_flows = {}
+        for j in range(self.inst_offsets[i], self.inst_offsets[i + 1]):
+            k = slice(self.soln_offsets[j], self.soln_offsets[j + 1])
+            flows = np.zeros(narcs)
+            flows[self.arc_idx[k] - lo] = self.flows[k]
+            sid_to_flows[self.solnids[j]] = flows
+        return narcs, sid_to_flows
+
+    def dot(self, vals):
+        """Returns the dot product of each solution's flows with arc values,
+        i.e., an array of values indexed contiguously like the arcs of all
+        instances."""
+        prods = vals[self.arc_idx] * self.flows
+        ret = np.zeros(len(self.solnids))
+        starts = self.soln_offsets[:-1]
+        nonempty = self.soln_offsets[1:] > starts
+        if np.any(nonempty):
+            ret[nonempty] = np.add.reduceat(prods, starts[nonempty])
+        return ret
+
+def _pp_tbls(instid, intbls, outtbls, ingrps, outgrps):
+    """return the arc and solution tables (or group) of an instance, and the
+    layout strategy"""
+    # determining column or group-based layout
+    arc_io_name = _grp_names["ExArc"]
+    soln_io_name = _grp_names["solutions"]
+    if arc_io_name in intbls.keys():
+        # column based layout
+        arc_tbl = intbls[arc_io_name]
+        soln_tbl = outtbls[soln_io_name]
+        strategy = 'col'
+    else:
+        # group-based layout
+        arc_tbl = cycio.get_child(ingrps[arc_io_name].group(), 
+                                  'id_' + instid.hex)
+        soln_tbl = outgrps[soln_io_name].group() # actually a group
+        strategy = 'grp'
+    return arc_tbl, soln_tbl, strategy
+
+def _sid_to_rows(sid, tbl, strategy='col'):
+    """return the (arc_id, flow) rows of a solution"""
+    if strategy == 'col':
+        return cycio.uuid_rows(tbl, sid, colname='solnid')
+    return cycio.get_child(tbl, 'id_' + sid.hex).read()
+
 class PathMap(io_tools.PathMap):
     """A simple container class for mapping columns to Hdf5 paths
     implemented for the ResourceExchange problem family"""
@@ -327,7 +441,8 @@ class ResourceExchange(ProblemFamily):
         data = [prop_tpl(inst_uuid, param_uuid, species, groups, nodes, arcs)]
         tables[_tbl_names['properties']].append_data(data)
 
-    def record_soln(self, soln, soln_uuid, inst, inst_uuid, io_manager):
+    def record_soln(self, soln, soln_uuid, inst, inst_uuid, io_manager, 
+                    dense=False):
         """Parameters
         ----------
         soln : ExSolution
@@ -340,6 +455,9 @@ class ResourceExchange(ProblemFamily):
             The uuid of the instance        
         io_manager : cyclopts_io.IOManager, optional
             IOManager that gives access to tables/groups for writing
+        dense : bool, optional
+            whether to record the flow of every arc, by default only non-zero
+            flows are recorded (see dense_flows())
         """
         tables = io_manager.tables
         h5groups = io_manager.groups
@@ -352,7 +470,9 @@ class ResourceExchange(ProblemFamily):
         soln_tbl = cycio.Table(soln_grp.h5file, soln_tbl_path, 
                                _dtypes['solutions'])
         io_manager.add_table(soln_tbl)
-        data = [(arcid, flow) for arcid, flow in soln.flows.items()]
+        data = sorted(soln.flows.items())
+        if not dense:
+            data = [(arcid, flow) for arcid, flow in data if flow != 0]
         soln_tbl.append_data(data)
         
         # solution properties, 1 entry per soln
@@ -360,6 +480,38 @@ class ResourceExchange(ProblemFamily):
         tbl.append_data([(soln_uuid.bytes, inst_uuid.bytes, soln.pref_flow, 
                           soln.cost_flow, soln.cyclus_version)])
             
+    def dump_soln(self, soln):
+        """Parameters
+        ----------
+        soln : ExSolution
+            A representation of a problem solution
+
+        Returns
+        -------
+        data : tuple
+            A picklable representation of the solution
+        """
+        return (soln.time, soln.objective, soln.type, soln.cyclus_version, 
+                dict(soln.flows.items()), soln.pref_flow, soln.cost_flow)
+
+    def load_soln(self, data):
+        """Parameters
+        ----------
+        data : tuple
+            A representation of a solution, as returned by dump_soln()
+
+        Returns
+        -------
+        soln : ExSolution
+            A representation of a problem solution
+        """
+        time, objective, kind, version, flows, pref_flow, cost_flow = data
+        soln = exinst.ExSolution(time, objective, kind, version)
+        soln.flows = flows
+        soln.pref_flow = pref_flow
+        soln.cost_flow = cost_flow
+        return soln
+            
     def read_inst(self, uuid, io_manager):
         """Parameters
         ----------
@@ -407,7 +559,7 @@ class ResourceExchange(ProblemFamily):
         # this could be sped up by directly populating members rather than 
         # dynamically typechecking each one 
         setattrs = tools.cyc_members(exinst.ExArc())
-        for row in grp.group()._f_get_child('id_' + uuid.hex).read():
+        for row in cycio.get_child(grp.group(), 'id_' + uuid.hex).read():
             obj = exinst.ExArc()
             for var in setattrs:
                 attr = getattr(obj, var)
@@ -437,6 +589,9 @@ class ResourceExchange(ProblemFamily):
         soln : ExSolution
             A representation of a problem solution
         """
+        if solver.type in exsolvers.solvers:
+            # native solvers operate directly on arrays
+            return exsolvers.solvers[solver.type](*inst_to_arrays(inst))
         groups, nodes, arcs = inst
         soln = exinst.Run(groups, nodes, arcs, solver, verbose)
         return soln
@@ -464,21 +619,8 @@ class ResourceExchange(ProblemFamily):
         ingrps, outgrps, ppgrps = (m.groups for m in io_managers)
         prop_tbl = intbls[_tbl_names["properties"]]
         pp_tbl = pptbls[_tbl_names["pp"]]
-        
-        # determining column or group-based layout
-        arc_io_name = _grp_names["ExArc"]
-        soln_io_name = _grp_names["solutions"]
-        if arc_io_name in intbls.keys():
-            # column based layout
-            arc_tbl = intbls[arc_io_name]
-            soln_tbl = outtbls[soln_io_name]
-            strategy = 'col'
-        else:
-            # group-based layout
-            arc_tbl = ingrps[arc_io_name].group()._f_get_child('id_' + 
-                                                               instid.hex)
-            soln_tbl = outgrps[soln_io_name].group() # actually a group
-            strategy = 'grp'
+        arc_tbl, soln_tbl, strategy = _pp_tbls(instid, intbls, outtbls, 
+                                               ingrps, outgrps)
         
         narcs, sid_to_flows, data = _pp_work(instid, solnids, prop_tbl, 
                                              arc_tbl, soln_tbl, 
@@ -486,3 +628,109 @@ class ResourceExchange(ProblemFamily):
         pp_tbl.append_data(data)
 
         return narcs, sid_to_flows
+
+    def _all_narcs(self, prop_tbl):
+        """Returns a mapping from instid bytes to the number of arcs of each
+        instance in a property table. The table is read once, i.e., once per
+        post-processing pass rather than once per chunk."""
+        key = (prop_tbl._v_file.filename, prop_tbl._v_pathname, prop_tbl.nrows)
+        cache = getattr(self, '_narcs_cache', (None, None))
+        if cache[0] != key:
+            cache = (key, dict(zip(prop_tbl.read(field='instid'), 
+                                   prop_tbl.read(field='n_arcs'))))
+            self._narcs_cache = cache
+        return cache[1]
+
+    def post_process_chunk(self, iid_to_sids, io_managers):
+        """Perform post processing on a chunk of instances at once. Arc
+        preferences and solution flows of all instances are read into a single
+        FlowBlock, and the PostProcess rows of all solutions are computed with
+        segmented reductions and written together.
+        
+        Parameters
+        ----------
+        iid_to_sids : list of (UUID, tuple of UUIDs) pairs
+            instance UUIDs and their corresponding solution UUIDs
+        io_managers : tuple of cyclopts.cyclopts_io.IOManager
+            iomanager from an input file, iomanager from an output file,
+            and iomanager from a post-processed file
+
+        Returns
+        -------
+        block : FlowBlock
+            the flows of all solutions of the chunk, those of each instance
+            are given by block.instance(iid)
+        """
+        intbls, outtbls, pptbls = (m.tables for m in io_managers)
+        ingrps, outgrps, ppgrps = (m.groups for m in io_managers)
+        prop_tbl = intbls[_tbl_names["properties"]].table()
+        pp_tbl = pptbls[_tbl_names["pp"]]
+        all_narcs = self._all_narcs(prop_tbl)
+        
+        instids, prefs, solnids, arc_idx, flows = [], [], [], [], []
+        arc_offsets, inst_offsets, soln_offsets = [0], [0], [0]
+        for iid, sids in iid_to_sids:
+            narcs = all_narcs[iid.bytes]
+            arc_tbl, soln_tbl, strategy = _pp_tbls(iid, intbls, outtbls, 
+                                                   ingrps, outgrps)
+            instids.append(iid)
+            prefs.append(_iid_to_prefs(iid, arc_tbl, narcs, strategy=strategy))
+            for sid in sids:
+                rows = _sid_to_rows(sid, soln_tbl, strategy=strategy)
+                solnids.append(sid)
+                arc_idx.append(arc_offsets[-1] + rows['arc_id'])
+                flows.append(rows['flow'])
+                soln_offsets.append(soln_offsets[-1] + len(rows))
+            arc_offsets.append(arc_offsets[-1] + narcs)
+            inst_offsets.append(len(solnids))
+        
+        block = FlowBlock(instids, np.array(arc_offsets), solnids, 
+                          np.array(inst_offsets), np.array(soln_offsets), 
+                          _cat(arc_idx, np.int64), _cat(flows))
+        data = np.empty(len(solnids), dtype=_dtypes['pp'])
+        data['solnid'] = [sid.bytes for sid in solnids]
+        data['pref_flow'] = block.dot(_cat(prefs))
+        pp_tbl.append_data(data)
+        return block
+
+    def post_process_solns(self, inst, instid, solns, io_manager):
+        """Perform post processing on the in-memory solutions of an instance.
+        
+        Parameters
+        ----------
+        inst : tuple of lists of ExGroups, ExNodes, and ExArgs
+            A representation of a problem instance
+        instid : UUID 
+            UUID of the instance
+        solns : list of (UUID, ExSolution) pairs
+            the instance's solutions and their UUIDs
+        io_manager : cyclopts.cyclopts_io.IOManager
+            iomanager from the file to which post-processed data is written
+
+        Returns
+        -------
+        block : FlowBlock
+            the flows of all solutions of the instance
+        """
+        arcs = _arc_array(inst[2])
+        narcs = len(arcs)
+        prefs = np.zeros(narcs)
+        prefs[arcs['id']] = arcs['pref']
+        
+        solnids, arc_idx, flows = [], [], []
+        soln_offsets = [0]
+        for sid, soln in solns:
+            items = [(k, v) for k, v in sorted(soln.flows.items()) if v != 0]
+            solnids.append(sid)
+            arc_idx.append(np.array([k for k, _ in items], dtype=np.int64))
+            flows.append(np.array([v for _, v in items], dtype=np.float64))
+            soln_offsets.append(soln_offsets[-1] + len(items))
+        
+        block = FlowBlock([instid], np.array([0, narcs]), solnids, 
+                          np.array([0, len(solnids)]), np.array(soln_offsets), 
+                          _cat(arc_idx, np.int64), _cat(flows))
+        data = np.empty(len(solnids), dtype=_dtypes['pp'])
+        data['solnid'] = [sid.bytes for sid in solnids]
+        data['pref_flow'] = block.dot(prefs)
+        io_manager.tables[_tbl_names["pp"]].append_data(data)
+        return block
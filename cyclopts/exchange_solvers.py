@@ -0,0 +1,349 @@
+"""This module provides native solvers for ResourceExchange instances. Rather
+than building a Cyclus ExchangeGraph, these solvers operate directly on the
+array representation of an instance, i.e., structured arrays of groups, nodes,
+and arcs with the dtypes used to persist them (see
+cyclopts.exchange_family.inst_to_arrays()).
+"""
+from __future__ import division
+
+import time
+import warnings
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    sp = None
+    warnings.warn(("The HiGHS solvers require scipy >= 1.9, which could not "
+                   "be imported"), ImportWarning)
+
+import cyclopts.exchange_instance as exinst
+
+_cpu_time = getattr(time, 'process_time', None) or time.clock
+
+_eps = 1e-6
+
+"""the additional fraction of the largest arc cost used to penalize unmet
+demand"""
+cost_factor = 0.1
+
+"""the smallest and largest number of arcs considered at once by the greedy
+solver"""
+_min_window, _max_window = 16, 4096
+
+def _index(ids, query):
+    """returns the index of each query id in an array of ids"""
+    order = np.argsort(ids, kind='mergesort')
+    return order[np.searchsorted(ids, query, sorter=order)]
+
+def _excl_vals(uqty, vqty, uexcl, vexcl):
+    """returns the flow of each exclusive arc if it is matched, which is 0 if the
+    quantities of its nodes are incompatible"""
+    ret = np.zeros(len(uqty))
+    both = uexcl & vexcl
+    ret[both] = np.where(uqty[both] == vqty[both], uqty[both], 0)
+    u = uexcl & ~vexcl
+    ret[u] = np.where(vqty[u] >= uqty[u], uqty[u], 0)
+    v = vexcl & ~uexcl
+    ret[v] = np.where(uqty[v] >= vqty[v], vqty[v], 0)
+    return ret
+
+def _excl_groups(nodes, grp_idx):
+    """returns an index of each node's exclusive group (nodes sharing a group and
+    an excl_id > 0), -1 if none, and the number of exclusive groups"""
+    ret = -np.ones(len(nodes), dtype=np.int64)
+    member = nodes['excl_id'] > 0
+    if not np.any(member):
+        return ret, 0
+    keys = np.array(list(zip(grp_idx[member], nodes['excl_id'][member])),
+                    dtype=[('g', np.int64), ('e', np.int64)])
+    uniq, ret[member] = np.unique(keys, return_inverse=True)
+    return ret, len(uniq)
+
+def _units(units):
+    """returns unit capacities with 1 in place of 0 (i.e., safe divisors) and a
+    mask of non-zero unit capacities"""
+    nz = units > 0
+    return np.where(nz, units, 1), nz
+
+def _cap(caps, units, nz, valid, request):
+    """returns the flow allowed on each of a number of arcs by the capacities of
+    a group (a row of caps) given the arc's unit capacities. The largest value
+    must be met for requests, the smallest value constrains bids. A unit
+    capacity of 0 does not constrain flow, nor does a group without
+    capacities."""
+    ratios = np.where(nz, caps / units, np.inf)
+    if not request:
+        return np.where(valid, ratios, np.inf).min(axis=1)
+    ret = np.where(valid, ratios, -np.inf).max(axis=1)
+    ret[~valid.any(axis=1)] = np.inf
+    return ret
+
+def _avg(idx, vals, n):
+    """returns the average of vals grouped by idx, 0 for empty groups"""
+    sums = np.bincount(idx, weights=vals, minlength=n)
+    counts = np.bincount(idx, minlength=n)
+    return sums / np.maximum(counts, 1)
+
+def _pseudo_cost(arcs):
+    """returns the unit cost of unmet demand"""
+    return (1 + cost_factor) / arcs['pref'].min() if len(arcs) > 0 else 0
+
+def _soln(arcs, flows, obj, start):
+    """returns an ExSolution given arc flows"""
+    pref_flow = np.dot(arcs['pref'], flows)
+    cost_flow = np.dot(1 / arcs['pref'], flows)
+    soln = exinst.ExSolution(_cpu_time() - start, obj, 'ResourceExchange')
+    soln.flows = dict(zip(arcs['id'].tolist(), flows.tolist()))
+    soln.pref_flow = pref_flow
+    soln.cost_flow = cost_flow
+    return soln
+
+def greedy(groups, nodes, arcs):
+    """A greedy solver following the heuristic of the Cyclus GreedySolver.
+
+    Request groups are satisfied in order of decreasing average preference,
+    their nodes in order of decreasing average preference, and each node's arcs
+    in order of decreasing preference. Each arc is assigned as much flow as is
+    allowed by the remaining group demand, group capacities (given unit
+    capacities), and node quantities. Exclusive arcs are assigned their full
+    exclusive quantity or nothing, and at most one arc is matched among the
+    nodes of an exclusive group.
+
+    Parameters
+    ----------
+    groups, nodes, arcs : numpy structured arrays
+        the instance, see cyclopts.exchange_family.inst_to_arrays()
+
+    Returns
+    -------
+    soln : ExSolution
+        the solution, whose objective is the cost (1 / preference) of all flow
+        plus a penalty for unmet demand
+    """
+    start = _cpu_time()
+    narcs, nnodes, ngrps = len(arcs), len(nodes), len(groups)
+    grp_idx = _index(groups['id'], nodes['gid'])
+    uidx = _index(nodes['id'], arcs['uid'])
+    vidx = _index(nodes['id'], arcs['vid'])
+    ugrp, vgrp = grp_idx[uidx], grp_idx[vidx]
+    prefs = arcs['pref']
+
+    # exclusivity
+    excl = nodes['excl']
+    arc_excl = excl[uidx] | excl[vidx]
+    excl_vals = _excl_vals(nodes['qty'][uidx], nodes['qty'][vidx],
+                           excl[uidx], excl[vidx])
+    excl_grp, nexcl = _excl_groups(nodes, grp_idx)
+
+    # arc ordering by request group, then node, then arc preference (all
+    # decreasing, ties are broken by original ordering)
+    node_avg = _avg(uidx, prefs, nnodes)
+    req = groups['kind'][grp_idx]
+    grp_avg = _avg(grp_idx[req], node_avg[req], ngrps)
+    order = np.lexsort((np.arange(narcs), -prefs, uidx, -node_avg[uidx],
+                        ugrp, -grp_avg[ugrp]))
+
+    # bookkeeping, per-arc arrays are computed once
+    caps = groups['caps'].astype(np.float64)
+    valid = caps > 0
+    uvalid, vvalid = valid[ugrp], valid[vgrp]
+    uunits, unz = _units(arcs['ucaps'])
+    vunits, vnz = _units(arcs['vcaps'])
+    qtys = nodes['qty'].astype(np.float64)
+    matched = np.zeros(ngrps)
+    flows = np.zeros(narcs)
+    targets = groups['qty']
+    # the last entry is never used, i.e., it stands for no exclusive group
+    excl_used = np.zeros(nexcl + 1, dtype=np.bool_)
+    first_u = np.full(ngrps, narcs, dtype=np.int64)
+    first_v = np.full(ngrps, narcs, dtype=np.int64)
+
+    # Arcs are considered in windows. The flow of each arc in a window is
+    # found given the state at the start of the window, which is exact for all
+    # arcs before the first that shares a request or bid group (and therefore
+    # nodes and exclusive groups) with an earlier arc with flow. Those arcs are
+    # assigned their flows at once, and the next window starts at that arc.
+    pos, window = 0, _min_window
+    while pos < narcs:
+        w = order[pos:pos + window]
+        u, v, gu, gv = uidx[w], vidx[w], ugrp[w], vgrp[w]
+        remain = targets[gu] - matched[gu]
+        ucap = np.minimum(_cap(caps[gu], uunits[w], unz[w], uvalid[w], True), 
+                          qtys[u])
+        vcap = np.minimum(_cap(caps[gv], vunits[w], vnz[w], vvalid[w], False), 
+                          qtys[v])
+        tomatch = np.minimum(remain, np.minimum(ucap, vcap))
+        ex, vals = arc_excl[w], excl_vals[w]
+        tomatch[ex] = np.where(tomatch[ex] + _eps < vals[ex], 0, vals[ex])
+        eu, ev = excl_grp[u], excl_grp[v]
+        skip = (remain <= _eps) | excl_used[eu] | excl_used[ev] | \
+            (tomatch <= _eps)
+        tomatch[skip] = 0
+
+        # the first arc sharing a group with an earlier arc with flow
+        idx = np.arange(len(w))
+        flow = ~skip
+        np.minimum.at(first_u, gu[flow], idx[flow])
+        np.minimum.at(first_v, gv[flow], idx[flow])
+        conflict = (first_u[gu] < idx) | (first_v[gv] < idx)
+        first_u[gu], first_v[gv] = narcs, narcs
+        end = np.argmax(conflict) if np.any(conflict) else len(w)
+
+        # arcs with flow before it share no groups
+        keep = flow[:end]
+        a, t = w[:end][keep], tomatch[:end][keep]
+        caps[ugrp[a]] = np.maximum(caps[ugrp[a]] - arcs['ucaps'][a] * t[:, None], 
+                                   0)
+        caps[vgrp[a]] = np.maximum(caps[vgrp[a]] - arcs['vcaps'][a] * t[:, None], 
+                                   0)
+        np.subtract.at(qtys, uidx[a], t)
+        np.subtract.at(qtys, vidx[a], t)
+        np.add.at(matched, ugrp[a], t)
+        flows[a] = t
+        for e in (eu[:end][keep], ev[:end][keep]):
+            excl_used[e[e >= 0]] = True
+        
+        pos += end
+        window = min(max(2 * end, _min_window), _max_window)
+
+    unmatched = np.sum((targets - matched)[groups['kind']])
+    obj = np.dot(1 / prefs, flows) + _pseudo_cost(arcs) * unmatched
+    return _soln(arcs, flows, obj, start)
+
+def program(groups, nodes, arcs, relax=False):
+    """Assembles the linear program of an instance with sparse matrices,
+    following the Cyclus ProgSolver formulation.
+
+    There is a variable for each arc and a faux (unmet demand) variable for each
+    request group. The flow of a non-exclusive arc is its variable, bounded by
+    the smaller of its nodes' quantities. The flow of an exclusive arc is its
+    binary variable times its exclusive quantity. Each group capacity yields a
+    row of unit capacities, which is a lower bound for requests and an upper
+    bound for bids. A faux variable lies in [0, 1] and supplies a request
+    group's full capacities at the cost of its unmet demand. Each exclusive
+    group yields a row allowing at most one of its arcs to be matched.
+
+    Parameters
+    ----------
+    groups, nodes, arcs : numpy structured arrays
+        the instance, see cyclopts.exchange_family.inst_to_arrays()
+    relax : bool, optional
+        whether to relax the binary variables of exclusive arcs
+
+    Returns
+    -------
+    c : numpy array
+        objective coefficients
+    A : scipy.sparse.csr_matrix
+        the constraint matrix
+    row_lb, row_ub : numpy arrays
+        constraint bounds
+    col_lb, col_ub : numpy arrays
+        variable bounds
+    integrality : numpy array
+        1 for integer variables, 0 for continuous variables
+    scale : numpy array
+        the flow of each arc per unit of its variable
+    """
+    narcs, ngrps = len(arcs), len(groups)
+    grp_idx = _index(groups['id'], nodes['gid'])
+    uidx = _index(nodes['id'], arcs['uid'])
+    vidx = _index(nodes['id'], arcs['vid'])
+    excl, qty = nodes['excl'], nodes['qty']
+    arc_excl = excl[uidx] | excl[vidx]
+    scale = np.where(arc_excl, _excl_vals(qty[uidx], qty[vidx], excl[uidx], 
+                                          excl[vidx]), 1)
+    req = np.flatnonzero(groups['kind'])
+    nvars = narcs + len(req)
+
+    # group capacity rows
+    caps = groups['caps']
+    valid = caps > 0
+    row_of = -np.ones(caps.shape, dtype=np.int64)
+    row_of[valid] = np.arange(valid.sum())
+    geq = groups['cap_dirs'][valid]
+    row_lb = np.where(geq, caps[valid], -np.inf)
+    row_ub = np.where(geq, np.inf, caps[valid])
+    rows, cols, vals = [], [], []
+    arc_ids = np.arange(narcs)[:, np.newaxis]
+    for gidx, units in ((grp_idx[uidx], arcs['ucaps']), 
+                        (grp_idx[vidx], arcs['vcaps'])):
+        mask = valid[gidx] & (units != 0)
+        rows.append(row_of[gidx][mask])
+        cols.append(np.broadcast_to(arc_ids, mask.shape)[mask])
+        vals.append((units * scale[:, np.newaxis])[mask])
+    mask = valid[req]
+    rows.append(row_of[req][mask])
+    cols.append(np.broadcast_to((narcs + np.arange(len(req)))[:, np.newaxis], 
+                                mask.shape)[mask])
+    vals.append(caps[req][mask])
+    
+    # exclusive group rows
+    excl_grp, nexcl = _excl_groups(nodes, grp_idx)
+    nrows = len(row_lb)
+    for nidx in (uidx, vidx):
+        member = excl_grp[nidx] >= 0
+        rows.append(nrows + excl_grp[nidx][member])
+        cols.append(np.flatnonzero(member))
+        vals.append(np.ones(member.sum()))
+    row_lb = np.append(row_lb, np.zeros(nexcl))
+    row_ub = np.append(row_ub, np.ones(nexcl))
+    A = sp.coo_matrix((np.concatenate(vals), 
+                       (np.concatenate(rows), np.concatenate(cols))), 
+                      shape=(nrows + nexcl, nvars)).tocsr()
+
+    # columns
+    unmet = np.maximum(groups['qty'][req], caps[req].max(axis=1))
+    c = np.concatenate((scale / arcs['pref'], _pseudo_cost(arcs) * unmet))
+    col_lb = np.zeros(nvars)
+    col_ub = np.ones(nvars)
+    col_ub[:narcs] = np.where(arc_excl, np.where(scale > 0, 1, 0), 
+                              np.minimum(qty[uidx], qty[vidx]))
+    integrality = np.zeros(nvars)
+    if not relax:
+        integrality[:narcs] = arc_excl
+    return c, A, row_lb, row_ub, col_lb, col_ub, integrality, scale
+
+def highs(groups, nodes, arcs, relax=False):
+    """Solves an instance's linear program (see program()) with HiGHS via
+    scipy.optimize.milp.
+
+    Parameters
+    ----------
+    groups, nodes, arcs : numpy structured arrays
+        the instance, see cyclopts.exchange_family.inst_to_arrays()
+    relax : bool, optional
+        whether to solve the LP relaxation of the problem
+
+    Returns
+    -------
+    soln : ExSolution
+        the solution
+    """
+    if sp is None:
+        raise ImportError('The HiGHS solvers require scipy >= 1.9.')
+    start = _cpu_time()
+    c, A, row_lb, row_ub, col_lb, col_ub, integrality, scale = \
+        program(groups, nodes, arcs, relax=relax)
+    constraints = [LinearConstraint(A, row_lb, row_ub)] if A.shape[0] > 0 \
+        else []
+    res = milp(c, constraints=constraints, integrality=integrality, 
+               bounds=Bounds(col_lb, col_ub))
+    if res.x is None:
+        raise RuntimeError('HiGHS failed to solve: {0}'.format(res.message))
+    flows = scale * res.x[:len(arcs)]
+    flows[flows <= 0] = 0 # HiGHS may report negative zeros
+    return _soln(arcs, flows, res.fun, start)
+
+def highs_lp(groups, nodes, arcs):
+    """Solves the LP relaxation of an instance with HiGHS, see highs()."""
+    return highs(groups, nodes, arcs, relax=True)
+
+"""a mapping from solver types to native solvers"""
+solvers = {
+    'greedy-np': greedy,
+    'highs': highs,
+    'highs-lp': highs_lp,
+    }
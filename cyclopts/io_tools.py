@@ -1,5 +1,7 @@
 """A module for I/O helper functions, classes, etc."""
 
+import uuid
+import numpy as np
 from collections import defaultdict
 
 import cyclopts.tools as tools
@@ -21,18 +23,68 @@ class PathMap(object):
         column name"""
         raise NotImplementedError
 
-def value_mapping(tbl, x, y, uuids=True):
+def to_uuids(ary):
+    """Returns a list of UUIDs given an array of stored UUID values."""
+    if ary.dtype.kind == 'S' and ary.dtype.itemsize == 16:
+        # fixed-width arrays are null-padded, so slices are always 16 bytes
+        buf = ary.tobytes()
+        return [uuid.UUID(bytes=buf[i:i + 16]) for i in range(0, len(buf), 16)]
+    return [tools.str_to_uuid(x) for x in ary]
+
+def group(keys):
+    """Groups equal keys of an array.
+
+    Parameters
+    ----------
+    keys : numpy array
+        the keys to group
+
+    Returns
+    -------
+    uniq : numpy array
+        the sorted unique keys
+    order : numpy array
+        the indices that group equal keys, preserving the original order within
+        a group
+    offsets : numpy array
+        the boundaries of each group in the ordering, i.e., the indices of key
+        uniq[i] are order[offsets[i]:offsets[i + 1]]
+    """
+    order = np.argsort(keys, kind='mergesort')
+    skeys = keys[order]
+    if len(skeys) == 0:
+        return skeys, order, np.zeros(1, dtype=np.int64)
+    starts = np.concatenate(
+        ([0], np.flatnonzero(skeys[1:] != skeys[:-1]) + 1))
+    return skeys[starts], order, np.append(starts, len(skeys))
+
+def _grouped(xs, ys, grouped, uuids_):
+    """returns grouped ys by xs either in dict or grouped-array form"""
+    keys, order, offsets = group(xs)
+    vals = ys[order]
+    if grouped:
+        return keys, vals, offsets
+    keys = to_uuids(keys) if uuids_ else keys.tolist()
+    vals = to_uuids(vals) if uuids_ else vals.tolist()
+    return keys, vals, offsets
+
+def value_mapping(tbl, x, y, uuids=True, grouped=False):
     """Returns a mapping from x to a list of ys in a table. A table can be
     supplied, or the underlying table will be used by default. If uuids is
     true, the cyclopts.tools.str_to_uuid function is used for both x and
-    y."""
+    y. 
+
+    If grouped is true, a compact form is returned instead, i.e., a tuple of
+    the sorted unique xs, all ys grouped by x, and the offsets of each group,
+    such that xs[i] maps to ys[offsets[i]:offsets[i + 1]] (no UUIDs are
+    constructed)."""
+    xs, ys = tbl.read(field=x), tbl.read(field=y)
+    keys, vals, offsets = _grouped(xs, ys, grouped, uuids)
+    if grouped:
+        return keys, vals, offsets
     ret = defaultdict(list)
-    if uuids:
-        for row in tbl.iterrows():
-            ret[tools.str_to_uuid(row[x])].append(tools.str_to_uuid(row[y]))
-    else:
-        for row in tbl.iterrows():
-            ret[row[x]].append(row[y])
+    for i, key in enumerate(keys):
+        ret[key] = vals[offsets[i]:offsets[i + 1]]
     return ret
 
 def grab_data(h5file, path, col, matching=None):
@@ -57,14 +109,14 @@ def grab_data(h5file, path, col, matching=None):
     """
     h5node = h5file.get_node(path)
     if matching is None:
-        data = [x[col] for x in h5node.iterrows()]
-    else:
-        data = []
-        scol, search = matching
-        data = {x['instid']: x[col] for x in h5node.iterrows() if x[scol] in search}
-    return data
+        return h5node.read(field=col).tolist()
+    scol, search = matching
+    rows = h5node.read()
+    mask = np.in1d(rows[scol], np.array(list(search), dtype=rows[scol].dtype))
+    rows = rows[mask]
+    return dict(zip(rows['instid'].tolist(), rows[col].tolist()))
 
-def param_mapping(h5file, path, kcol, vcol):
+def param_mapping(h5file, path, kcol, vcol, grouped=False):
     """return a mapping of params to all values found
     
     Parameters
@@ -76,6 +128,8 @@ def param_mapping(h5file, path, kcol, vcol):
         the key column name
     vcol : str
         the value column name
+    grouped : bool, optional
+        if true, return the compact form of value_mapping() 
     
     Return
     ------
@@ -83,9 +137,13 @@ def param_mapping(h5file, path, kcol, vcol):
         a mapping from key columns to a set of all found value columns
     """
     h5node = h5file.get_node(path)
+    keys, vals, offsets = _grouped(h5node.read(field=kcol), 
+                                   h5node.read(field=vcol), grouped, False)
+    if grouped:
+        return keys, vals, offsets
     data = defaultdict(set)
-    for x in h5node.iterrows():
-        data[x[kcol]].add(x[vcol])
+    for i, key in enumerate(keys):
+        data[key] = set(vals[offsets[i]:offsets[i + 1]])
     return data
 
 def param_to_iids(h5file, fam_path, sp_path, col):
@@ -11,7 +11,6 @@ import itertools
 import uuid
 from datetime import datetime
 import subprocess
-import tarfile
 import os
 import shutil
 import getpass
@@ -34,33 +33,101 @@ except ImportError:
 import cyclopts
 from cyclopts.condor import dag as cdag
 from cyclopts.condor import queue as cqueue
+from cyclopts.condor import local as clocal
 from cyclopts.condor import utils as cutils 
+from cyclopts.condor import archive as carchive
+from cyclopts.condor import telemetry as ctelemetry
 import cyclopts.tools as tools
 import cyclopts.exchange_instance as inst
 import cyclopts.params as params
 import cyclopts.cyclopts_io as cycio
+import cyclopts.scheduling as sched
+import cyclopts.portfolio as portfolio
 
 from cyclopts.problems import Solver
 
+def _runtime_model(db, h5file, path):
+    """Returns a scheduling.RuntimeModel fit to the Results of an earlier run
+    in db, or None if no db is given. Instance properties are read from db if
+    present, otherwise from the h5file."""
+    if db is None:
+        return None
+    with t.open_file(db, mode='r') as f:
+        prop_node = f.get_node(path) if path in f else h5file.get_node(path)
+        return sched.fit_runtime_model(prop_node, f.get_node('/Results'))
+
+def _telemetry_models(db, h5file, path):
+    """Returns a scheduling.MemoryModel and a walltime scheduling.RuntimeModel
+    fit to the job telemetry of an earlier run in db. Either is None if no db
+    is given or it has no telemetry with which to fit the model. Instance
+    properties are read from db if present, otherwise from the h5file."""
+    if db is None:
+        return None, None
+    models = []
+    with t.open_file(db, mode='r') as f:
+        if ctelemetry.jobs_path not in f:
+            return None, None
+        prop_node = f.get_node(path) if path in f else h5file.get_node(path)
+        jobs_node = f.get_node(ctelemetry.jobs_path)
+        for fit in [sched.fit_memory_model, sched.fit_walltime_model]:
+            try:
+                models.append(fit(prop_node, jobs_node))
+            except ValueError:
+                models.append(None)
+    return tuple(models)
+
 def condor_submit(args):
     # collect instance ids
     h5file = t.open_file(args.db, mode='r', filters=tools.FILTERS)
-    instids = set(uuid.UUID(x).bytes for x in args.instids)
+    instids = set(uuid.UUID(x) for x in args.instids)
     rc = tools.parse_rc(args.rc) if args.rc is not None else tools.RunControl()
     obj_rcs = tools.all_obj_rcs(rc, args)    
     fam = tools.get_obj(kind='family', rcs=obj_rcs, args=args)
     path = '{0}/{1}'.format(fam.io_prefix, fam.property_table_name)
     instids = tools.collect_instids(h5file=h5file, path=path, rc=rc, 
                                     instids=instids)
+    model = _runtime_model(args.runtime_db, h5file, path)
+    costs = sched.predict_costs(h5file, path, instids, model=model)
+    mem_model, wall_model = _telemetry_models(args.runtime_db, h5file, path)
+
+    if args.per_job is not None or args.target_seconds is not None:
+        if args.kind not in ['dag', 'local']:
+            raise ValueError('Instances can only be packed into dag or local '
+                             'jobs.')
+        if args.target_seconds is not None and model is None:
+            raise ValueError('A runtime-db is required to predict the seconds '
+                             'a job takes.')
+        jobs = sched.pack_jobs(costs, per_job=args.per_job, 
+                               target=args.target_seconds)
+        instids = [[x.hex for x in job] for job in jobs]
+        print('Packed {0} instances into {1} jobs.'.format(len(costs), 
+                                                           len(jobs)))
+    elif args.kind == 'local':
+        # one job per local worker, balanced across workers
+        jobs = sched.pack(costs, clocal.n_workers(len(costs), args.jobs))
+        instids = [[x.hex for x in job] for job in jobs]
+        print('Packed {0} instances into {1} jobs.'.format(len(costs), 
+                                                           len(jobs)))
+    else:
+        jobs = [[x] for x in sched.order(costs)]
+        instids = [job[0].hex for job in jobs]
+
+    # resources to request for each job
+    memory = sched.memory_requests(h5file, path, jobs, model=mem_model, 
+                                   margin=args.memory_margin, 
+                                   minimum=args.memory_minimum)
+    walltime = sched.walltime_requests(h5file, path, jobs, model=wall_model, 
+                                       margin=args.walltime_margin)
     h5file.close()
-
-    instids = [x.hex for x in instids]
+    if mem_model is not None:
+        print('Requesting between {0} and {1} MB of memory per job.'.format(
+                min(memory), max(memory)))
     _, module, cname = tools.obj_info(kind='family', rcs=obj_rcs, args=args)
 
 
     print('Submitting a {kind} job with {n} instances of the '
           'ProblemFamily {cname}.'.format(
-            kind=args.kind, n=len(instids), cname=cname))
+            kind=args.kind, n=len(costs), cname=cname))
     
     solvers = [s.strip().rstrip(',') for s in args.solvers]
 
@@ -68,12 +135,24 @@ def condor_submit(args):
     if args.kind == 'dag':
         cdag.submit(args.user, args.db, instids, module, cname, solvers,
                     host=args.host, remotedir=args.remotedir, 
-                    keyfile=args.keyfile, verbose=args.verbose)
+                    keyfile=args.keyfile, subset=not args.full_db, 
+                    cache=not args.no_cache, codec=args.codec, 
+                    memory=memory if mem_model is not None else None, 
+                    walltime=walltime if wall_model is not None else None, 
+                    verbose=args.verbose)
     elif args.kind == 'queue':
         cqueue.submit(args.user, args.db, instids, module, cname, solvers, 
                       log=args.log, host=args.host, remotedir=args.remotedir, 
                       keyfile=args.keyfile, verbose=args.verbose,
-                      nodes=args.nodes, port=args.port)        
+                      nodes=args.nodes, port=args.port, 
+                      cache=not args.no_cache, codec=args.codec, 
+                      costs=dict((k.hex, v) for k, v in costs.items()),
+                      memory=dict(zip(instids, memory)) \
+                          if mem_model is not None else None)        
+    elif args.kind == 'local':
+        clocal.submit(args.db, instids, module, cname, solvers, 
+                      rundir=args.remotedir, outdb=args.outdb, jobs=args.jobs, 
+                      verbose=args.verbose)
 
 def condor_collect(args):
     remotedir = '/'.join([tools.cyclopts_remote_run_dir, args.remotedir])
@@ -81,7 +160,10 @@ def condor_collect(args):
             remotedir, args.user, args.host))
     cutils.collect(args.localdir, remotedir, args.user, 
                    host=args.host, outdb=args.outdb,                 
-                   clean=args.clean, keyfile=args.keyfile)
+                   clean=args.clean, keyfile=args.keyfile, 
+                   verbose=args.verbose, stream=args.stream, 
+                   threads=args.threads, nfiles=args.nfiles, 
+                   logs=not args.no_logs, codec=args.codec)
 
 def condor_rm(args):
     print("Removing condor jobs for {0}@{1}".format(args.user, args.host))
@@ -91,8 +173,17 @@ def condor_rm(args):
 def cyclopts_combine(args):
     print("Combining {0} files into one master named {1}".format(
             len(args.files), args.outdb))
-    tools.combine(iter(args.files), new_file=args.outdb, clean=args.clean,
-                  verbose=args.verbose)    
+    if args.link:
+        if args.clean:
+            raise ValueError('Can not clean files that are linked.')
+        tools.link_combine(iter(args.files), args.outdb, verbose=args.verbose)
+    elif args.jobs is not None and args.jobs > 1:
+        tools.parallel_combine(iter(args.files), new_file=args.outdb, 
+                               clean=args.clean, verbose=args.verbose, 
+                               jobs=args.jobs)
+    else:
+        tools.combine(iter(args.files), new_file=args.outdb, clean=args.clean,
+                      verbose=args.verbose)    
 
 def convert(args):
     """Converts a contiguous dataspace as defined by an input run control file
@@ -154,6 +245,13 @@ def convert(args):
     h5file.close()
 
 def execute(args):
+    try:
+        _execute(args)
+    finally:
+        # files opened when dereferencing links, e.g., in a --link master
+        cycio.close_linked_files()
+
+def _execute(args):
     indb = args.db
     outdb = args.outdb
     rc = tools.parse_rc(args.rc) if args.rc is not None else tools.RunControl()
@@ -202,31 +300,76 @@ def execute(args):
     path = '{0}/{1}'.format(fam.io_prefix, fam.property_table_name)
     instids = tools.collect_instids(h5file=h5in, path=path, rc=rc, 
                                     instids=instids)
+    model = _runtime_model(args.runtime_db, h5in, path)
+    instids = sched.schedule(h5in, path, instids, model=model)
     if verbose: 
         print("Executing {0} instances.".format(len(instids)))
 
+    # post processing during execution
+    sp_managers = []
+    if args.pp:
+        try:
+            sp = tools.get_obj(kind='species', rcs=obj_rcs, args=args)
+        except RuntimeError:
+            sp = None
+            warnings.warn(('No species was found, only family post processing '
+                           'will be performed.'), RuntimeWarning)
+        if sp is not None:
+            sp_managers = tools.io_managers(sp, (h5in, h5out, h5out))
+    
     # run each instance for each solver
+    tbl = result_manager.tables[result_tbl_name]
     for instid in instids:
         inst = fam.read_inst(instid, in_manager)
-        for kind in solvers:
-            solver = Solver(kind)
+        solns = []
+        if args.portfolio:
             if verbose:
-                print('Solving instance {0} with the {1} solver'.format(
-                        instid.hex, kind))
-            soln = fam.run_inst(inst, solver)
-            solnid = uuid.uuid4()
-            fam.record_soln(soln, solnid, inst, instid, out_manager)
-            tbl = result_manager.tables[result_tbl_name]
-            tbl.record_soln(soln, solnid, instid, solver)
+                print('Racing solvers {0} on instance {1}'.format(
+                        ", ".join(solvers), instid.hex))
+            for entry in portfolio.race(fam, inst, solvers, 
+                                        deadline=args.deadline):
+                solnid = uuid.uuid4()
+                if not entry.cancelled:
+                    fam.record_soln(entry.soln, solnid, inst, instid, 
+                                    out_manager, dense=args.dense)
+                    solns.append((solnid, entry.soln))
+                tbl.record_soln(entry.soln, solnid, instid, 
+                                Solver(entry.solver), cancelled=entry.cancelled)
+        else:
+            for kind in solvers:
+                solver = Solver(kind)
+                if verbose:
+                    print('Solving instance {0} with the {1} solver'.format(
+                            instid.hex, kind))
+                soln = fam.run_inst(inst, solver)
+                solnid = uuid.uuid4()
+                fam.record_soln(soln, solnid, inst, instid, out_manager, 
+                                dense=args.dense)
+                tbl.record_soln(soln, solnid, instid, solver)
+                solns.append((solnid, soln))
+        if args.pp:
+            props = fam.post_process_solns(inst, instid, solns, out_manager)
+            if len(sp_managers) > 0:
+                sids = tuple(solnid for solnid, _ in solns)
+                sp.post_process_chunk([(instid, sids)], props, sp_managers)
             
     # clean up
     out_manager.flush_tables()
     result_manager.flush_tables()
+    for m in sp_managers:
+        m.flush_tables()
     h5in.close()
     if h5out.isopen:
         h5out.close()
 
 def post_process(args):
+    try:
+        _post_process(args)
+    finally:
+        # files opened when dereferencing links, e.g., in a --link master
+        cycio.close_linked_files()
+
+def _post_process(args):
     # process cli args
     fam, sp = tools.fam_and_sp(args)
     h5files = (t.open_file(args.indb, mode='r'), 
@@ -234,27 +377,32 @@ def post_process(args):
                t.open_file(args.ppdb, mode='a'),)
     
     # setup table managers
-    fam_managers = tuple(
-        cycio.IOManager(
-            h5f, 
-            fam.register_tables(h5f, fam.io_prefix),
-            fam.register_groups(h5f, fam.io_prefix))
-        for h5f in h5files)
-    sp_managers = tuple(
-        cycio.IOManager(
-            h5f, 
-            sp.register_tables(h5f, sp.io_prefix),
-            sp.register_groups(h5f, sp.io_prefix))
-        for h5f in h5files)
+    fam_managers = tools.io_managers(fam, h5files)
+    sp_managers = tools.io_managers(sp, h5files)
     h5out = h5files[1]
     result_manager = cycio.IOManager(
         h5out, [cycio.ResultTable(h5out, path='/Results')])
     
     # do pp
-    tools.drive_post_process(res_tbl=result_manager.tables['Results'],
-                             fam=fam, fam_io_managers=fam_managers,
-                             sp=sp, sp_io_managers=sp_managers,
-                             verbose_freq=args.verbose_freq, limit=args.limit)
+    incremental = not args.all
+    if args.jobs is not None and args.jobs > 1:
+        nskipped = tools.parallel_post_process(
+            res_tbl=result_manager.tables['Results'],
+            indb=args.indb, outdb=args.outdb,
+            fam=fam, fam_io_manager=fam_managers[2],
+            sp=sp, sp_io_manager=sp_managers[2],
+            verbose_freq=args.verbose_freq, limit=args.limit, 
+            chunksize=args.chunksize, jobs=args.jobs, incremental=incremental)
+    else:
+        nskipped = tools.drive_post_process(
+            res_tbl=result_manager.tables['Results'],
+            fam=fam, fam_io_managers=fam_managers,
+            sp=sp, sp_io_managers=sp_managers,
+            verbose_freq=args.verbose_freq, limit=args.limit, 
+            chunksize=args.chunksize, incremental=incremental)
+    if nskipped > 0:
+        print('{0} solutions were already post processed and were '
+              'skipped.'.format(nskipped))
     
     # clean up
     for m in list(fam_managers) + list(sp_managers) + [result_manager]:
@@ -268,7 +416,7 @@ def col2grp(args):
     out_old = args.out_old
     in_new = args.in_new
     out_new = args.out_new
-    tools.col2grp(in_old, out_old, in_new, out_new)    
+    tools.col2grp(in_old, out_old, in_new, out_new, chunksize=args.chunksize)
 
 def update_cde(args):
     user = args.user
@@ -307,22 +455,20 @@ def update_cde(args):
     tarname = 'cde-cyclopts-{0}.tar.gz'.format(fname)
 
     print('tarring up', pkgdir, 'into', tarname)
-    with tarfile.open(tarname, 'w:gz') as tar:
-        tar.add(pkgdir)
+    # execute nodes extract bundles with gzip, so only gzip-compatible codecs
+    # are used
+    with carchive.ArchiveWriter(tarname, codec=args.codec) as tar:
+        tar.add(pkgdir, pkgdir)
     
     ffrom = tarname
     fto = '/'.join([cutils.batlab_base_dir_template.format(user=user), 
                     tarname])
-    client = pm.SSHClient()
-    client.set_missing_host_key_policy(pm.AutoAddPolicy())
-    _, keyfile, pw = tools.ssh_test_connect(client, host, user, keyfile, auth=True)
-    client.connect(host, username=user, key_filename=keyfile, password=pw)
-    ftp = client.open_sftp()
+    client = tools.ssh_sessions.client(host, user, keyfile=keyfile)
     print("Copying {0} to {user}@{host}:{1}.".format(
             ffrom, fto, user=user, host=host))
-    ftp.put(ffrom, fto)
-    ftp.close()    
-    client.close()
+    rpath = cutils.upload_cached(ffrom, user, host=host, keyfile=keyfile, 
+                                 verbose=True)
+    cutils.exec_remote_cmd(client, 'ln -sf {0} {1}'.format(rpath, fto))
 
     if clean:
         rms = [tarname, 'cde.options', indb, outdb, ppdb, newin, newout]
@@ -331,6 +477,13 @@ def update_cde(args):
                 os.remove(rm)
         shutil.rmtree(pkgdir)
     
+def bench_archive(args):
+    """Times archiving files with each archive codec"""
+    results = carchive.benchmark(args.files, names=args.codecs, 
+                                 threads=args.threads, 
+                                 bandwidth=args.bandwidth, verbose=True)
+    print("The fastest codec to upload is {0}.".format(results[0][0]))
+
 def dump(args):
     """Dumps information about instances in a database"""
     h5file = t.open_file(args.db, mode='r', filters=tools.FILTERS)
@@ -429,7 +582,8 @@ def gen_parser():
     exech = ("Executes a parameter sweep as defined "
              "by the input database and other command line arguments.")
     exec_parser = sp.add_parser('exec', 
-                                parents=[cyclopts_parser, family_parser], 
+                                parents=[cyclopts_parser, family_parser, 
+                                         species_parser], 
                                 help=exech)
     exec_parser.set_defaults(func=execute)
     db = ("An HDF5 Cyclopts database (e.g., the result of 'cyclopts convert').")
@@ -449,6 +603,30 @@ def gen_parser():
     conds = ("A dictionary representation of execution conditions. This CLI "
              "argument can be used instead of placing them in an RC file.")
     exec_parser.add_argument('--conds', dest='conds', default='{}', help=conds)
+    portfolioh = ("Race all solvers on each instance in parallel, cancelling "
+                  "the remaining solvers once an exact solver completes or "
+                  "the deadline is reached. Cancelled solvers are recorded in "
+                  "Results with the cancelled flag set.")
+    exec_parser.add_argument('--portfolio', dest='portfolio', default=False, 
+                             action='store_true', help=portfolioh)
+    deadline = ("The time limit (in seconds) of a race in portfolio mode.")
+    exec_parser.add_argument('--deadline', dest='deadline', type=float, 
+                             default=None, help=deadline)
+    pp = ("Post process each solution as it is found, writing family and "
+          "species post-processed tables to the output database (i.e., a "
+          "separate 'cyclopts pp' step is not required).")
+    exec_parser.add_argument('--pp', dest='pp', default=False, 
+                             action='store_true', help=pp)
+    dense = ("Record the values of all solution variables (e.g., the flow of "
+             "every arc) rather than only non-zero values.")
+    exec_parser.add_argument('--dense', dest='dense', default=False, 
+                             action='store_true', help=dense)
+    runtime_db = ("A database with the Results of an earlier run used to fit "
+                  "a runtime model. Instances are executed in "
+                  "longest-predicted-first order, by default the prediction "
+                  "is based on instance size.")
+    exec_parser.add_argument('--runtime-db', dest='runtime_db', default=None, 
+                             help=runtime_db)
     verbose = ("Print verbose output during execution.")
     exec_parser.add_argument('-v', '--verbose', dest='verbose', 
                              action='store_true', default=False, help=verbose)
@@ -477,6 +655,18 @@ def gen_parser():
                            default=None, help=vf)
     lim = ("Post process only X instances (used for profiling/testing).")
     pp_parser.add_argument('--limit', dest='limit', type=int, default=None, help=lim)
+    chunksize = ("The number of instances whose solutions are read and post "
+                 "processed at once.")
+    pp_parser.add_argument('--chunksize', dest='chunksize', type=int, 
+                           default=1000, help=chunksize)
+    jobs = ("The number of processes among which chunks of instances are "
+            "distributed. The result is identical to a serial run.")
+    pp_parser.add_argument('--jobs', dest='jobs', type=int, default=None, 
+                           help=jobs)
+    ppall = ("Post process all solutions, by default solutions already found "
+             "in the post processed database are skipped.")
+    pp_parser.add_argument('--all', dest='all', default=False, 
+                           action='store_true', help=ppall)
             
     #
     # execute instances with condor
@@ -498,6 +688,21 @@ def gen_parser():
     counth = 'Only count instances to be run.'
     submit_parser.add_argument('--count', default=False, action='store_true', 
                                dest='only_count', help=counth)    
+    runtime_db_submit = runtime_db + (" If it has job telemetry (see "
+                                      "condor-collect), the memory and "
+                                      "walltime of each job are also "
+                                      "predicted.")
+    submit_parser.add_argument('--runtime-db', dest='runtime_db', default=None, 
+                               help=runtime_db_submit)
+    per_job = ("The maximum number of instances to run in each job of a dag "
+               "submission. Instances are packed into the fewest such jobs "
+               "with balanced predicted costs.")
+    submit_parser.add_argument('--per-job', dest='per_job', type=int, 
+                               default=None, help=per_job)
+    target = ("The target number of seconds of each job of a dag submission, "
+              "as predicted from the solution times in a runtime-db.")
+    submit_parser.add_argument('--target-seconds', dest='target_seconds', 
+                               type=float, default=None, help=target)
     
     # condor related
     uh = ("The condor user name.")
@@ -510,14 +715,51 @@ def gen_parser():
     submit_parser.add_argument('--keyfile', dest='keyfile', help=keyfile, 
                                default=None)    
     remotedir = ("The remote directory (relative to ~/cyclopts-runs)"
-                 " on the submit node in which to run cyclopts jobs.")
+                 " on the submit node in which to run cyclopts jobs, or the "
+                 "local directory for local jobs.")
     timestamp = "_".join([str(t) for t in datetime.now().timetuple()][:-3])
     submit_parser.add_argument(
         '-d', '--remotedir', dest='remotedir', help=remotedir, 
         default='run_{0}'.format(timestamp))      
-    kind = ("The kind of condor submission to use.")
-    submit_parser.add_argument('-k', '--kind', choices=['dag', 'queue'], 
+    kind = ("The kind of condor submission to use, or local to execute jobs "
+            "in local processes.")
+    submit_parser.add_argument('-k', '--kind', choices=['dag', 'queue', 'local'], 
                                default='queue', help=kind)
+    full_db = ("Transfer the full input database to each dag job, rather "
+               "than a database with only the job's instances.")
+    submit_parser.add_argument('--full-db', dest='full_db', default=False, 
+                               action='store_true', help=full_db)
+    no_cache = ("Transfer the input database with the submission rather than "
+                "through the remote upload cache.")
+    submit_parser.add_argument('--no-cache', dest='no_cache', default=False, 
+                               action='store_true', help=no_cache)
+    codec = ("The archive codec of the submission tarball.")
+    submit_parser.add_argument('--codec', dest='codec', default='gzip', 
+                               choices=sorted(carchive.codecs), help=codec)
+    memory_margin = ("The factor by which the memory predicted for a job from "
+                     "the job telemetry in a runtime-db is increased when "
+                     "requested.")
+    submit_parser.add_argument('--memory-margin', dest='memory_margin', 
+                               type=float, default=1.25, help=memory_margin)
+    memory_minimum = ("The least memory (MB) requested for a job whose memory "
+                      "is predicted from job telemetry.")
+    submit_parser.add_argument('--memory-minimum', dest='memory_minimum', 
+                               type=float, default=512, help=memory_minimum)
+    walltime_margin = ("The factor by which the runtime predicted for a dag "
+                       "job from the job telemetry in a runtime-db is "
+                       "increased to give the time after which it is held.")
+    submit_parser.add_argument('--walltime-margin', dest='walltime_margin', 
+                               type=float, default=3., help=walltime_margin)
+    jobs = ("The number of local worker processes, by default one per core. "
+            "Unless packed with --per-job or --target-seconds, instances are "
+            "packed into one local job per worker with balanced predicted "
+            "costs.")
+    submit_parser.add_argument('--jobs', dest='jobs', type=int, default=None, 
+                               help=jobs)
+    outdb = ("The database into which local job output is combined, relative "
+             "to the run directory.")
+    submit_parser.add_argument('--outdb', dest='outdb', 
+                               default='cyclopts_results.h5', help=outdb)
     log = ("Whether to keep a log of worker queue data.")
     submit_parser.add_argument('--log', dest='log', default=False, 
                                action='store_true', help=log) 
@@ -557,6 +799,29 @@ def gen_parser():
     clean = ("Clean up the submit node after.")
     collect_parser.add_argument('--clean', dest='clean', help=clean,
                                 action='store_true', default=False)    
+    stream = ("Retrieve output files in parallel as they are finished and "
+              "combine them while others are retrieved, rather than tarring "
+              "all output.")
+    collect_parser.add_argument('--stream', dest='stream', help=stream,
+                                action='store_true', default=False)    
+    threads = ("The number of files to retrieve at once when streaming.")
+    collect_parser.add_argument('--threads', dest='threads', type=int, 
+                                default=4, help=threads)    
+    nfiles = ("The number of output files expected when streaming. If "
+              "provided, collection waits for unfinished jobs.")
+    collect_parser.add_argument('--nfiles', dest='nfiles', type=int, 
+                                default=None, help=nfiles)    
+    no_logs = ("Do not retrieve job logs and record their telemetry in the "
+               "/Meta/Jobs table of the output database.")
+    collect_parser.add_argument('--no-logs', dest='no_logs', help=no_logs,
+                                action='store_true', default=False)    
+    codec = ("The archive codec used to bundle output on the submit node. "
+             "Output databases are compressed, so none is often fastest.")
+    collect_parser.add_argument('--codec', dest='codec', default='gzip', 
+                                choices=sorted(carchive.codecs), help=codec)
+    verbose = ("Print output during collection.")
+    collect_parser.add_argument('-v', '--verbose', dest='verbose', 
+                                action='store_true', default=False, help=verbose)
     
     #
     # remove processes on condor
@@ -609,6 +874,9 @@ def gen_parser():
     fname = ("The function to wrap with cde.")
     cde_parser.add_argument('--fname', dest='fname', default='exec', 
                             help=fname)    
+    codec = ("The archive codec of the CDE tarball.")
+    cde_parser.add_argument('--codec', dest='codec', default='gzip', 
+                            choices=['gzip', 'pigz'], help=codec)    
     
     #
     # combine a collection of databases
@@ -628,6 +896,15 @@ def gen_parser():
     verbose = ("Print output during the combination process.")
     combine_parser.add_argument('-v', '--verbose', dest='verbose', 
                                 action='store_true', default=False, help=verbose)
+    jobs = ("The number of processes with which to combine files in a "
+            "parallel reduction tree.")
+    combine_parser.add_argument('--jobs', dest='jobs', type=int, default=None, 
+                                help=jobs)
+    link = ("Write a master database that links to per-instance and "
+            "per-solution data in the original files rather than copying it. "
+            "The master must be kept alongside the original files.")
+    combine_parser.add_argument('--link', dest='link', action='store_true', 
+                                default=False, help=link)
     
     #
     # translate a database in id-column form to id-group form 
@@ -643,6 +920,30 @@ def gen_parser():
     col2grp_parser.add_argument('--in_new', help=in_new, default='in_new.h5')
     out_new = 'the new output database'
     col2grp_parser.add_argument('--out_new', help=out_new, default='out_new.h5')
+    chunksize = 'the number of rows of the old databases read at once'
+    col2grp_parser.add_argument('--chunksize', dest='chunksize', type=int, 
+                                default=None, help=chunksize)
+
+    #
+    # benchmark archive codecs
+    #
+    benchh = ("Times archiving files with each available archive codec.")
+    bench_parser = sp.add_parser('bench-archive', parents=[cyclopts_parser], 
+                                 help=benchh)
+    bench_parser.set_defaults(func=bench_archive)
+    files = ("The files to archive.")
+    bench_parser.add_argument('files', nargs='+', help=files)
+    codecs = ("The codecs to benchmark, by default all that are available.")
+    bench_parser.add_argument('--codecs', nargs='+', dest='codecs', 
+                              default=None, choices=sorted(carchive.codecs), 
+                              help=codecs)
+    threads = ("The number of compression threads, by default one per core.")
+    bench_parser.add_argument('--threads', dest='threads', type=int, 
+                              default=None, help=threads)
+    bandwidth = ("The upload bandwidth in MB/s, used to estimate the time until "
+                 "an archive is uploaded.")
+    bench_parser.add_argument('--bandwidth', dest='bandwidth', type=float, 
+                              default=None, help=bandwidth)
 
     #
     # dump information about an instance db
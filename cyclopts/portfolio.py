@@ -0,0 +1,117 @@
+"""This module provides a portfolio mode for executing problem instances, in
+which a collection of solvers race on the same instance in parallel processes.
+Losing solvers are cancelled once a winner proves optimality or a deadline is
+reached.
+"""
+from __future__ import print_function
+
+import time
+import warnings
+import multiprocessing as mp
+from collections import namedtuple
+
+from cyclopts.problems import Solver, ProbSolution
+
+"""solvers whose solutions are proven optimal upon completion"""
+exact_solvers = set(['cbc', 'highs'])
+
+"""solvers of a relaxed problem, whose solutions are not generally feasible"""
+relaxed_solvers = set(['clp', 'highs-lp'])
+
+"""The outcome of a single solver in a race. If the solver was cancelled (or
+failed), soln is a ProbSolution with the elapsed wall time and an undefined
+objective."""
+Entry = namedtuple('Entry', ['solver', 'soln', 'cancelled'])
+
+def _race_worker(conn, fam, inst, kind):
+    try:
+        soln = fam.run_inst(inst, Solver(kind))
+        conn.send((True, fam.dump_soln(soln)))
+    except Exception as e:
+        conn.send((False, str(e)))
+    conn.close()
+
+def winner(entries):
+    """Returns the best entry of a race, i.e., the completed exact solver if
+    there is one, otherwise the completed solver of the unrelaxed problem (or,
+    failing that, of any problem) with the lowest objective. None is returned
+    if all solvers were cancelled."""
+    done = [e for e in entries if not e.cancelled]
+    for pool in ([e for e in done if e.solver in exact_solvers],
+                 [e for e in done if e.solver not in relaxed_solvers],
+                 done):
+        if len(pool) > 0:
+            return min(pool, key=lambda e: e.soln.objective)
+    return None
+
+def race(fam, inst, solvers, deadline=None, poll=0.01):
+    """Races solvers on an instance, each in its own process. The race ends
+    once the winner (see winner()) is an exact solver, or at the deadline.
+
+    Parameters
+    ----------
+    fam : ProblemFamily
+        the family of the instance
+    inst : tuple or other
+        a representation of a problem instance, as returned by fam.read_inst()
+    solvers : list of str
+        the solver types to race
+    deadline : float, optional
+        the maximum wall time (in seconds) to wait for solvers to complete
+    poll : float, optional
+        the time (in seconds) between checks for solver completion
+
+    Returns
+    -------
+    entries : list of Entry
+        the outcome of each solver, in the order given, solvers that failed
+        are recorded as cancelled
+    """
+    start = time.time()
+    procs, solns, failed = {}, {}, {}
+    try:
+        for kind in solvers:
+            recv, send = mp.Pipe(duplex=False)
+            p = mp.Process(target=_race_worker, args=(send, fam, inst, kind))
+            p.daemon = True
+            p.start()
+            send.close()
+            procs[kind] = (p, recv)
+
+        while len(solns) + len(failed) < len(procs):
+            for kind, (p, recv) in procs.items():
+                if kind in solns or kind in failed or not recv.poll():
+                    continue
+                try:
+                    success, data = recv.recv()
+                except EOFError: # the process died without a result
+                    success, data = False, 'exit code {0}'.format(p.exitcode)
+                if success:
+                    solns[kind] = fam.load_soln(data)
+                else:
+                    failed[kind] = time.time() - start
+                    warnings.warn('Solver {0} failed: {1}'.format(kind, data), 
+                                  RuntimeWarning)
+            best = winner([Entry(k, v, False) for k, v in solns.items()])
+            if best is not None and best.solver in exact_solvers:
+                break
+            if deadline is not None and time.time() - start > deadline:
+                break
+            time.sleep(poll)
+        elapsed = time.time() - start
+    finally:
+        for p, recv in procs.values():
+            if p.is_alive():
+                p.terminate()
+            p.join()
+            recv.close()
+
+    entries = []
+    for kind in solvers:
+        if kind in solns:
+            entries.append(Entry(kind, solns[kind], False))
+        else:
+            soln = ProbSolution(failed.get(kind, elapsed), float('nan'), 
+                                fam.name)
+            entries.append(Entry(kind, soln, True))
+    return entries
@@ -5,6 +5,15 @@
 
 from cyclopts._cproblem import *
 
+class ChunkProps(dict):
+    """A mapping of instance UUIDs to the return value of
+    ProblemFamily.post_process(), as returned by
+    ProblemFamily.post_process_chunk() by default."""
+
+    def instance(self, iid):
+        """Returns the post-processed properties of an instance."""
+        return self[iid]
+
 class ProblemFamily(object):
     """A class representing families of problems that share the same
     structure.
@@ -39,6 +48,19 @@ class ProblemFamily(object):
         """
         raise NotImplementedError
 
+    @property            
+    def pp_table_name(cls):
+        """Derived classes can implement this function and return the name of
+        the table to which post processed data is written, with a row per
+        solution identified by a solnid column.
+
+        Returns
+        -------
+        name : string or None
+            The name of this family's post processing table, None by default
+        """
+        return None
+
     def __init__(self):
         pass
 
@@ -97,7 +119,8 @@ class ProblemFamily(object):
         """
         raise NotImplementedError
 
-    def record_soln(self, soln, soln_uuid, inst, inst_uuid, tables):
+    def record_soln(self, soln, soln_uuid, inst, inst_uuid, tables, 
+                    dense=False):
         """Derived classes must implement this function to return a list of
         
         Parameters
@@ -112,9 +135,46 @@ class ProblemFamily(object):
             The uuid of the instance
         tables : list of cyclopts_io.Table
             The tables that can be written to
+        dense : bool, optional
+            whether to record all values of a solution, rather than only 
+            non-zero values
         """
         raise NotImplementedError
 
+    def dump_soln(self, soln):
+        """Derived classes must implement this function if their solutions can
+        not be pickled, returning a picklable representation of a solution that
+        can be provided to load_soln(). Solutions are passed between processes,
+        e.g., when racing solvers in portfolio mode.
+
+        Parameters
+        ----------
+        soln : ProbSolution or similar
+            A representation of a problem solution
+
+        Returns
+        -------
+        data : picklable object
+            A picklable representation of the solution
+        """
+        return soln
+
+    def load_soln(self, data):
+        """Derived classes must implement this function if they implement
+        dump_soln(), returning the solution represented by data.
+
+        Parameters
+        ----------
+        data : picklable object
+            A representation of a solution, as returned by dump_soln()
+
+        Returns
+        -------
+        soln : ProbSolution or similar
+            A representation of a problem solution
+        """
+        return data
+
     def read_inst(self, uuid, tables):
         """Derived classes must implement this function to return a tuple
         instance structures that can be provided to the run_inst function.
@@ -175,6 +235,53 @@ class ProblemFamily(object):
         """
         pass
 
+    def post_process_chunk(self, iid_to_sids, tbls):
+        """Post processes a chunk of instances. Derived classes can override
+        this function to amortize reads and vectorize computation across
+        instances. By default, each instance is post processed in turn.
+        
+        Parameters
+        ----------
+        iid_to_sids : list of (UUID, tuple of UUIDs) pairs
+            instance UUIDs and their corresponding solution UUIDs
+        tbls : 3-tuple of cyclopts.cyclopts_io.Tables
+            tables from an input file, tables from an output file,
+            and tables from a post-processed file
+
+        Returns
+        -------
+        props : ChunkProps or other
+            the post-processed properties of the chunk, which must provide
+            those of each instance (i.e., the return value of post_process())
+            with an instance(iid) method
+        """
+        return ChunkProps((iid, self.post_process(iid, sids, tbls)) \
+                              for iid, sids in iid_to_sids)
+
+    def post_process_solns(self, inst, instid, solns, io_manager):
+        """Derived classes can implement this function to post process the
+        solutions of an instance from memory as they are found, rather than in
+        a separate post-processing step.
+        
+        Parameters
+        ----------
+        inst : tuple or other
+            A representation of a problem instance
+        instid : UUID 
+            UUID of the instance
+        solns : list of (UUID, ProbSolution or similar) pairs
+            the instance's solutions and their UUIDs
+        io_manager : cyclopts.cyclopts_io.IOManager
+            iomanager from the file to which post-processed data is written
+
+        Returns
+        -------
+        props : other
+            as defined by the return value of post_process_chunk() for a chunk
+            of only this instance
+        """
+        pass
+
 class ProblemSpecies(object):
     """A class represnting species of problems that share the same parameter
     space and ProblemFamiliy."""
@@ -208,6 +315,19 @@ class ProblemSpecies(object):
         """Returns the HDF5 group location for tables of this species"""
         return '/{0}/{1}'.format('Species', cls.name)
 
+    @property            
+    def pp_table_name(cls):
+        """Derived classes can implement this function and return the name of
+        the table to which post processed data is written, with a row per
+        solution identified by a solnid column.
+
+        Returns
+        -------
+        name : string or None
+            The name of this species' post processing table, None by default
+        """
+        return None
+
     def __init__(self):
         pass
 
@@ -337,3 +457,25 @@ class ProblemSpecies(object):
             and tables from a post-processed file
         """
         pass
+
+    def post_process_chunk(self, iid_to_sids, props, tbls):
+        """Post processes a chunk of instances. Derived classes can override
+        this function to amortize reads and vectorize computation across
+        instances. By default, each instance is post processed in turn.
+        
+        Parameters
+        ----------
+        iid_to_sids : list of (UUID, tuple of UUIDs) pairs
+            instance UUIDs and their corresponding solution UUIDs
+        props : ChunkProps, other, possibly None
+            as defined by the return value of the species' family's 
+            post_process_chunk(), the properties of each instance are given
+            by props.instance(iid)
+        tbls : 3-tuple of cyclopts.cyclopts_io.Tables
+            tables from an input file, tables from an output file,
+            and tables from a post-processed file
+        """
+        for iid, sids in iid_to_sids:
+            self.post_process(iid, sids, 
+                              None if props is None else props.instance(iid), 
+                              tbls)
@@ -0,0 +1,388 @@
+"""This module provides tools for predicting the cost of executing problem
+instances and for scheduling that work across a number of execution slots.
+
+Costs are predicted from the instance property table of a family (e.g.,
+ResourceExchange's ExchangeInstProperties) using a RuntimeModel. By default, the
+model is a relative heuristic in the size of an instance; it can also be fit to
+the solution times found in the Results table of earlier runs.
+
+The memory and walltime to request for each job are likewise predicted from
+instance properties using models fit to the job telemetry table (see
+cyclopts.condor.telemetry) of earlier runs.
+"""
+from __future__ import print_function
+
+import heapq
+import math
+import numpy as np
+
+from cyclopts import tools
+
+"""instance property columns used to predict execution cost"""
+cost_cols = ['n_arcs', 'n_constrs', 'excl_frac']
+
+"""the memory (MB) requested for a job if no memory model is available"""
+default_memory = 2500
+
+"""the walltime (s) allowed for a job if no walltime model is available"""
+default_walltime = 60 * 60 * 5 # 5 hours
+
+class RuntimeModel(object):
+    """A linear model of the time to execute an instance given its properties,
+
+    .. math::
+
+        t = c_0 + c_1 n_{arcs} + c_2 n_{constrs} + c_3 n_{arcs} f_{excl}
+
+    The last term accounts for exclusive arcs, which make an instance a mixed
+    integer program rather than a linear one. The default coefficients give a
+    relative cost (not a time in seconds); use fit() to calibrate them against
+    observed times.
+    """
+
+    def __init__(self, coeffs=None):
+        """Parameters
+        ----------
+        coeffs : array-like, optional
+            the model coefficients, c_0 through c_3
+        """
+        self.coeffs = np.array([0., 1., 1., 1.]) if coeffs is None \
+            else np.asarray(coeffs, dtype=np.float64)
+
+    @staticmethod
+    def features(props):
+        """Returns the model's feature matrix for an array of instance
+        properties with (at least) the columns in cost_cols"""
+        x = np.empty((len(props), 4), dtype=np.float64)
+        x[:, 0] = 1
+        x[:, 1] = props['n_arcs']
+        x[:, 2] = props['n_constrs']
+        x[:, 3] = props['n_arcs'] * props['excl_frac']
+        return x
+
+    def fit(self, props, times):
+        """Fits the model coefficients with a least squares regression.
+
+        Parameters
+        ----------
+        props : numpy structured array
+            instance properties
+        times : array-like
+            the observed execution time of each instance
+
+        Returns
+        -------
+        self : RuntimeModel
+        """
+        return self.fit_features(self.features(props), times)
+
+    def fit_features(self, x, times):
+        """Fits the model coefficients to a feature matrix with a least squares
+        regression."""
+        self.coeffs = np.linalg.lstsq(x, np.asarray(times, dtype=np.float64),
+                                      rcond=-1)[0]
+        return self
+
+    def predict(self, props):
+        """Returns an array of predicted (non-negative) costs"""
+        return np.maximum(self.features(props).dot(self.coeffs), 0)
+
+class MemoryModel(RuntimeModel):
+    """A linear model of the peak memory, in MB, used to execute an instance
+    given its properties, with the features of a RuntimeModel. By default, the
+    model predicts default_memory for all instances; use fit() to calibrate it
+    against observed memory usage (e.g., with fit_memory_model()).
+    """
+
+    def __init__(self, coeffs=None):
+        """Parameters
+        ----------
+        coeffs : array-like, optional
+            the model coefficients, c_0 through c_3
+        """
+        coeffs = [default_memory, 0., 0., 0.] if coeffs is None else coeffs
+        super(MemoryModel, self).__init__(coeffs)
+
+def _prop_rows(props, ids, colname='instid'):
+    """Returns the row of the property array for each id and a mask of ids that
+    were found."""
+    order = np.argsort(props[colname])
+    idx = np.searchsorted(props[colname], ids, sorter=order)
+    idx[idx == len(props)] = 0
+    idx = order[idx]
+    return idx, props[colname][idx] == ids
+
+def _job_telemetry(prop_node, jobs_node, col, colname='instid'):
+    """Returns job telemetry rows with a finite value in a column and the
+    property row of each, sorted by job (i.e., job id and submit time), and the
+    index of the first row of each job."""
+    props = prop_node.read()
+    jobs = jobs_node.read()
+    jobs = jobs[np.isfinite(jobs[col])]
+    idx, found = _prop_rows(props, jobs['instid'], colname=colname)
+    jobs, idx = jobs[found], idx[found]
+    if len(jobs) == 0:
+        raise ValueError('No job telemetry found for instances in {0}'.format(
+                prop_node._v_pathname))
+    order = np.lexsort((jobs['submit'], jobs['jobid']))
+    jobs, idx = jobs[order], idx[order]
+    first = np.ones(len(jobs), dtype=bool)
+    first[1:] = (jobs['jobid'][1:] != jobs['jobid'][:-1]) | \
+        (jobs['submit'][1:] != jobs['submit'][:-1])
+    return props, jobs, idx, np.flatnonzero(first)
+
+def fit_memory_model(prop_node, jobs_node, colname='instid'):
+    """Returns a MemoryModel fit to the peak memory of jobs in earlier runs. A
+    job's peak memory is attributed to its largest instance.
+
+    Parameters
+    ----------
+    prop_node : PyTables Table
+        an instance property table
+    jobs_node : PyTables Table
+        a job telemetry table
+    colname : str, optional
+        the instance id column name
+
+    Returns
+    -------
+    model : MemoryModel
+    """
+    props, jobs, idx, starts = _job_telemetry(prop_node, jobs_node, 'memory', 
+                                              colname=colname)
+    size = props['n_arcs'][idx] + props['n_constrs'][idx]
+    ends = np.append(starts[1:], len(jobs))
+    rows = [s + np.argmax(size[s:e]) for s, e in zip(starts, ends)]
+    return MemoryModel().fit(props[idx[rows]], jobs['memory'][rows])
+
+def fit_walltime_model(prop_node, jobs_node, colname='instid'):
+    """Returns a RuntimeModel fit to the runtime of successful jobs in earlier
+    runs, including the overhead of each instance they execute. A job's
+    runtime is modeled as the sum of that of its instances.
+
+    Parameters
+    ----------
+    prop_node : PyTables Table
+        an instance property table
+    jobs_node : PyTables Table
+        a job telemetry table
+    colname : str, optional
+        the instance id column name
+
+    Returns
+    -------
+    model : RuntimeModel
+    """
+    props, jobs, idx, starts = _job_telemetry(prop_node, jobs_node, 'runtime', 
+                                              colname=colname)
+    x = np.add.reduceat(RuntimeModel.features(props[idx]), starts, axis=0)
+    ok = jobs['exit'][starts] == 0
+    if not np.any(ok):
+        raise ValueError('No successful jobs found for instances in '
+                         '{0}'.format(prop_node._v_pathname))
+    return RuntimeModel().fit_features(x[ok], jobs['runtime'][starts][ok])
+
+def fit_runtime_model(prop_node, res_node, solvers=None, colname='instid'):
+    """Returns a RuntimeModel fit to the solution times of earlier runs. The
+    time of an instance is the sum of times of all solvers that executed it.
+
+    Parameters
+    ----------
+    prop_node : PyTables Table
+        an instance property table
+    res_node : PyTables Table
+        a Results table
+    solvers : collection of str, optional
+        only consider solution times of these solvers
+    colname : str, optional
+        the instance id column name
+
+    Returns
+    -------
+    model : RuntimeModel
+    """
+    props = prop_node.read()
+    res = res_node.read()
+    if solvers is not None:
+        res = res[np.in1d(res['solver'], list(solvers))]
+
+    # join solution times to instance properties
+    idx, found = _prop_rows(props, res['instid'], colname=colname)
+    if not np.any(found):
+        raise ValueError('No Results found for instances in {0}'.format(
+                prop_node._v_pathname))
+    times = np.bincount(idx[found], weights=res['time'][found],
+                        minlength=len(props))
+    rows = np.unique(idx[found])
+    return RuntimeModel().fit(props[rows], times[rows])
+
+def predict_costs(h5file, path, instids, model=None, colname='instid'):
+    """Returns a mapping from instance ids to their predicted costs. Instances
+    not found in the property table are given the average predicted cost.
+
+    Parameters
+    ----------
+    h5file : PyTables File object
+        the file with instance properties
+    path : str
+        the path to a property table node
+    instids : collection of uuids
+        the instance ids
+    model : RuntimeModel, optional
+        the cost model, a default RuntimeModel is used if None
+    colname : str, optional
+        the instance id column name
+
+    Returns
+    -------
+    costs : dict
+        a mapping from uuids to costs
+    """
+    model = model if model is not None else RuntimeModel()
+    instids = list(instids)
+    props = h5file.get_node(path).read()
+    keys = np.array([x.bytes for x in instids], dtype=props.dtype[colname])
+    props = props[np.in1d(props[colname], keys)]
+    vals = model.predict(props)
+    found = dict(zip((tools.str_to_uuid(x) for x in props[colname]), vals))
+    default = vals.mean() if len(vals) > 0 else 0.
+    return dict((x, found.get(x, default)) for x in instids)
+
+def order(costs):
+    """Returns keys of a cost mapping in longest-predicted-first order, ties are
+    broken by key."""
+    return [k for k, _ in sorted(costs.items(), key=lambda x: (-x[1], x[0]))]
+
+def pack(costs, nbins, max_items=None):
+    """Packs work into a number of bins using the longest processing time (LPT)
+    rule, i.e., the next-longest item is always added to the least-loaded bin.
+
+    Parameters
+    ----------
+    costs : dict
+        a mapping from items to costs
+    nbins : int
+        the number of bins (e.g., execution slots)
+    max_items : int, optional
+        the maximum number of items in each bin, a full bin is given no more
+        items (nbins * max_items must be at least the number of items)
+
+    Returns
+    -------
+    bins : list of lists
+        items in each bin, each in longest-first order
+    """
+    nbins = max(1, min(nbins, len(costs)))
+    if max_items is not None and nbins * max_items < len(costs):
+        raise ValueError('{0} bins of {1} items can not hold {2} items'.format(
+                nbins, max_items, len(costs)))
+    bins = [[] for _ in range(nbins)]
+    loads = [(0., i) for i in range(nbins)]
+    for k in order(costs):
+        load, i = heapq.heappop(loads)
+        bins[i].append(k)
+        if max_items is None or len(bins[i]) < max_items:
+            heapq.heappush(loads, (load + costs[k], i))
+    return bins
+
+def pack_jobs(costs, per_job=None, target=None):
+    """Packs work into jobs, e.g., to amortize the overhead of starting a job
+    over many small instances. Items are considered longest-first.
+
+    Parameters
+    ----------
+    costs : dict
+        a mapping from items to costs
+    per_job : int, optional
+        the maximum number of items in each job, items are packed into the
+        fewest such jobs with balanced loads (see pack())
+    target : float, optional
+        the target cost of each job, an item is added to the least-loaded job
+        if that job remains within the target, otherwise a new job is started
+        (i.e., an item that exceeds the target is run alone)
+
+    Returns
+    -------
+    jobs : list of lists
+        items in each job, each in longest-first order
+    """
+    keys = order(costs)
+    if per_job is not None:
+        per_job = max(1, per_job)
+        njobs = int(math.ceil(len(keys) / float(per_job)))
+        return pack(costs, njobs, max_items=per_job)
+    if target is None:
+        return [[k] for k in keys]
+    jobs = []
+    loads = []
+    for k in keys:
+        if len(loads) > 0 and loads[0][0] + costs[k] <= target:
+            load, i = heapq.heappop(loads)
+        else:
+            load, i = 0., len(jobs)
+            jobs.append([])
+        jobs[i].append(k)
+        heapq.heappush(loads, (load + costs[k], i))
+    return jobs
+
+def schedule(h5file, path, instids, model=None, colname='instid'):
+    """Returns a list of instids ordered longest-predicted-first, see
+    predict_costs() for a description of parameters."""
+    return order(predict_costs(h5file, path, instids, model=model,
+                               colname=colname))
+
+def memory_requests(h5file, path, jobs, model=None, margin=1.25, 
+                    minimum=512, colname='instid'):
+    """Returns the memory, in MB, to request for each job, i.e., the predicted
+    peak memory of its largest instance times a safety margin, but no less
+    than a minimum. If no model is given, default_memory is requested for all
+    jobs.
+
+    Parameters
+    ----------
+    h5file : PyTables File object
+        the file with instance properties
+    path : str
+        the path to a property table node
+    jobs : list of lists
+        the instids (uuids) of each job
+    model : MemoryModel, optional
+        the memory model
+    margin : float, optional
+        the factor by which predictions are increased
+    minimum : float, optional
+        the least memory to request, e.g., if a model fit to few jobs predicts
+        little (or no) memory for small instances
+    colname : str, optional
+        the instance id column name
+
+    Returns
+    -------
+    memory : list of int
+        the memory to request for each job
+    """
+    if model is None:
+        return [default_memory] * len(jobs)
+    mem = predict_costs(h5file, path, [x for job in jobs for x in job], 
+                        model=model, colname=colname)
+    return [int(math.ceil(max(minimum, margin * max(mem[x] for x in job)))) \
+                for job in jobs]
+
+def walltime_requests(h5file, path, jobs, model=None, margin=3., 
+                      minimum=600., colname='instid'):
+    """Returns the walltime, in seconds, to allow each job, i.e., the
+    predicted runtime of all of its instances times a safety margin, but no
+    less than a minimum. If no model is given, default_walltime is allowed for
+    all jobs. See memory_requests() for a description of parameters.
+
+    Returns
+    -------
+    walltime : list of int
+        the walltime to allow each job
+    """
+    if model is None:
+        return [default_walltime] * len(jobs)
+    t = predict_costs(h5file, path, [x for job in jobs for x in job], 
+                      model=model, colname=colname)
+    return [int(math.ceil(max(minimum, margin * sum(t[x] for x in job)))) \
+                for job in jobs]
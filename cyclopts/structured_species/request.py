@@ -184,6 +184,15 @@ class StructuredRequest(ProblemSpecies):
         """
         return 'Summary'
 
+    @property
+    def pp_table_name(cls):
+        """Returns
+        -------
+        name : string
+            The name of post processing output table
+        """
+        return strtools.pp_tbl_name
+
     @property
     def summary_tbls(cls):
         """
@@ -487,3 +496,18 @@ class StructuredRequest(ProblemSpecies):
             and iomanager from a post-processed file
         """
         strtools.post_process(instid, solnids, props, io_managers, self.name)
+
+    def post_process_chunk(self, iid_to_sids, props, io_managers):
+        """Perform post processing on a chunk of instances at once.
+        
+        Parameters
+        ----------
+        iid_to_sids : list of (UUID, tuple of UUIDs) pairs
+            instance UUIDs and their corresponding solution UUIDs
+        props : cyclopts.exchange_family.FlowBlock
+            as defined by cyclopts.exchange_family 
+        io_managers : tuple of cyclopts.cyclopts_io.IOManager
+            iomanager from an input file, iomanager from an output file,
+            and iomanager from a post-processed file
+        """
+        strtools.post_process_chunk(iid_to_sids, props, io_managers, self.name)
@@ -212,10 +212,8 @@ def _iid_to_prefs(iid, tbl, narcs, strategy='col'):
     c_ret = np.zeros(narcs)
     l_ret = np.zeros(narcs)
     rows = cycio.uuid_rows(tbl, iid)
-    for x in rows:
-        aid = x['arcid']
-        c_ret[aid] = x['pref_c']
-        l_ret[aid] = x['pref_l']
+    c_ret[rows['arcid']] = rows['pref_c']
+    l_ret[rows['arcid']] = rows['pref_l']
     return c_ret, l_ret
 
 def _pp_work(instid, solnids, narcs, sid_to_flows, arc_tbl, strategy='col'):
@@ -253,11 +251,51 @@ def post_process(instid, solnids, props, io_managers, sp_name):
         arc_tbl = intbls[arc_io_name]
         strategy = 'col'
     else:
-        arc_tbl = ingrps[arc_io_name].group()._f_get_child('id_' + 
-                                                           instid.hex)
+        arc_tbl = cycio.get_child(ingrps[arc_io_name].group(), 
+                                  'id_' + instid.hex)
         strategy = 'grp'
     
     data = _pp_work(instid, solnids, narcs, sid_to_flows, arc_tbl, 
                     strategy=strategy)
 
     pp_tbl.append_data(data)
+
+def post_process_chunk(iid_to_sids, props, io_managers, sp_name):
+    """Perform post processing on a chunk of instances at once.
+    
+    Parameters
+    ----------
+    iid_to_sids : list of (UUID, tuple of UUIDs) pairs
+        instance UUIDs and their corresponding solution UUIDs
+    props : cyclopts.exchange_family.FlowBlock
+        the flows of all solutions of the chunk
+    io_managers : tuple of cyclopts.cyclopts_io.IOManager
+        iomanager from an input file, iomanager from an output file,
+        and iomanager from a post-processed file
+    sp_name : str
+        the name of the species being post processed
+    """
+    intbls, outtbls, pptbls = (m.tables for m in io_managers)
+    ingrps, outgrps, ppgrps = (m.groups for m in io_managers)
+    pp_tbl = pptbls[pp_tbl_name]
+    col = arc_io_name in intbls.keys()
+    
+    c_prefs, l_prefs = [np.empty(0)], [np.empty(0)]
+    narcs = np.diff(props.arc_offsets)
+    for i, iid in enumerate(props.instids):
+        if col:
+            arc_tbl = intbls[arc_io_name]
+            strategy = 'col'
+        else:
+            arc_tbl = cycio.get_child(ingrps[arc_io_name].group(), 
+                                      'id_' + iid.hex)
+            strategy = 'grp'
+        c, l = _iid_to_prefs(iid, arc_tbl, narcs[i], strategy=strategy)
+        c_prefs.append(c)
+        l_prefs.append(l)
+    
+    data = np.empty(len(props.solnids), dtype=pp_tbl_dtype)
+    data['solnid'] = [sid.bytes for sid in props.solnids]
+    data['c_pref_flow'] = props.dot(np.concatenate(c_prefs))
+    data['l_pref_flow'] = props.dot(np.concatenate(l_prefs))
+    pp_tbl.append_data(data)
@@ -9,6 +9,7 @@ import os
 import io
 import uuid
 import shutil
+import tempfile
 import operator
 import tables as t
 import numpy as np
@@ -22,7 +23,11 @@ import getpass
 import importlib
 import itertools as itools
 import gc
+import time
+import atexit
+import threading
 import resource
+import multiprocessing as mp
 
 import cyclopts
 from cyclopts.params import PARAM_CTOR_ARGS, Param, BoolParam, SupConstrParam, \
@@ -188,22 +193,106 @@ def exec_file(filename, glb=None, loc=None):
         src = f.read()
     exec(compile(src, filename, "exec"), glb, loc)
 
-def _merge_leaf(node, dest_file):
+# the number of bytes read from a table at once when merging
+MERGE_BUF_SIZE = 64 * 1024 * 1024
+
+def conform(rows, dtype, defaults=None):
+    """Conforms rows to a compatible dtype, i.e., one whose fields are a
+    superset of the rows' fields, possibly in a different order.
+
+    Parameters
+    ----------
+    rows : numpy structured array
+        the rows to conform
+    dtype : numpy dtype
+        the dtype to conform to
+    defaults : dict, optional
+        default values for fields not found in rows, zero otherwise
+
+    Returns
+    -------
+    rows : numpy structured array
+        the rows with the given dtype
+    """
+    if rows.dtype == dtype:
+        return rows
+    missing = set(rows.dtype.names) - set(dtype.names)
+    if len(missing) > 0:
+        raise ValueError('Can not conform rows with fields {0} to dtype '
+                         '{1}'.format(sorted(missing), dtype))
+    ret = np.zeros(len(rows), dtype=dtype)
+    for name in dtype.names:
+        if name in rows.dtype.names:
+            ret[name] = rows[name]
+        elif defaults is not None and name in defaults:
+            ret[name] = defaults[name]
+    return ret
+
+def upgrade_table(tbl, dtype, bufsize=None):
+    """Replaces a table with a table of a compatible dtype (see conform()),
+    e.g., to add columns introduced by a later version of Cyclopts. Rows are
+    copied in chunks, and new columns are given their default values.
+
+    Parameters
+    ----------
+    tbl : PyTables Table
+        the table to upgrade
+    dtype : numpy dtype
+        the dtype of the new table
+    bufsize : int, optional
+        the number of bytes read from the table at once, by default 
+        MERGE_BUF_SIZE
+
+    Returns
+    -------
+    tbl : PyTables Table
+        the new table
+    """
+    h5file, parent, name = tbl._v_file, tbl._v_parent, tbl._v_name
+    tbl._f_rename('_upgrade_' + name)
+    new = h5file.create_table(parent, name, description=dtype, 
+                              filters=tbl.filters, chunkshape=tbl.chunkshape)
+    bufsize = bufsize if bufsize is not None else MERGE_BUF_SIZE
+    step = max(1, bufsize // tbl.rowsize)
+    for start in range(0, tbl.nrows, step):
+        rows = tbl.read(start, min(start + step, tbl.nrows))
+        new.append(conform(rows, new.dtype, new.coldflts))
+    new.flush()
+    tbl._f_remove()
+    h5file.flush()
+    return new
+
+def _merge_leaf(node, dest_file, bufsize=None):
+    """Appends a table's rows to the table of the same path in dest_file in
+    chunks, returning the number of rows appended. If the table has columns
+    that the table in dest_file lacks, the latter is upgraded to include
+    them."""
     src = node
     dest = dest_file.get_node(node._v_pathname)
+    if not isinstance(node, t.Table):
+        return 0
+    missing = [x for x in src.dtype.names if x not in dest.dtype.names]
+    if len(missing) > 0:
+        dt = np.dtype([(x, dest.dtype[x]) for x in dest.dtype.names] + \
+                          [(x, src.dtype[x]) for x in missing])
+        dest = upgrade_table(dest, dt, bufsize=bufsize)
+    bufsize = bufsize if bufsize is not None else MERGE_BUF_SIZE
+    step = max(1, bufsize // src.rowsize)
+    for start in range(0, src.nrows, step):
+        rows = src.read(start, min(start + step, src.nrows))
+        dest.append(conform(rows, dest.dtype, dest.coldflts))
+    dest.flush()
+    return src.nrows
+
+def _nrows(node):
+    """Returns the number of table rows in a node and all of its children."""
     if isinstance(node, t.Table):
-        dtypes = src.dtype.names    
-        # this is a hack because appending rows throws an error
-        # see http://stackoverflow.com/questions/17847587/pytables-appending-recarray
-        # dest.append([row for row in src.iterrows()])
-        for src_row in src.iterrows():
-            dest_row = dest.row
-            for j in range(len(dtypes)):
-                dest_row[dtypes[j]] = src_row[j]
-            dest_row.append()
-        dest.flush()
+        return node.nrows
+    elif isinstance(node, t.Group):
+        return sum(x.nrows for x in node._f_walknodes(classname='Table'))
+    return 0
     
-def _copy_node(node, dest_file, recursive=False):
+def _copy_node(node, dest_file, recursive=False, flush=True):
     if node._v_depth == 0: # base recursion level, don't copy root
         return
     
@@ -212,30 +301,45 @@ def _copy_node(node, dest_file, recursive=False):
 
     parent = node._v_parent
     if not dest_file.__contains__(parent._v_pathname):
-        _copy_node(parent, dest_file) # parent doesn't exist, copy it
+        _copy_node(parent, dest_file, flush=flush) # parent doesn't exist
 
     # copy node
     node._v_file.copy_node(
         node._v_pathname, 
         newparent=dest_file.get_node(node._v_parent._v_pathname),
         recursive=recursive)
-    dest_file.flush()
+    if flush:
+        dest_file.flush()
         
-def _merge_node(node, dest_file):
+def _merge_node(node, dest_file, bufsize=None):
+    """Merges a node into dest_file, returning the number of table rows
+    written. New nodes, e.g., id_<hex> tables in groups, are copied in bulk
+    without intermediate flushes."""
     if not dest_file.__contains__(node._v_pathname):
-        _copy_node(node, dest_file, recursive=True)
-        return 
+        _copy_node(node, dest_file, recursive=True, flush=False)
+        return _nrows(node)
 
     if isinstance(node, t.Leaf):
-        _merge_leaf(node, dest_file)
-    else:
-        for child in node._v_children:
-            _merge_node(node._v_file.get_node(node._v_pathname + '/' + child), 
-                        dest_file)
-            
-def combine(files, new_file=None, clean=False, verbose=False):
+        return _merge_leaf(node, dest_file, bufsize=bufsize)
+    
+    n = 0
+    dest = dest_file.get_node(node._v_pathname)
+    new = [x for x in node._v_children if x not in dest._v_children]
+    for name in new:
+        child = node._v_children[name]
+        child._f_copy(newparent=dest, recursive=True)
+        n += _nrows(child)
+    for name, child in node._v_children.items():
+        if name not in dest._v_children or name in new:
+            continue
+        n += _merge_node(child, dest_file, bufsize=bufsize)
+    return n
+
+def combine(files, new_file=None, clean=False, verbose=False, bufsize=None):
     """Combines two or more databases with identical layout, writing their
-    output into a new file or appending to the first in the list.
+    output into a new file or appending to the first in the list. Tables are
+    merged in chunks, and tables may have compatible layouts, i.e., columns
+    missing in a table being merged are filled with default values.
     
     Parameters
     ----------
@@ -247,33 +351,281 @@ def combine(files, new_file=None, clean=False, verbose=False):
     clean : bool, optional
         Whether to remove original files after combining them
     verbose : bool, optional
-        Whether to print output
+        Whether to print output, including merging throughput
+    bufsize : int, optional
+        The number of bytes read from a table at once, by default 
+        MERGE_BUF_SIZE
     """ 
     if new_file is not None and os.path.exists(new_file):
         raise ValueError('Cannot write combined hdf5 files to an existing location.')
 
     first = files.next()
+    combiner = Combiner(new_file if new_file is not None else first, 
+                        bufsize=bufsize, verbose=verbose)
     if new_file is not None:
-        if verbose:
-            print('Starting with base file {0}'.format(first))
-        shutil.copyfile(first, new_file)
-        fname = new_file
-        if clean:
-            os.remove(first)
-    else:
-        fname = first
-
-    aggdb = t.open_file(fname, 'a')
-    for f in files:
-        if verbose:
-            print('Merging {0}'.format(f))
-        db = t.open_file(f, 'r')
-        _merge_node(db.root, aggdb)
-        aggdb.flush()
-        db.close()
+        combiner.add(first, clean=clean)
+    try:
+        for f in files:
+            combiner.add(f, clean=clean)
+    finally:
+        combiner.close()
+
+class Combiner(object):
+    """Incrementally combines databases with identical layout into a single
+    database, e.g., as they become available."""
+    
+    def __init__(self, fname, bufsize=None, verbose=False):
+        """Parameters
+        ----------
+        fname : str
+            The combined database. If it does not exist, the first database
+            added is copied to it.
+        bufsize : int, optional
+            The number of bytes read from a table at once
+        verbose : bool, optional
+            Whether to print output, including merging throughput
+        """
+        self.fname = fname
+        self.bufsize = bufsize
+        self.verbose = verbose
+        self.aggdb = None
+        self.nfiles, self.nrows, self.nbytes = 0, 0, 0
+        self.start = time.time()
+
+    def add(self, f, clean=False):
+        """Adds a database to the combined database, returning the number of
+        rows merged.
+
+        Parameters
+        ----------
+        f : str
+            The database to add
+        clean : bool, optional
+            Whether to remove the database after adding it
+        """
+        if self.aggdb is None and not os.path.exists(self.fname):
+            if self.verbose:
+                print('Starting with base file {0}'.format(f))
+            shutil.copyfile(f, self.fname)
+            n = 0
+        else:
+            if self.aggdb is None:
+                self.aggdb = t.open_file(self.fname, 'a')
+            if self.verbose:
+                print('Merging {0}'.format(f))
+            fstart = time.time()
+            db = t.open_file(f, 'r')
+            n = _merge_node(db.root, self.aggdb, bufsize=self.bufsize)
+            self.aggdb.flush()
+            db.close()
+            self.nfiles += 1
+            self.nrows += n
+            self.nbytes += os.path.getsize(f)
+            if self.verbose:
+                dt = max(time.time() - fstart, 1e-9)
+                print('Merged {0} rows in {1:.2f} s ({2:.0f} rows/s)'.format(
+                        n, dt, n / dt))
         if clean:
             os.remove(f)
-    aggdb.close()
+        return n
+
+    def close(self):
+        """Closes the combined database."""
+        if self.aggdb is not None and self.aggdb.isopen:
+            self.aggdb.close()
+        if self.verbose:
+            dt = max(time.time() - self.start, 1e-9)
+            print(('Merged {0} files ({1:.1f} MB) and {2} rows in {3:.2f} s: '
+                   '{4:.1f} files/s, {5:.1f} MB/s, {6:.0f} rows/s').format(
+                    self.nfiles, self.nbytes / 1e6, self.nrows, dt, 
+                    self.nfiles / dt, self.nbytes / 1e6 / dt, self.nrows / dt))
+
+def _link_node(node, dest_file, target):
+    """Links the id_<hex> leaves of a node into dest_file as external links to
+    the target file, merging all other leaves. Returns the number of table rows
+    written."""
+    path = node._v_pathname
+    if isinstance(node, t.Leaf):
+        if node._v_name.startswith('id_'):
+            if not dest_file.__contains__(path):
+                dest_file.create_external_link(
+                    node._v_parent._v_pathname, node._v_name, 
+                    '{0}:{1}'.format(target, path), createparents=True)
+            return 0
+        if not dest_file.__contains__(path):
+            _copy_node(node, dest_file, flush=False)
+            return _nrows(node)
+        return _merge_leaf(node, dest_file)
+
+    n = 0
+    for child in node._v_children.values():
+        n += _link_node(child, dest_file, target)
+    return n
+
+def link_combine(files, new_file, verbose=False):
+    """Combines databases into a new master database without copying
+    per-instance and per-solution data. Leaves named id_<hex> are added to the
+    master as external links to their original files, and all other tables,
+    e.g., Results and PostProcess tables, are merged. Links are relative to the
+    master's directory, so the master must be kept alongside its databases.
+    Linked nodes can be read with cyclopts_io.get_node() and
+    cyclopts_io.get_child().
+    
+    Parameters
+    ----------
+    files : iterator
+        An iterator listing all databases to combine
+    new_file : str
+        The new master database to write to
+    verbose : bool, optional
+        Whether to print output
+    """
+    if os.path.exists(new_file):
+        raise ValueError('Cannot write combined hdf5 files to an existing location.')
+    base = os.path.dirname(os.path.abspath(new_file))
+    start = time.time()
+    nfiles, nrows = 0, 0
+    with t.open_file(new_file, 'w') as master:
+        for f in files:
+            if verbose:
+                print('Linking {0}'.format(f))
+            target = os.path.relpath(os.path.abspath(f), base)
+            with t.open_file(f, 'r') as db:
+                nrows += _link_node(db.root, master, target)
+            master.flush()
+            nfiles += 1
+    if verbose:
+        print('Linked {0} files and merged {1} rows in {2:.2f} s'.format(
+                nfiles, nrows, time.time() - start))
+
+def subset_db(db, instids, new_file, bufsize=None, colname='instid'):
+    """Writes a new database with only the data of some instances. Leaves
+    named id_<hex> are copied only for the given instances, tables with an
+    instance id column are copied only for rows of the given instances, and all
+    other leaves are copied whole.
+    
+    Parameters
+    ----------
+    db : str
+        The database to subset
+    instids : collection of uuids
+        The instances to keep
+    new_file : str
+        The new database to write to
+    bufsize : int, optional
+        The number of bytes read from a table at once, by default 
+        MERGE_BUF_SIZE
+    colname : str, optional
+        the instance id column name
+    """
+    if os.path.exists(new_file):
+        raise ValueError('Cannot write a database subset to an existing location.')
+    hexs = set('id_' + x.hex for x in instids)
+    keys = np.array([x.bytes for x in instids], dtype='S16')
+    bufsize = bufsize if bufsize is not None else MERGE_BUF_SIZE
+    with t.open_file(db, 'r') as src, t.open_file(new_file, 'w') as dest:
+        for grp in src.walk_groups():
+            _copy_node(grp, dest, flush=False)
+        for node in src.walk_nodes(classname='Leaf'):
+            if node._v_name.startswith('id_'):
+                if node._v_name in hexs:
+                    _copy_node(node, dest, flush=False)
+            elif isinstance(node, t.Table) and colname in node.colnames:
+                _copy_node(node._v_parent, dest, flush=False)
+                tbl = dest.create_table(
+                    node._v_parent._v_pathname, node._v_name, 
+                    description=node.description, title=node.title, 
+                    filters=node.filters, chunkshape=node.chunkshape)
+                step = max(1, bufsize // node.rowsize)
+                for start in range(0, node.nrows, step):
+                    rows = node.read(start, min(start + step, node.nrows))
+                    mask = np.in1d(rows[colname], 
+                                   keys.astype(rows.dtype[colname]))
+                    if np.any(mask):
+                        tbl.append(rows[mask])
+            else:
+                _copy_node(node, dest, flush=False)
+
+def _combine_worker(args):
+    """combines a group of files into a new file"""
+    files, new_file, clean, bufsize = args
+    combine(iter(files), new_file=new_file, clean=clean, bufsize=bufsize)
+    return new_file
+
+def parallel_combine(files, new_file=None, clean=False, verbose=False, 
+                     bufsize=None, jobs=None, fanin=None):
+    """Combines databases in parallel worker processes via a reduction tree. At
+    each level of the tree, contiguous groups of files are combined into
+    intermediate files until only one group remains, which is combined into the
+    final output. Because groups are contiguous and combined in order, the
+    output is identical to that of combine().
+    
+    Parameters
+    ----------
+    files : iterator
+        An iterator listing all databases to combine
+    new_file : str, optional
+        The new database to write to. If None, all databases are appended to the
+        end of the first database in the list.
+    clean : bool, optional
+        Whether to remove original files after combining them
+    verbose : bool, optional
+        Whether to print output
+    bufsize : int, optional
+        The number of bytes read from a table at once
+    jobs : int, optional
+        the number of worker processes, by default the number of cpus
+    fanin : int, optional
+        the number of files combined by a worker at once, by default files are
+        split evenly among workers at the first level and combined pairwise
+        thereafter
+    """
+    files = list(files)
+    if new_file is not None and os.path.exists(new_file):
+        raise ValueError('Cannot write combined hdf5 files to an existing location.')
+    jobs = jobs if jobs is not None else mp.cpu_count()
+    fanin = max(2, fanin) if fanin is not None else None
+    if new_file is None:
+        # reduce all but the first file, then append to it
+        first, files = files[0], files[1:]
+    if len(files) < 3 or jobs < 2:
+        files = files if new_file is not None else [first] + files
+        combine(iter(files), new_file=new_file, clean=clean, verbose=verbose, 
+                bufsize=bufsize)
+        return
+
+    base = os.path.dirname(os.path.abspath(
+            new_file if new_file is not None else first))
+    tmpdir = tempfile.mkdtemp(prefix='cyclopts-combine-', dir=base)
+    pool = mp.Pool(jobs)
+    level = 0
+    try:
+        start = time.time()
+        while len(files) > (fanin if fanin is not None else 2):
+            k = fanin if fanin is not None else \
+                max(2, int(np.ceil(len(files) / float(jobs))))
+            groups = [files[i:i + k] for i in range(0, len(files), k)]
+            tmps = [os.path.join(tmpdir, '{0}_{1}.h5'.format(level, i)) \
+                        for i in range(len(groups))]
+            # original files are only removed if requested
+            rm = clean or level > 0 
+            pool.map(_combine_worker, [(g, f, rm, bufsize) \
+                                           for g, f in zip(groups, tmps)])
+            if verbose:
+                print('Combined {0} files into {1} at level {2} ({3:.2f} s)'.format(
+                        len(files), len(tmps), level, time.time() - start))
+            files = tmps
+            level += 1
+        files = files if new_file is not None else [first] + files
+        combine(iter(files), new_file=new_file, clean=clean or level > 0, 
+                verbose=verbose, bufsize=bufsize)
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(tmpdir)
 
 def get_process_children(pid):
     """Return 
@@ -334,6 +686,120 @@ def ssh_test_connect(client, host, user, keyfile=None, auth=True):
             print("finished connecting")
     return can_connect, keyfile, password
 
+class SSHSessions(object):
+    """A manager of SSH sessions that keeps one connected client per (user,
+    host) pair for the lifetime of a process. Commands and SFTP sessions are
+    multiplexed as channels over the client's transport, which is kept alive
+    and reconnected if it has dropped.
+    """
+
+    def __init__(self, client_factory=None, keepalive=30):
+        """Parameters
+        ----------
+        client_factory : callable, optional
+            returns a new, unconnected paramiko SSHClient or similar, by default
+            one that accepts unknown host keys
+        keepalive : int, optional
+            the interval in seconds of keepalive packets, none are sent if 0
+        """
+        self.client_factory = client_factory if client_factory is not None \
+            else self._new_client
+        self.keepalive = keepalive
+        self._clients = {}
+        self._sftps = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _new_client():
+        client = pm.SSHClient()
+        client.set_missing_host_key_policy(pm.AutoAddPolicy())
+        return client
+
+    @staticmethod
+    def _active(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _connect(self, host, user, keyfile=None, auth=True):
+        """connects a new client, prompting for a password if keys are not
+        authorized"""
+        client = self.client_factory()
+        keyfile = keyfile if keyfile is not None else \
+            [os.path.join(os.environ['HOME'], '.ssh','id_rsa'),
+             os.path.join(os.environ['HOME'], '.ssh','chtckey')]
+        try:
+            client.connect(host, username=user, key_filename=keyfile)
+        except pm.AuthenticationException:
+            if not auth:
+                raise
+            password = False
+            while not password:
+                password = getpass.getpass("{0}@{1} password: ".format(
+                        user, host))
+            client.connect(host, username=user, password=password)
+        if self.keepalive:
+            client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def client(self, host, user, keyfile=None, auth=True):
+        """Returns a connected client for a user on a host, connecting only if
+        no active client exists.
+
+        Parameters
+        ----------
+        host : str
+        user : str
+        keyfile : str, optional
+        auth : bool, optional
+            whether to prompt for a password authorization on failure
+
+        Returns
+        -------
+        client : paramiko SSHClient or similar
+        """
+        key = (user, host)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or not self._active(client):
+                if client is not None:
+                    self.close(host, user)
+                client = self._connect(host, user, keyfile=keyfile, auth=auth)
+                self._clients[key] = client
+            return client
+
+    def sftp(self, host, user, keyfile=None, auth=True):
+        """Returns an open SFTP session for a user on a host, reusing an
+        earlier session over the same client if it is still open. See client()
+        for a description of parameters."""
+        key = (user, host)
+        with self._lock:
+            client = self.client(host, user, keyfile=keyfile, auth=auth)
+            sftp = self._sftps.get(key)
+            if sftp is None or sftp.get_channel().closed:
+                sftp = self._sftps[key] = client.open_sftp()
+            return sftp
+
+    def close(self, host, user):
+        """Closes the client and SFTP session of a user on a host."""
+        key = (user, host)
+        with self._lock:
+            sftp = self._sftps.pop(key, None)
+            if sftp is not None:
+                sftp.close()
+            client = self._clients.pop(key, None)
+            if client is not None:
+                client.close()
+
+    def close_all(self):
+        """Closes all clients and SFTP sessions."""
+        with self._lock:
+            for user, host in list(self._clients.keys()):
+                self.close(host, user)
+
+"""SSH sessions shared by all remote operations of a process"""
+ssh_sessions = SSHSessions()
+atexit.register(ssh_sessions.close_all)
+
 def str_to_uuid(x):
     """return a uuid from a stored value, allows strings of len == 15 which is 
     missing a null-padded value"""
@@ -587,32 +1053,284 @@ def fam_and_sp(args):
     fam = sp.family
     return fam, sp
 
+def io_managers(obj, h5files):
+    """Returns a tuple of IOManagers, one per file, for the tables and groups
+    registered by a family or species."""
+    return tuple(
+        cyclopts.cyclopts_io.IOManager(
+            h5f, 
+            obj.register_tables(h5f, obj.io_prefix),
+            obj.register_groups(h5f, obj.io_prefix))
+        for h5f in h5files)
+
+def _remove_solnids(tbl, solnids):
+    """removes the rows of a table whose solnid is among the given solution
+    UUIDs"""
+    sids = np.array([sid.bytes for sid in solnids], dtype='S16')
+    idx = np.flatnonzero(np.in1d(tbl.read(field='solnid'), sids))
+    if len(idx) == 0:
+        return
+    # remove runs of rows from the end so that earlier indices remain valid
+    runs = np.split(idx, np.flatnonzero(np.diff(idx) != 1) + 1)
+    for run in reversed(runs):
+        tbl.remove_rows(run[0], run[-1] + 1)
+    tbl.flush()
+
+def processed_solnids(objs):
+    """Returns the set of solution UUIDs that have been post processed, i.e.,
+    that are found in the post processing tables of all given families or
+    species. Solutions found in only some of the tables (e.g., after an
+    interrupted run) are removed from those tables, so that they are post
+    processed anew without duplicating rows.
+
+    Parameters
+    ----------
+    objs : list of (ProblemFamily or ProblemSpecies, cyclopts_io.IOManager)
+        families or species and the managers of their post processed tables
+    
+    Returns
+    -------
+    solnids : set of UUIDs
+        the solutions found in all post processing tables
+    """
+    found = []
+    for obj, manager in objs:
+        if obj is None or manager is None or obj.pp_table_name is None:
+            continue
+        tbl = manager.tables[obj.pp_table_name].table()
+        sids = set() if tbl is None else \
+            set(cyclopts.io_tools.to_uuids(tbl.read(field='solnid')))
+        found.append((tbl, sids))
+    if len(found) == 0:
+        return set()
+    ret = set.intersection(*[sids for _, sids in found])
+    for tbl, sids in found:
+        if len(sids) > len(ret):
+            _remove_solnids(tbl, sids - ret)
+    return ret
+
+def _pp_chunks(res_tbl, limit=None, chunksize=1000, done=None):
+    """returns the number of instances to post process, a list of chunks of
+    (instid, solnids) pairs to post process, and the number of solutions
+    skipped because they are done"""
+    iid_to_sids = res_tbl.value_mapping('instid', 'solnid', uuids=True).items()
+    nskipped = 0
+    if done:
+        todo = []
+        for iid, sids in iid_to_sids:
+            new = tuple(sid for sid in sids if sid not in done)
+            nskipped += len(sids) - len(new)
+            if len(new) > 0:
+                todo.append((iid, new))
+        iid_to_sids = todo
+    iid_to_sids = list(iid_to_sids)
+    if limit is not None:
+        iid_to_sids = iid_to_sids[:limit]
+    niids = len(iid_to_sids)
+    chunksize = max(1, chunksize if chunksize is not None else niids)
+    return niids, [iid_to_sids[i:i + chunksize] \
+                       for i in range(0, niids, chunksize)], \
+                       nskipped
+
+def _pp_report(start, n, niids, verbose_freq):
+    """informs stdout of post processing progress"""
+    if verbose_freq is None:
+        return
+    for count in range(start, start + n):
+        if count % verbose_freq == 0:
+            print('{0}/{1} instances have been post processed.'.format(
+                    count, niids))
+
 def drive_post_process(res_tbl, 
                        fam=None, fam_io_managers=None, 
                        sp=None, sp_io_managers=None,
-                       verbose_freq=None, limit=None):
-    iid_to_sids = res_tbl.value_mapping('instid', 'solnid', uuids=True)
-    niids = len(iid_to_sids.keys())
-    count = 0
-    verbose = verbose_freq is not None
-    for iid, sids in iid_to_sids.items():
-        if verbose:
-            if count % verbose_freq == 0:
-                print('{0}/{1} instances have been post processed.'.format(
-                        count, niids))
-            if count == limit:
-                return # early exit
-            count += 1
+                       verbose_freq=None, limit=None, chunksize=1000,
+                       incremental=True):
+    """Post processes all instances in a Results table in chunks of
+    instances, see ProblemFamily.post_process_chunk().
+
+    Parameters
+    ----------
+    res_tbl : cyclopts_io.ResultTable
+        the table of results to post process
+    fam : ProblemFamily, optional
+        the family of the instances
+    fam_io_managers : tuple of cyclopts_io.IOManager, optional
+        managers for the family's input, output, and post-processed tables
+    sp : ProblemSpecies, optional
+        the species of the instances
+    sp_io_managers : tuple of cyclopts_io.IOManager, optional
+        managers for the species' input, output, and post-processed tables
+    verbose_freq : int, optional
+        stdout is informed of progress at this instance frequency
+    limit : int, optional
+        the maximum number of instances to post process
+    chunksize : int, optional
+        the number of instances post processed at once
+    incremental : bool, optional
+        only post process solutions that are not yet found in all post
+        processing tables
+
+    Returns
+    -------
+    nskipped : int
+        the number of solutions skipped because they were already post processed
+    """
+    done = None
+    if incremental:
+        done = processed_solnids(
+            [(fam, None if fam_io_managers is None else fam_io_managers[2]),
+             (sp, None if sp_io_managers is None else sp_io_managers[2])])
+    niids, chunks, nskipped = _pp_chunks(res_tbl, limit=limit, 
+                                         chunksize=chunksize, done=done)
+    start = 0
+    for chunk in chunks:
+        _pp_report(start, len(chunk), niids, verbose_freq)
+        start += len(chunk)
         props = None
         if fam is not None:
-            props = fam.post_process(iid, sids, fam_io_managers)
+            props = fam.post_process_chunk(chunk, fam_io_managers)
         if sp is not None:
-            sp.post_process(iid, sids, props, sp_io_managers)
+            sp.post_process_chunk(chunk, props, sp_io_managers)
+    return nskipped
+
+_pp_worker_state = {}
+
+def _pp_worker_init(fam, sp, indb, outdb):
+    """opens a post processing worker's read-only input and output files"""
+    _pp_worker_state['objs'] = (fam, sp)
+    _pp_worker_state['h5files'] = (t.open_file(indb, mode='r'),
+                                   t.open_file(outdb, mode='r'))
+
+def _pp_worker(chunk):
+    """post processes a chunk into an in-memory file, returning the path and
+    rows of each table written"""
+    fam, sp = _pp_worker_state['objs']
+    h5in, h5out = _pp_worker_state['h5files']
+    h5pp = t.open_file('pp_{0}.h5'.format(uuid.uuid4()), mode='w', 
+                       driver='H5FD_CORE', driver_core_backing_store=0)
+    h5files = (h5in, h5out, h5pp)
+    managers = []
+    props = None
+    if fam is not None:
+        fam_managers = io_managers(fam, h5files)
+        props = fam.post_process_chunk(chunk, fam_managers)
+        managers.append(fam_managers[2])
+    if sp is not None:
+        sp_managers = io_managers(sp, h5files)
+        sp.post_process_chunk(chunk, props, sp_managers)
+        managers.append(sp_managers[2])
+    ret = []
+    for m in managers:
+        m.flush_tables()
+        for tbl in m.tables.values():
+            ret.append((tbl.path, tbl.table().read()))
+    h5pp.close()
+    return ret
+
+def parallel_post_process(res_tbl, indb, outdb, 
+                          fam=None, fam_io_manager=None, 
+                          sp=None, sp_io_manager=None,
+                          verbose_freq=None, limit=None, chunksize=1000, 
+                          jobs=None, incremental=True):
+    """Post processes all instances in a Results table, distributing chunks of
+    instances among worker processes. Workers open the input and output
+    databases read-only and return the rows of post-processed tables, which are
+    written in chunk order, i.e., the result is identical to that of
+    drive_post_process().
+
+    Parameters
+    ----------
+    res_tbl : cyclopts_io.ResultTable
+        the table of results to post process
+    indb : str
+        the input database
+    outdb : str
+        the output database
+    fam : ProblemFamily, optional
+        the family of the instances
+    fam_io_manager : cyclopts_io.IOManager, optional
+        the manager for the family's post-processed tables
+    sp : ProblemSpecies, optional
+        the species of the instances
+    sp_io_manager : cyclopts_io.IOManager, optional
+        the manager for the species' post-processed tables
+    verbose_freq : int, optional
+        stdout is informed of progress at this instance frequency
+    limit : int, optional
+        the maximum number of instances to post process
+    chunksize : int, optional
+        the number of instances post processed at once by a worker
+    jobs : int, optional
+        the number of worker processes, by default the number of cpus
+    incremental : bool, optional
+        only post process solutions that are not yet found in all post
+        processing tables
+
+    Returns
+    -------
+    nskipped : int
+        the number of solutions skipped because they were already post processed
+    """
+    done = None
+    if incremental:
+        done = processed_solnids([(fam, fam_io_manager), (sp, sp_io_manager)])
+    niids, chunks, nskipped = _pp_chunks(res_tbl, limit=limit, 
+                                         chunksize=chunksize, done=done)
+    tbls = {}
+    for m in [fam_io_manager, sp_io_manager]:
+        if m is not None:
+            tbls.update((tbl.path, tbl) for tbl in m.tables.values())
+    pool = mp.Pool(jobs, initializer=_pp_worker_init, 
+                   initargs=(fam, sp, indb, outdb))
+    try:
+        start = 0
+        for chunk, data in itools.izip(chunks, pool.imap(_pp_worker, chunks)):
+            _pp_report(start, len(chunk), niids, verbose_freq)
+            start += len(chunk)
+            for path, rows in data:
+                tbls[path].append_data(rows)
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+    return nskipped
+
+def _col2grp_tbl(tbl, h5f, chunksize=None):
+    """Writes each run of rows with the same id in a columnar table into a
+    table named by the id in a group of the same path, reading the columnar
+    table in chunks."""
+    dtype = np.dtype(tbl.dtype.descr[1:])
+    idcol = tbl.dtype.names[0]
+    path = tbl._v_pathname
+    _copy_node(tbl._v_parent, h5f)
+    h5f.create_group(tbl._v_parent._v_pathname, tbl._v_name, filters=FILTERS)
+    chunksize = chunksize if chunksize is not None else \
+        max(1, MERGE_BUF_SIZE // tbl.rowsize)
+    for start in range(0, tbl.nrows, chunksize):
+        rows = tbl.read(start, min(start + chunksize, tbl.nrows))
+        ids = rows[idcol]
+        data = np.empty(len(rows), dtype=dtype)
+        for name in dtype.names:
+            data[name] = rows[name]
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1, [len(rows)]])
+        colids = cyclopts.io_tools.to_uuids(ids[bounds[:-1]])
+        for colid, b, e in zip(colids, bounds[:-1], bounds[1:]):
+            # runs may continue from a previous chunk
+            tblpath = '/'.join([path, 'id_' + colid.hex])
+            if not h5f.__contains__(tblpath):
+                cyclopts.cyclopts_io.Table(h5f, tblpath, dt=dtype).create()
+            h5f.get_node(tblpath).append(data[b:e])
+        h5f.flush()
 
-def col2grp(in_old, out_old, in_new, out_new):    
+def col2grp(in_old, out_old, in_new, out_new, chunksize=None):    
     """Make old input/output files using a columnar id-based schema into a group
     id-based schema. Currently only works for ExchangeFamily and
-    StructuredSpecies."""
+    StructuredSpecies. Columnar tables are read chunksize rows at a time, by
+    default MERGE_BUF_SIZE bytes at a time."""
     in_old = t.open_file(in_old, mode='r')
     out_old = t.open_file(out_old, mode='r')
     in_new = t.open_file(in_new, mode='w')
@@ -640,24 +1358,7 @@ def col2grp(in_old, out_old, in_new, out_new):
     
     for h5f, tbls in all_tbls.items():
         for tbl in tbls:
-            dtype = np.dtype(tbl.dtype.descr[1:])
-            path = tbl._v_pathname
-            colid = ''
-            ntbl = None
-            _copy_node(tbl._v_parent, h5f)
-            h5f.create_group(tbl._v_parent._v_pathname, tbl._v_name, 
-                             filters=FILTERS)
-            for x in tbl.iterrows():
-                y = str_to_uuid(x[0]).hex
-                if y != colid:
-                    if ntbl is not None:
-                        ntbl.flush()
-                    colid = y
-                    ntbl = cyclopts.cyclopts_io.Table(h5f, '/'.join([path, 'id_'+colid]), dt=dtype)
-                    ntbl.create()
-                # either do [x[1:]] or append
-                ntbl.append_data([x[1:]])
-            ntbl.flush()
+            _col2grp_tbl(tbl, h5f, chunksize=chunksize)
             
     in_old.close()
     out_old.close()
@@ -6,10 +6,17 @@ import shutil
 import paramiko as pm
 import warnings
 import tarfile
+import io
+import numpy as np
+import subprocess
 import tables as t
 
 from cyclopts.condor import dag
 from cyclopts.condor import queue
+from cyclopts.condor import local
+from cyclopts.condor import telemetry
+from cyclopts.condor import launch_master
+from cyclopts.condor import archive
 from cyclopts.condor import utils
 from cyclopts import main
 from cyclopts import tools
@@ -52,12 +59,12 @@ def test_gen_dag_tar():
     instids = [x[0] for x in exp_uuid_arcs()[:2]] # 2 ids
     solvers = ['s1', 's2']
     
-    dag.gen_tar(prefix, db, instids, 'foo', 'bar', solvers)   
+    dag.gen_tar(prefix, db, instids, 'foo', 'bar', solvers, subset=False)   
     
     if os.path.exists(prefix):
         shutil.rmtree(prefix)    
 
-    exp = ['0.sub', '1.sub', 'run.sh', 'dag.sub', 'test_in.h5']
+    exp = ['jobs.sub', 'run.sh', 'dag.sub', 'items', 'test_in.h5']
     tarname = '{0}.tar.gz'.format(prefix)
     obs = [] 
     with tarfile.open(tarname, 'r:gz') as tar:
@@ -70,6 +77,128 @@ def test_gen_dag_tar():
     assert_equal(set(exp), set(obs))
     os.remove(tarname)
 
+def test_gen_dag_tar_packed():
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    prefix='tmp_{0}'.format(uuid.uuid4())
+    instids = [x[0] for x in exp_uuid_arcs()[:3]]
+    jobs = [instids[:2], instids[2:]] # 2 jobs
+    solvers = ['s1', 's2']
+    
+    dag.gen_tar(prefix, db, jobs, 'foo', 'bar', solvers)   
+    
+    exp = ['jobs.sub', 'run.sh', 'dag.sub', 'items', '0_in.h5', '1_in.h5']
+    tarname = '{0}.tar.gz'.format(prefix)
+    obs = [] 
+    with tarfile.open(tarname, 'r:gz') as tar:
+        for f in tar.getnames():
+            obs += [f.split('/')[1]]
+        sub = tar.extractfile('{0}/jobs.sub'.format(prefix)).read().decode()
+        dagfile = tar.extractfile('{0}/dag.sub'.format(prefix)).read().decode()
+        items = tar.extractfile('{0}/items'.format(prefix)).read().decode()
+    assert_equal(set(exp), set(obs))
+    assert_true("request_memory" not in sub)
+    assert_true("> ($(maxtime))" in sub)
+    assert_true("queue id, db, dbpath, memory, maxtime, instids from items" \
+                    in sub)
+    assert_equal(dagfile.strip(), 'JOB J_0 jobs.sub')
+    items = items.strip().split('\n')
+    assert_equal(len(items), 2)
+    assert_equal(items[0], '0 0_in.h5 0_in.h5 2500 18000 {0} {1}'.format(*instids[:2]))
+    assert_equal(items[1], '1 1_in.h5 1_in.h5 2500 18000 {0}'.format(
+            instids[2]))
+    os.remove(tarname)
+
+    # requested memory and walltime of each job
+    dag.gen_tar(prefix, db, jobs, 'foo', 'bar', solvers, memory=[800, 1200], 
+                walltime=[600, 900])
+    with tarfile.open(tarname, 'r:gz') as tar:
+        sub = tar.extractfile('{0}/jobs.sub'.format(prefix)).read().decode()
+        items = tar.extractfile('{0}/items'.format(prefix)).read().decode()
+    assert_true("request_memory = $(memory)" in sub)
+    items = [x.split()[3:5] for x in items.strip().split('\n')]
+    assert_equal(items, [['800', '600'], ['1200', '900']])
+    os.remove(tarname)
+
+def test_archive():
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    tmpdir = os.path.join(base, 'tmp_{0}'.format(uuid.uuid4()))
+    os.makedirs(tmpdir)
+    codecs = [c for c in sorted(archive.codecs) if archive.available(c)]
+    for codec in codecs:
+        fname = os.path.join(tmpdir, archive.archive_name('foo', codec))
+        assert_equal(archive.strip_ext(fname), os.path.join(tmpdir, 'foo'))
+        with archive.ArchiveWriter(fname, codec=codec) as tar:
+            tar.add(db, 'foo/test_in.h5')
+            tar.add_bytes('foo/run.sh', u'#!/bin/bash\n', mode=0o755)
+        readable = archive.readable(fname)
+        with tarfile.open(readable, 'r:*') as tar:
+            assert_equal(set(tar.getnames()), 
+                         set(['foo/test_in.h5', 'foo/run.sh']))
+            info = tar.getmember('foo/run.sh')
+            assert_equal(info.mode, 0o755)
+            assert_equal(tar.extractfile(info).read(), b'#!/bin/bash\n')
+            assert_equal(tar.getmember('foo/test_in.h5').size, 
+                         os.path.getsize(db))
+    
+    results = archive.benchmark([db], names=codecs, bandwidth=10.)
+    assert_equal(set(x[0] for x in results), set(codecs))
+    for codec, dt, size, ready in results:
+        assert_true(ready >= dt)
+    shutil.rmtree(tmpdir)
+
+def test_local():
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    # paths may contain spaces
+    rundir = os.path.join(base, 'tmp {0}'.format(uuid.uuid4()))
+    instids = [x[0] for x in exp_uuid_arcs()]
+    jobs = [instids[:1], instids[1:]]
+    
+    failed = local.submit(db, jobs, 'cyclopts.exchange_family', 
+                          'ResourceExchange', ['greedy', 'cbc'], rundir, 
+                          jobs=2)
+    assert_equal(failed, [])
+    with t.open_file(os.path.join(rundir, 'cyclopts_results.h5'), 'r') as f:
+        assert_equal(f.root.Results.nrows, 2 * len(instids))
+    assert_equal(len([x for x in os.listdir(rundir) if x.endswith('_out.h5')]), 
+                 0)
+    shutil.rmtree(rundir)
+
+def test_exec_args():
+    args = local.exec_args('/a b/in.h5', '0_out.h5', ['x', 'y'], ['cbc'], 
+                           'm', 'c')
+    assert_equal(args, ['cyclopts', 'exec', '--db', '/a b/in.h5', 
+                        '--outdb', '0_out.h5', '--instids', 'x', 'y', 
+                        '--solvers', 'cbc', '--family_module', 'm', 
+                        '--family_class', 'c'])
+
+def test_n_workers():
+    assert_equal(local.n_workers(3, 8), 3)
+    assert_equal(local.n_workers(30, 8), 8)
+    assert_equal(local.n_workers(0, 8), 1)
+
+def test_subset_db():
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    subdb = os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4()))
+    instid = uuid.UUID(exp_uuid_arcs()[0][0])
+    narcs = exp_uuid_arcs()[0][1]
+    
+    tools.subset_db(db, [instid], subdb)
+    path = '/Family/ResourceExchange/'
+    with t.open_file(subdb, 'r') as f:
+        assert_equal(f.get_node(path + 'ExchangeInstProperties').nrows, 1)
+        row = f.get_node(path + 'ExchangeInstProperties').read()[0]
+        assert_equal(tools.str_to_uuid(row['instid']), instid)
+        arcs = f.get_node(path + 'ExchangeArcs')
+        assert_equal(list(arcs._v_children), ['id_' + instid.hex])
+        assert_equal(arcs._f_get_child('id_' + instid.hex).nrows, narcs)
+        assert_true(path + 'ExchangeInstSolutions' in f)
+    assert_true(os.path.getsize(subdb) < os.path.getsize(db))
+    os.remove(subdb)
+
 def test_gen_q_tar():
     base = os.path.dirname(os.path.abspath(__file__))
     db = os.path.join(base, 'files', 'test_in.h5')
@@ -94,7 +223,314 @@ def test_gen_q_tar():
     assert_equal(len(exp), len(obs))
     assert_equal(set(exp), set(obs))
     os.remove(tarname)
+
+    # the input database is not included if it is uploaded separately
+    queue.gen_tar(prefix, db, instids, 'foo', 'bar', solvers, include_db=False)
+    with tarfile.open(tarname, 'r:gz') as tar:
+        obs = [f.split('/')[1] for f in tar.getnames()]
+    assert_equal(set(exp) - set(['test_in.h5']), set(obs))
+    os.remove(tarname)
+
+class LocalChannel(object):
+    closed = False
+    def __init__(self, rc):
+        self.rc = rc
+    def exit_status_ready(self):
+        return True
+    def recv_exit_status(self):
+        return self.rc
+
+class LocalStdout(object):
+    def __init__(self, rc):
+        self.channel = LocalChannel(rc)
+
+class LocalSFTP(object):
+    """a stand-in for a paramiko SFTPClient on the local file system"""
+    def __init__(self, client):
+        self.client = client
+    def stat(self, path):
+        try:
+            return os.stat(path)
+        except OSError as e:
+            raise IOError(str(e))
+    def put(self, ffrom, fto):
+        self.client.nput += 1
+        shutil.copy(ffrom, fto)
+    def posix_rename(self, old, new):
+        os.rename(old, new)
+    def get_channel(self):
+        return LocalChannel(0)
+    def close(self):
+        pass
+
+class LocalTransport(object):
+    def is_active(self):
+        return True
+
+class LocalClient(object):
+    """a stand-in for a paramiko SSHClient on the local file system"""
+    def __init__(self):
+        self.nput = 0
+        self.nsftp = 0
+    def connect(self, host, username=None, key_filename=None, password=None):
+        pass
+    def get_transport(self):
+        return LocalTransport()
+    def exec_command(self, cmd):
+        rc = subprocess.call(cmd, shell=True)
+        return None, LocalStdout(rc), []
+    def open_sftp(self):
+        self.nsftp += 1
+        return LocalSFTP(self)
+    def close(self):
+        pass
+
+def test_upload_cached():
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    home = os.path.join(base, 'tmp_{0}'.format(uuid.uuid4()))
+    os.makedirs(home)
+    client = LocalClient()
+    sessions = tools.SSHSessions(client_factory=lambda: client, keepalive=0)
+
+    h = utils.file_hash(db)
+    assert_equal(len(h), 40)
+    assert_equal(h, utils.file_hash(db, bufsize=1024))
+
+    path = utils.upload_cached(db, 'foo', home=home, sessions=sessions)
+    assert_equal(path, '/'.join([home, utils.remote_cache_dir, h, 
+                                 'test_in.h5']))
+    assert_true(os.path.exists(path))
+    assert_equal(os.path.getsize(path), os.path.getsize(db))
+    assert_equal(os.listdir(os.path.dirname(path)), ['test_in.h5'])
+    assert_equal(client.nput, 1)
+
+    # a second upload is found in the cache over the same sftp session
+    assert_equal(utils.upload_cached(db, 'foo', home=home, sessions=sessions), 
+                 path)
+    assert_equal(client.nput, 1)
+    assert_equal(client.nsftp, 1)
+    shutil.rmtree(home)
     
+user_log = u"""000 (1234.000.000) 10/19 12:00:00 Job submitted from host: <128.104.100.43:9618?addrs=128.104.100.43-9618>
+    DAG Node: J_0
+...
+001 (1234.000.000) 10/19 12:01:30 Job executing on host: <128.104.58.1:9618?addrs=128.104.58.1-9618>
+...
+006 (1234.000.000) 10/19 12:02:00 Image size of job updated: 10000
+	12  -  MemoryUsage of job (MB)
+	11000  -  ResidentSetSize of job (KB)
+...
+005 (1234.000.000) 10/19 12:11:30 Job terminated.
+	(1) Normal termination (return value 0)
+		Usr 0 00:09:50, Sys 0 00:00:01  -  Run Remote Usage
+	Partitionable Resources :    Usage  Request Allocated
+	   Cpus                 :                 1         1
+	   Memory (MB)          :       30      2500      2500
+...
+"""
+
+queue_log = u"""# id host submit start end memory exit instid
+1 e121.chtc.wisc.edu 1000.0 1010.0 1050.0 20.0 0 {0}
+2 e122.chtc.wisc.edu 1000.0 1020.0 1080.0 nan 137 {1}
+"""
+
+def test_telemetry():
+    base = os.path.dirname(os.path.abspath(__file__))
+    tmpdir = os.path.join(base, 'tmp_{0}'.format(uuid.uuid4()))
+    os.makedirs(tmpdir)
+    ids = [uuid.uuid4() for i in range(4)]
+    with io.open(os.path.join(tmpdir, '0.log'), 'w') as f:
+        f.write(user_log)
+    with io.open(os.path.join(tmpdir, telemetry.dag_items_file), 'w') as f:
+        f.write(dag.item_template.format(id=0, db='in.h5', dbpath='in.h5', 
+                                         memory=2500, maxtime=18000, 
+                                         instids=" ".join(x.hex for x in ids[:2])))
+    with io.open(os.path.join(tmpdir, telemetry.queue_jobs_file), 'w') as f:
+        f.write(queue_log.format(ids[2], ids[3]))
+    
+    jobs = telemetry.parse_user_log(os.path.join(tmpdir, '0.log'), year=2014)
+    assert_equal(list(jobs.keys()), ['1234.0'])
+    rec = jobs['1234.0']
+    assert_equal(rec['start'] - rec['submit'], 90)
+    assert_equal(rec['end'] - rec['start'], 600)
+    assert_equal(rec['host'], '128.104.58.1')
+    assert_equal(rec['memory'], 30)
+    assert_equal(rec['exit'], 0)
+
+    db = os.path.join(tmpdir, 'out.h5')
+    assert_equal(telemetry.ingest(tmpdir, db, year=2014), 4)
+    with t.open_file(db, 'r') as h5f:
+        obs = h5f.get_node(telemetry.jobs_path).read()
+    assert_equal([tools.str_to_uuid(x) for x in obs['instid']], ids)
+    assert_equal(list(obs['kind']), [b'dag', b'dag', b'queue', b'queue'])
+    assert_equal(list(obs['wait']), [90, 90, 10, 20])
+    assert_equal(list(obs['runtime']), [600, 600, 40, 60])
+    assert_equal(list(obs['exit']), [0, 0, 0, 137])
+    assert_equal(obs['host'][3], b'e122.chtc.wisc.edu')
+    assert_true(np.isnan(obs['memory'][3]))
+    # collecting the same logs again records nothing
+    assert_equal(telemetry.ingest(tmpdir, db, year=2014), 0)
+    with t.open_file(db, 'r') as h5f:
+        assert_equal(h5f.get_node(telemetry.jobs_path).nrows, 4)
+    shutil.rmtree(tmpdir)
+
+def test_workers_per_node():
+    # workers with more memory than an even split of a node are fewer
+    assert_equal(launch_master.workers_per_node(launch_master.default_memory), 
+                 launch_master.node_cores)
+    assert_equal(launch_master.workers_per_node(20e3), 6)
+    assert_equal(launch_master.workers_per_node(200e3), 1)
+
+class FakeTask(object):
+    """a stand-in for a work_queue Task"""
+    def __init__(self, cmd, instid, outdb=None):
+        self.command = cmd
+        self.tag = instid
+        self.outdb = outdb
+        self.id = None
+        self.hostname = None
+        self.return_status = None
+        self.result = None
+        self.submit_time = 0
+        self.send_input_start = 0
+        self.finish_time = 0
+
+class FakeStats(object):
+    tasks_waiting = 0
+    workers_idle = 0
+    total_workers_joined = 0
+
+class FakeQueue(object):
+    """a simulation of a work_queue WorkQueue with a number of workers, the
+    duration of a task is given by a function of its tag and copy number, and a
+    returned task's output database holds its name"""
+    def __init__(self, nworkers, duration, late_cancel=False):
+        self.port = 0
+        self.late_cancel = late_cancel # cancelled tasks are still returned
+        self.now = 1e3
+        self.nworkers = nworkers
+        self.duration = duration
+        self.waiting, self.running = [], {}
+        self.ncopies = {}
+        self.nids = 0
+        self.cancelled = []
+        self.stats = FakeStats()
+        self.update()
+    def clock(self):
+        return self.now
+    def update(self):
+        while len(self.waiting) > 0 and len(self.running) < self.nworkers:
+            t = self.waiting.pop(0)
+            t.send_input_start = self.now * 1e6
+            t.hostname = 'e{0}'.format(len(self.running))
+            n = self.ncopies[t.tag] = self.ncopies.get(t.tag, 0) + 1
+            self.running[t.id] = (self.now + self.duration(t.tag, n), t.id, t)
+        self.stats.tasks_waiting = len(self.waiting)
+        self.stats.workers_idle = self.nworkers - len(self.running)
+        self.stats.total_workers_joined = self.nworkers
+    def submit(self, t):
+        self.nids += 1
+        t.id = self.nids
+        t.submit_time = self.now * 1e6
+        self.waiting.append(t)
+        self.update()
+    def empty(self):
+        return len(self.waiting) == 0 and len(self.running) == 0
+    def cancel_by_taskid(self, tid):
+        self.cancelled.append(tid)
+        if not self.late_cancel:
+            self.running.pop(tid, None)
+        self.update()
+    def wait(self, timeout):
+        end, _, t = min(self.running.values()) if len(self.running) > 0 \
+            else (float('inf'), None, None)
+        if end > self.now + timeout:
+            self.now += timeout
+            return None
+        self.now = end
+        del self.running[t.id]
+        t.finish_time, t.return_status = end * 1e6, 0
+        if t.outdb is not None:
+            with io.open(t.outdb, 'w') as f:
+                f.write(unicode(t.outdb))
+        self.update()
+        return t
+
+def test_stragglers():
+    base = os.path.dirname(os.path.abspath(__file__))
+    rundir = os.path.join(base, 'tmp_{0}'.format(uuid.uuid4()))
+    os.mkdir(rundir)
+    cwd = os.getcwd()
+    os.chdir(rundir) # fake tasks write their output databases here
+    try:
+        _check_stragglers(rundir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(rundir)
+
+def _check_stragglers(rundir):
+    jobs_file = os.path.join(rundir, 'jobs')
+    ids = [uuid.uuid4().hex for i in range(20)]
+    outdbs = sorted('{0}_out.h5'.format(i) for i in range(len(ids)))
+    slow = ids[5]
+    # the first copy of one task is slow, e.g., on a bad node
+    duration = lambda tag, n: 1000. if tag == slow and n == 1 else 10.
+    q = FakeQueue(4, duration)
+    make = lambda cmd, instid, outdb, bring_files, memory: \
+        FakeTask(cmd, instid, outdb)
+    costs = dict((x, 1.) for x in ids)
+    stragglers = launch_master.Stragglers(costs=costs, clock=q.clock)
+    launch_master.start_queue(q, len(ids), iter(ids), 'in.h5', 
+                              {'run_file': 'run.sh'}, stragglers=stragglers, 
+                              make=make)
+    launch_master.finish_queue(q, jobs_file=jobs_file, stragglers=stragglers)
+    assert_equal(stragglers.n_spec, 1)
+    assert_equal(q.ncopies[slow], 2)
+    assert_equal(stragglers.done, set(ids))
+    # the slow copy is cancelled and the run ends long before it would finish
+    assert_equal(len(q.cancelled), 1)
+    assert_true(q.now < 1e3 + 200)
+    with io.open(jobs_file) as f:
+        lines = f.readlines()[1:]
+    assert_equal(len(lines), len(ids))
+    os.remove(jobs_file)
+    # each task's output database is that of its kept copy
+    assert_equal(sorted(os.listdir(rundir)), outdbs)
+    for outdb in outdbs:
+        with io.open(outdb) as f:
+            exp = '5_out_1.h5' if outdb == '5_out.h5' else \
+                outdb.replace('.h5', '_0.h5')
+            assert_equal(f.read(), exp)
+        os.remove(outdb)
+
+    # a losing copy that returns before it is cancelled is not recorded, and
+    # its output database does not replace the kept copy's
+    q = FakeQueue(4, duration, late_cancel=True)
+    stragglers = launch_master.Stragglers(costs=costs, clock=q.clock)
+    launch_master.start_queue(q, len(ids), iter(ids), 'in.h5', 
+                              {'run_file': 'run.sh'}, stragglers=stragglers, 
+                              make=make)
+    launch_master.finish_queue(q, jobs_file=jobs_file, stragglers=stragglers)
+    assert_equal(q.ncopies[slow], 2)
+    with io.open(jobs_file) as f:
+        lines = f.readlines()[1:]
+    assert_equal(sorted(x.split()[-1] for x in lines), sorted(ids))
+    os.remove(jobs_file)
+    assert_equal(sorted(os.listdir(rundir)), outdbs)
+    with io.open('5_out.h5') as f:
+        assert_equal(f.read(), '5_out_1.h5')
+    for outdb in outdbs:
+        os.remove(outdb)
+
+    # without straggler detection, the run waits on the slow copy
+    q = FakeQueue(4, duration)
+    launch_master.start_queue(q, len(ids), iter(ids), 'in.h5', 
+                              {'run_file': 'run.sh'}, make=make)
+    launch_master.finish_queue(q, jobs_file=jobs_file)
+    assert_true(q.now >= 1e3 + 1000)
+    assert_equal(sorted(os.listdir(rundir)), sorted(outdbs + ['jobs']))
+
 @timeout()
 def exec_timeout(client, host, user, keyfile, cmd):
     print('executing {0} with timeout'.format(cmd))
@@ -154,3 +590,60 @@ def test_get_files():
         warnings.warn('connection via ssh to {0}@{1} timed out'.format(user, host))
         
     shutil.rmtree(localdir)
+
+@timeout()
+def stream_files_timeout(client, host, user, keyfile, remotedir, localdir, re):
+    print('streaming files with timeout')
+    client.connect(host, username=user, key_filename=keyfile)
+    files = list(utils._stream_files(client, remotedir, localdir, re, 
+                                     threads=2, settle=0))
+    client.close()
+    return files
+
+@timeout(20)    
+def test_stream_files():
+    user = 'gidden'
+    host = 'submit-3.chtc.wisc.edu'
+
+    localbase = os.path.dirname(os.path.abspath(__file__))
+    remotebase = utils.batlab_base_dir_template.format(user=user)
+    tmpdir = 'tmp_{0}'.format(uuid.uuid4())
+    localdir = os.path.join(localbase, tmpdir)
+    remotedir = '/'.join([remotebase, tmpdir])
+
+    try:
+        client = pm.SSHClient()
+        client.set_missing_host_key_policy(pm.AutoAddPolicy())
+        can_connect, keyfile, pw = tools.ssh_test_connect(client, host, user, 
+                                                          auth=False)
+    except TimeoutError:
+        warnings.warn('could not connect via ssh to {0}@{1}'.format(user, host))
+        return
+        
+    os.makedirs(localdir)
+    prefix='tmp_'
+    tstfiles = [prefix + 'test_file', prefix + 'other_file', 
+                prefix + 'third_file']
+    touchline = " ".join("/".join([remotedir, f]) for f in tstfiles)
+    cmd = "mkdir -p {0} && touch {1}".format(remotedir, touchline)
+       
+    try:
+        exec_timeout(client, host, user, keyfile, cmd)
+    except TimeoutError:
+        warnings.warn('connection via ssh to {0}@{1} timed out'.format(user, host))
+            
+    try:
+        files = stream_files_timeout(client, host, user, keyfile, remotedir, 
+                                     localdir, prefix + '*')
+        assert_equal(set(os.path.basename(f) for f in files), set(tstfiles))
+        assert_equal(set(os.listdir(localdir)), set(tstfiles))
+    except TimeoutError:
+        warnings.warn('connection via ssh to {0}@{1} timed out'.format(user, host))
+        
+    cmd = "rm -rf {0}".format(remotedir)
+    try:
+        exec_timeout(client, host, user, keyfile, cmd)
+    except TimeoutError:
+        warnings.warn('connection via ssh to {0}@{1} timed out'.format(user, host))
+        
+    shutil.rmtree(localdir)
@@ -1,10 +1,11 @@
 from cyclopts.exchange_family import ResourceExchange, PathMap
 from cyclopts import exchange_family
+from cyclopts import exchange_solvers
 
 import numpy as np
 from numpy.testing import assert_array_equal
 import nose
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_almost_equal, assert_true
 import uuid
 import tables as t
 import os
@@ -132,7 +133,7 @@ def test_run():
                prefs[4])
     arcs = [a1, a2, a3, a4, a5]
         
-    stypes = ["cbc", "clp-e", "greedy"]
+    stypes = ["cbc", "clp-e", "greedy", "greedy-np"]
     exp_flows = {0: 1, 1: 0, 2: 1, 3: 0.5, 4: 0.5}
     for t in stypes:
         print("\nTesting with solver: {0}\n".format(t))
@@ -141,6 +142,86 @@ def test_run():
         for id, flow in soln.flows.iteritems():
             assert_equal(exp_flows[id], flow)
 
+def test_greedy_np():
+    base = os.path.dirname(os.path.abspath(__file__))
+    h5file = t.open_file(os.path.join(base, 'files', 'test_in.h5'), 'r')
+    fam = ResourceExchange()
+    manager = cycio.IOManager(h5file, 
+                              fam.register_tables(h5file, fam.io_prefix),
+                              fam.register_groups(h5file, fam.io_prefix))
+    tbl = h5file.get_node(fam.io_prefix + '/' + fam.property_table_name)
+    instids = [uuid.UUID(bytes=x) for x in tbl.read(field='instid')]
+    for instid in instids:
+        inst = fam.read_inst(instid, manager)
+        exp = fam.run_inst(inst, Solver('greedy'))
+        obs = fam.run_inst(inst, Solver('greedy-np'))
+        assert_almost_equal(exp.cost_flow, obs.cost_flow)
+        assert_almost_equal(exp.pref_flow, obs.pref_flow)
+        exp_flows = dict(exp.flows.items())
+        obs_flows = dict(obs.flows.items())
+        assert_equal(sorted(exp_flows.keys()), sorted(obs_flows.keys()))
+        for id, flow in exp_flows.items():
+            assert_almost_equal(flow, obs_flows[id])
+    # instances are solved directly from arrays as well
+    arrays = exchange_family.inst_to_arrays(inst)
+    soln = fam.run_inst(arrays, Solver('greedy-np'))
+    assert_almost_equal(obs.cost_flow, soln.cost_flow)
+    del manager
+    h5file.close()
+
+def test_highs():
+    if exchange_solvers.sp is None:
+        raise nose.SkipTest('The HiGHS solvers require scipy >= 1.9.')
+    base = os.path.dirname(os.path.abspath(__file__))
+    h5file = t.open_file(os.path.join(base, 'files', 'test_in.h5'), 'r')
+    fam = ResourceExchange()
+    manager = cycio.IOManager(h5file, 
+                              fam.register_tables(h5file, fam.io_prefix),
+                              fam.register_groups(h5file, fam.io_prefix))
+    tbl = h5file.get_node(fam.io_prefix + '/' + fam.property_table_name)
+    for row in tbl.read():
+        inst = fam.read_inst(uuid.UUID(bytes=row['instid']), manager)
+        groups, nodes, arcs = exchange_family.inst_to_arrays(inst)
+        c, A, _, _, _, _, integrality, _ = exchange_solvers.program(
+            groups, nodes, arcs)
+        nreq = np.sum(groups['kind'])
+        assert_equal(A.shape[1], row['n_arcs'] + nreq)
+        assert_equal(len(c), row['n_arcs'] + nreq)
+        assert_equal(np.sum(integrality), 
+                     int(round(row['excl_frac'] * row['n_arcs'])))
+        exp = fam.run_inst(inst, Solver('cbc'))
+        mip = fam.run_inst(inst, Solver('highs'))
+        lp = fam.run_inst(inst, Solver('highs-lp'))
+        assert_almost_equal(mip.objective / exp.objective, 1, places=5)
+        assert_true(lp.objective <= mip.objective + 1e-6)
+    del manager
+    h5file.close()
+
+def test_flow_block():
+    # instance 0 has 3 arcs, instance 1 has 2 arcs
+    # solutions 0 and 1 belong to instance 0, solution 2 (no flow) and 3 to 1
+    iids = [uuid.uuid4() for i in range(2)]
+    sids = [uuid.uuid4() for i in range(4)]
+    block = exchange_family.FlowBlock(
+        iids, np.array([0, 3, 5]), sids, np.array([0, 2, 4]), 
+        np.array([0, 2, 3, 3, 5]), np.array([0, 2, 1, 3, 4]), 
+        np.array([1., 2., 3., 4., 5.]))
+    prefs = np.array([1., 10., 100., 1000., 10000.])
+    obs = block.dot(prefs)
+    exp = [201., 30., 0., 54000.]
+    assert_array_equal(exp, obs)
+
+    # the properties of each instance, as given by post_process()
+    narcs, sid_to_flows = block.instance(iids[0])
+    assert_equal(narcs, 3)
+    assert_equal(set(sid_to_flows.keys()), set(sids[:2]))
+    assert_array_equal(sid_to_flows[sids[0]], [1., 0., 2.])
+    assert_array_equal(sid_to_flows[sids[1]], [0., 3., 0.])
+    narcs, sid_to_flows = block.instance(iids[1])
+    assert_equal(narcs, 2)
+    assert_array_equal(sid_to_flows[sids[2]], [0., 0.])
+    assert_array_equal(sid_to_flows[sids[3]], [4., 5.])
+
 class TestExchangeIO:
     def cleanup(self):
         if os.path.exists(self.fname):
@@ -1,13 +1,16 @@
 import numpy as np
 import uuid
 import os
+import shutil
 import tables as t
+from collections import namedtuple
 
 import nose
 from nose.tools import assert_true, assert_equal, assert_raises
 from numpy.testing import assert_array_equal
 
 from cyclopts import cyclopts_io as cycio
+from cyclopts import io_tools
 
 class TestIO:
     def setUp(self):
@@ -114,3 +117,49 @@ class TestIO:
         del manager
         rows = self.h5file.root.tbl[:]
         assert_array_equal(data, rows)
+
+    def test_value_mapping(self):
+        dt = np.dtype([('x', ('str', 16)), ('y', np.int64)])
+        # no trailing null bytes, which are stripped from stored strings
+        xs = [uuid.UUID(int=2**120 * (3 - i) + 1) for i in range(3)]
+        data = np.empty(6, dtype=dt)
+        data['x'] = [xs[i].bytes for i in [2, 0, 2, 1, 0, 2]]
+        data['y'] = range(6)
+        tbl = self.h5file.create_table('/', 'vals', description=dt)
+        tbl.append(data)
+        tbl.flush()
+
+        obs = io_tools.value_mapping(tbl, 'x', 'y', uuids=False)
+        assert_equal(3, len(obs))
+        assert_equal([0, 2, 5], obs[xs[2].bytes])
+        assert_equal([1, 4], obs[xs[0].bytes])
+        assert_equal([3], obs[xs[1].bytes])
+
+        keys, vals, offsets = io_tools.value_mapping(tbl, 'x', 'y', 
+                                                     grouped=True)
+        assert_equal(3, len(keys))
+        assert_equal([0, 6], [offsets[0], offsets[-1]])
+        for i, key in enumerate(io_tools.to_uuids(keys)):
+            assert_equal(obs[key.bytes], 
+                         vals[offsets[i]:offsets[i + 1]].tolist())
+
+def test_result_upgrade():
+    # test_out.h5 has a Results table written before the cancelled column
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+    fname = os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4()))
+    shutil.copy(os.path.join(base, 'test_out.h5'), fname)
+    with t.open_file(fname, 'a') as h5file:
+        exp = h5file.root.Results.read()
+        assert_true('cancelled' not in exp.dtype.names)
+        tbl = cycio.ResultTable(h5file)
+        soln = namedtuple('Soln', ['type', 'time', 'objective'])('a', 1., 2.)
+        solver = namedtuple('Solver', ['type'])('b')
+        tbl.record_soln(soln, uuid.uuid4(), uuid.uuid4(), solver, 
+                        cancelled=True)
+        tbl.flush()
+        obs = h5file.root.Results.read()
+    os.remove(fname)
+    assert_equal(len(obs), len(exp) + 1)
+    for name in exp.dtype.names:
+        assert_array_equal(obs[name][:-1], exp[name])
+    assert_equal(list(obs['cancelled']), [False] * len(exp) + [True])
@@ -1,15 +1,18 @@
 from cyclopts import main
 from cyclopts import tools
 from cyclopts import condor
+from cyclopts import exchange_family
+from cyclopts import cyclopts_io as cycio
 
 from cyclopts.structured_species.request import StructuredRequest
+from cyclopts.problems import ProblemSpecies
 
 import os
 import shutil
 import tables as t
 import uuid
 import numpy as np
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_equal, assert_array_almost_equal
 import paramiko as pm
 import warnings
 from collections import defaultdict
@@ -53,6 +56,131 @@ def test_exec():
     if os.path.exists(db):
         os.remove(db)
 
+def test_exec_dense():
+    infile = 'test_in.h5'
+    base = os.path.dirname(os.path.abspath(__file__))
+    path = '/Family/ResourceExchange/ExchangeInstSolutions'
+    flows = {}
+    nrows = {}
+    for opt in ['', '--dense']:
+        db = os.path.join(base, "tmp_{0}.h5".format(str(uuid.uuid4())))
+        shutil.copy(os.path.join(base, 'files', infile), db)
+        cmd = ("exec --db={0} --family_class ResourceExchange "
+               "--family_module cyclopts.exchange_family "
+               "--solvers cbc {1}").format(db, opt)
+        parser = cycmain.gen_parser()
+        cycmain.execute(parser.parse_args(args=cmd.split()))
+        
+        h5file = t.open_file(db, 'r')
+        narcs = {row['instid']: row['n_arcs'] for row in h5file.get_node(
+                '/Family/ResourceExchange/ExchangeInstProperties').iterrows()}
+        flows[opt] = {}
+        nrows[opt] = 0
+        for row in h5file.get_node('/Results').iterrows():
+            tbl = h5file.get_node(path + '/id_' + 
+                                  tools.str_to_uuid(row['solnid']).hex)
+            nrows[opt] += tbl.nrows
+            flows[opt][row['instid']] = exchange_family.dense_flows(
+                tbl, narcs[row['instid']])
+        h5file.close()
+        if os.path.exists(db):
+            os.remove(db)
+    
+    # sparse storage only drops zero flows 
+    assert_equal(nrows['--dense'], 
+                 sum(len(x) for x in flows['--dense'].values()))
+    assert_equal(nrows[''], 
+                 sum(np.count_nonzero(x) for x in flows[''].values()))
+    for iid, x in flows['--dense'].items():
+        assert_array_equal(x, flows[''][iid])
+
+def test_exec_pp():
+    infile = 'test_in.h5'
+    base = os.path.dirname(os.path.abspath(__file__))
+    cycrc = os.path.join(base, 'files', 'cycloptsrc.py')
+    db = os.path.join(base, "tmp_{0}.h5".format(str(uuid.uuid4())))
+    h5pp = os.path.join(base, "tmp_{0}.h5".format(str(uuid.uuid4())))
+    shutil.copy(os.path.join(base, 'files', infile), db)
+    cmd = ("exec --db={0} --cycrc {1} --solvers greedy cbc "
+           "--pp").format(db, cycrc)
+    parser = cycmain.gen_parser()
+    cycmain.execute(parser.parse_args(args=cmd.split()))
+    cmd = 'pp --cycrc {0} --indb {1} --outdb {1} --ppdb {2}'.format(
+        cycrc, db, h5pp)
+    cycmain.post_process(parser.parse_args(cmd.split()))
+    
+    paths = ['/Family/ResourceExchange/PostProcess', 
+             '/Species/StructuredRequest/PostProcess']
+    with t.open_file(db, 'r') as f:
+        nsolns = f.root.Results.nrows
+        obs = [np.sort(f.get_node(path).read(), order='solnid') \
+                   for path in paths]
+    with t.open_file(h5pp, 'r') as f:
+        exp = [np.sort(f.get_node(path).read(), order='solnid') \
+                   for path in paths]
+
+    # fused post processing is equivalent to a separate pp step
+    for x, y in zip(exp, obs):
+        assert_equal(len(y), nsolns)
+        assert_array_equal(x['solnid'], y['solnid'])
+        for name in x.dtype.names[1:]:
+            assert_array_almost_equal(x[name], y[name])
+    
+    for f in [db, h5pp]:
+        if os.path.exists(f):
+            os.remove(f)
+
+def test_exec_portfolio():
+    infile = 'test_in.h5'
+    ninst = 4
+    
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, "tmp_{0}.h5".format(str(uuid.uuid4())))
+    shutil.copy(os.path.join(base, 'files', infile), db)
+    solvers = "greedy clp cbc"
+    cmd = ("exec --db={0} --family_class ResourceExchange "
+           "--family_module cyclopts.exchange_family "
+           "--solvers {1} --portfolio").format(db, solvers)
+    parser = cycmain.gen_parser()
+    cycmain.execute(parser.parse_args(args=cmd.split()))
+    
+    h5file = t.open_file(db, 'r')
+    h5node = h5file.get_node('/Results')
+    # all attempted solvers are recorded
+    assert_equal(h5node.nrows, ninst * len(solvers.split()))
+    cancelled = defaultdict(dict)
+    for row in h5node.iterrows():
+        cancelled[row['instid']][row['solver']] = row['cancelled']
+    nsolns = sum(1 for _ in h5file.get_node(
+            '/Family/ResourceExchange/ExchangeInstSolutions')._f_iter_nodes())
+    h5file.close()
+    
+    # the exact solver always completes without a deadline
+    assert_equal(len(cancelled), ninst)
+    for iid, solvers in cancelled.items():
+        assert_equal(solvers['cbc'], False)
+    ndone = sum(1 for x in cancelled.values() for y in x.values() if not y)
+    assert_equal(nsolns, ndone)
+            
+    if os.path.exists(db):
+        os.remove(db)
+
+def test_submit_local():
+    # instances are packed into one job per local worker
+    base = os.path.dirname(os.path.abspath(__file__))
+    db = os.path.join(base, 'files', 'test_in.h5')
+    rundir = os.path.join(base, 'tmp_{0}'.format(uuid.uuid4()))
+    cmd = ("condor-submit --db {0} --family_class ResourceExchange "
+           "--family_module cyclopts.exchange_family --solvers greedy "
+           "--kind local --jobs 2 --remotedir {1}").format(db, rundir)
+    parser = cycmain.gen_parser()
+    cycmain.condor_submit(parser.parse_args(args=cmd.split()))
+    assert_equal(sorted(x for x in os.listdir(rundir) if x.endswith('.out')), 
+                 ['0.out', '1.out'])
+    with t.open_file(os.path.join(rundir, 'cyclopts_results.h5'), 'r') as f:
+        assert_equal(f.root.Results.nrows, 4)
+    shutil.rmtree(rundir)
+
 def test_convert():
     base = os.path.dirname(os.path.abspath(__file__))
     rc = os.path.join(base, 'files', 'test.rc')    
@@ -141,6 +269,145 @@ def test_pp():
     if os.path.exists(h5pp):
         os.remove(h5pp)    
 
+def test_pp_jobs():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'files')
+    cycrc = os.path.join(base, 'cycloptsrc.py')
+    h5in = os.path.join(base, 'test_in.h5')
+    h5out = os.path.join(base, 'test_out.h5')
+    paths = ['/Family/ResourceExchange/PostProcess', 
+             '/Species/StructuredRequest/PostProcess']
+    rows = {}
+    for opt in ['', '--jobs 2']:
+        h5pp = os.path.join(base, 'tmp_pp_{0}.h5'.format(uuid.uuid4()))
+        cmd = ('pp --cycrc {0} --indb {1} --outdb {2} --ppdb {3} '
+               '--chunksize 1 {4}').format(cycrc, h5in, h5out, h5pp, opt)
+        parser = cycmain.gen_parser()
+        cycmain.post_process(parser.parse_args(cmd.split()))
+        with t.open_file(h5pp, 'r') as f:
+            rows[opt] = [f.get_node(path).read() for path in paths]
+        os.remove(h5pp)
+
+    # parallel output is identical to serial output
+    for exp, obs in zip(rows[''], rows['--jobs 2']):
+        assert_greater(len(exp), 0)
+        assert_array_equal(exp, obs)
+
+def test_pp_incremental():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'files')
+    cycrc = os.path.join(base, 'cycloptsrc.py')
+    h5in = os.path.join(base, 'test_in.h5')
+    h5out = os.path.join(base, 'test_out.h5')
+    h5pp = os.path.join(base, 'tmp_pp_{0}.h5'.format(uuid.uuid4()))
+    paths = ['/Family/ResourceExchange/PostProcess', 
+             '/Species/StructuredRequest/PostProcess']
+    cmd = 'pp --cycrc {0} --indb {1} --outdb {2} --ppdb {3} --limit 2'.format(
+        cycrc, h5in, h5out, h5pp)
+    parser = cycmain.gen_parser()
+    cycmain.post_process(parser.parse_args(cmd.split()))
+    with t.open_file(h5pp, 'r') as f:
+        first = [f.get_node(path).nrows for path in paths]
+
+    # a solution post processed into only one table is not duplicated
+    with t.open_file(h5pp, 'a') as f:
+        tbl = f.get_node(paths[1])
+        tbl.remove_rows(tbl.nrows - 1, tbl.nrows)
+
+    # only the remaining solutions are post processed, and then none
+    for _ in range(2):
+        cmd = 'pp --cycrc {0} --indb {1} --outdb {2} --ppdb {3}'.format(
+            cycrc, h5in, h5out, h5pp)
+        cycmain.post_process(parser.parse_args(cmd.split()))
+    with t.open_file(h5out, 'r') as f:
+        nsolns = f.root.Results.nrows
+    with t.open_file(h5pp, 'r') as f:
+        for n, path in zip(first, paths):
+            tbl = f.get_node(path)
+            assert_greater(nsolns, n)
+            assert_equal(tbl.nrows, nsolns)
+            assert_equal(len(set(tbl.read(field='solnid'))), nsolns)
+    os.remove(h5pp)
+
+class DefaultChunkRequest(StructuredRequest):
+    """a species that post processes chunks with the ProblemSpecies default,
+    i.e., one instance at a time"""
+    def post_process_chunk(self, iid_to_sids, props, io_managers):
+        return ProblemSpecies.post_process_chunk(self, iid_to_sids, props, 
+                                                 io_managers)
+
+def test_pp_default_species():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'files')
+    h5in = os.path.join(base, 'test_in.h5')
+    h5out = os.path.join(base, 'test_out.h5')
+    path = '/Species/StructuredRequest/PostProcess'
+    rows = []
+    for sp in [StructuredRequest(), DefaultChunkRequest()]:
+        h5pp = os.path.join(base, 'tmp_pp_{0}.h5'.format(uuid.uuid4()))
+        fam = sp.family
+        h5files = (t.open_file(h5in, mode='r'), t.open_file(h5out, mode='r'), 
+                   t.open_file(h5pp, mode='a'))
+        fam_managers = tools.io_managers(fam, h5files)
+        sp_managers = tools.io_managers(sp, h5files)
+        res_manager = cycio.IOManager(
+            h5files[1], [cycio.ResultTable(h5files[1], path='/Results')])
+        tools.drive_post_process(res_manager.tables['Results'], 
+                                 fam=fam, fam_io_managers=fam_managers,
+                                 sp=sp, sp_io_managers=sp_managers, 
+                                 chunksize=2)
+        for m in fam_managers + sp_managers:
+            m.flush_tables()
+        rows.append(np.sort(h5files[2].get_node(path).read(), order='solnid'))
+        for h5f in h5files:
+            h5f.close()
+        os.remove(h5pp)
+    assert_greater(len(rows[0]), 0)
+    assert_array_equal(rows[0]['solnid'], rows[1]['solnid'])
+    assert_array_almost_equal(rows[0]['c_pref_flow'], rows[1]['c_pref_flow'])
+    assert_array_almost_equal(rows[0]['l_pref_flow'], rows[1]['l_pref_flow'])
+
+def test_combine_link():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'files')
+    cycrc = os.path.join(base, 'cycloptsrc.py')
+    h5in = os.path.join(base, 'test_in.h5')
+    h5out = os.path.join(base, 'test_out.h5')
+    master = os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4()))
+    parser = cycmain.gen_parser()
+    cmd = "combine --files {0} {1} --outdb {2} --link".format(
+        h5in, h5out, master)
+    cycmain.cyclopts_combine(parser.parse_args(args=cmd.split()))
+
+    # per-solution data is linked, not copied
+    path = '/Family/ResourceExchange/ExchangeInstSolutions'
+    with t.open_file(master, 'r') as f:
+        assert_equal(f.root.Results.nrows, 4)
+        links = list(f.get_node(path)._f_iter_nodes())
+        assert_greater(len(links), 0)
+        for link in links:
+            assert_true(isinstance(link, t.link.ExternalLink))
+    assert_greater(os.path.getsize(h5out), os.path.getsize(master))
+    
+    # post processing the master is equivalent to the original files
+    paths = ['/Family/ResourceExchange/PostProcess', 
+             '/Species/StructuredRequest/PostProcess']
+    rows = []
+    for indb, outdb in [(h5in, h5out), (master, master)]:
+        h5pp = os.path.join(base, 'tmp_pp_{0}.h5'.format(uuid.uuid4()))
+        cmd = 'pp --cycrc {0} --indb {1} --outdb {2} --ppdb {3}'.format(
+            cycrc, indb, outdb, h5pp)
+        cycmain.post_process(parser.parse_args(cmd.split()))
+        with t.open_file(h5pp, 'r') as f:
+            rows.append([np.sort(f.get_node(path).read(), order='solnid') \
+                             for path in paths])
+        os.remove(h5pp)
+        # linked files are closed once post processing is complete
+        assert_equal(cycio._linked_files, {})
+    os.remove(master)
+    for exp, obs in zip(*rows):
+        assert_array_equal(exp, obs)
+
 @timeout()
 def test_collect():
     user = 'gidden'
@@ -0,0 +1,65 @@
+import os
+import time
+import warnings
+import multiprocessing as mp
+from collections import namedtuple
+
+import nose
+from nose.tools import assert_equal, assert_true
+
+from cyclopts import portfolio
+
+Soln = namedtuple('Soln', ['time', 'objective'])
+
+class FakeFamily(object):
+    """a family whose solvers finish, fail, die, or hang depending on their
+    type"""
+    name = 'Fake'
+
+    def run_inst(self, inst, solver):
+        if solver.type == 'fail':
+            raise ValueError('no solution')
+        elif solver.type == 'die':
+            os._exit(1)
+        elif solver.type == 'hang':
+            time.sleep(60)
+        return Soln(0., inst[solver.type])
+
+    def dump_soln(self, soln):
+        return tuple(soln)
+
+    def load_soln(self, data):
+        return Soln(*data)
+
+def test_winner():
+    Entry = portfolio.Entry
+    entries = [Entry('greedy', Soln(0., 1.), False),
+               Entry('clp', Soln(0., 0.), False),
+               Entry('cbc', Soln(0., 2.), True)]
+    assert_equal(portfolio.winner(entries).solver, 'greedy')
+    entries[2] = Entry('cbc', Soln(0., 2.), False)
+    assert_equal(portfolio.winner(entries).solver, 'cbc')
+    assert_equal(portfolio.winner([]), None)
+
+def test_race():
+    inst = {'greedy': 5., 'cbc': 3., 'highs': 3.}
+    
+    # the exact solver ends the race, the hanging solver is cancelled
+    solvers = ['hang', 'highs']
+    start = time.time()
+    entries = portfolio.race(FakeFamily(), inst, solvers, deadline=30)
+    assert_true(time.time() - start < 30)
+    assert_equal([e.solver for e in entries], solvers)
+    assert_equal([e.cancelled for e in entries], [True, False])
+    assert_equal(entries[1].soln.objective, 3.)
+    
+    # failed solvers are recorded as cancelled
+    solvers = ['fail', 'die', 'greedy']
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        entries = portfolio.race(FakeFamily(), inst, solvers, deadline=30)
+    assert_equal([e.cancelled for e in entries], [True, True, False])
+    assert_equal(len(w), 2)
+    
+    # no solver processes remain
+    assert_equal(mp.active_children(), [])
@@ -0,0 +1,145 @@
+import numpy as np
+import os
+import uuid
+import tables as t
+
+import nose
+from nose.tools import assert_equal, assert_true, assert_almost_equal, \
+    assert_raises
+
+from cyclopts import scheduling as sched
+from cyclopts import tools
+
+def test_order():
+    costs = {'a': 1, 'b': 3, 'c': 2, 'd': 3}
+    assert_equal(sched.order(costs), ['b', 'd', 'c', 'a'])
+
+def test_pack():
+    costs = {'a': 7, 'b': 5, 'c': 4, 'd': 3, 'e': 3}
+    bins = sched.pack(costs, 2)
+    assert_equal(bins, [['a', 'd'], ['b', 'c', 'e']])
+    loads = [sum(costs[k] for k in b) for b in bins]
+    assert_equal(loads, [10, 12])
+
+    # more bins than work
+    bins = sched.pack({'a': 1}, 4)
+    assert_equal(bins, [['a']])
+
+    # full bins are given no more items
+    bins = sched.pack(costs, 3, max_items=2)
+    assert_equal(bins, [['a'], ['b', 'e'], ['c', 'd']])
+    assert_raises(ValueError, sched.pack, costs, 2, 2)
+
+def test_pack_jobs():
+    costs = {'a': 7, 'b': 5, 'c': 4, 'd': 3, 'e': 3}
+    assert_equal(sched.pack_jobs(costs), [['a'], ['b'], ['c'], ['d'], ['e']])
+    # loads are balanced among the fewest jobs of per_job items
+    jobs = sched.pack_jobs(costs, per_job=2)
+    assert_equal(jobs, [['a'], ['b', 'e'], ['c', 'd']])
+    loads = [sum(costs[k] for k in job) for job in jobs]
+    assert_equal(loads, [7, 8, 7])
+    costs = dict((k, 10 - i) for i, k in enumerate('abcdefgh'))
+    jobs = sched.pack_jobs(costs, per_job=4)
+    assert_equal([len(job) for job in jobs], [4, 4])
+    assert_equal([sum(costs[k] for k in job) for job in jobs], [26, 26])
+    costs = {'a': 7, 'b': 5, 'c': 4, 'd': 3, 'e': 3}
+    # a too-long item is run alone
+    assert_equal(sched.pack_jobs(costs, target=6), 
+                 [['a'], ['b'], ['c'], ['d', 'e']])
+    assert_equal(sched.pack_jobs(costs, target=11), 
+                 [['a', 'd'], ['b', 'c'], ['e']])
+
+def test_runtime_model():
+    dt = np.dtype([(x, np.float64) for x in sched.cost_cols])
+    props = np.zeros(5, dtype=dt)
+    props['n_arcs'] = [1, 2, 3, 4, 5]
+    props['n_constrs'] = [2, 1, 4, 3, 5]
+    props['excl_frac'] = [0, 0.5, 0, 1, 0.2]
+    exp = np.array([0.5, 2., 0.25, 0.1])
+    times = sched.RuntimeModel.features(props).dot(exp)
+    model = sched.RuntimeModel().fit(props, times)
+    assert_true(np.allclose(model.coeffs, exp))
+    assert_true(np.allclose(model.predict(props), times))
+
+def test_schedule():
+    base = os.path.dirname(os.path.abspath(__file__))
+    fpth = os.path.join(base, 'files', 'test_in.h5')
+    path = '/Family/ResourceExchange/ExchangeInstProperties'
+    with t.open_file(fpth, 'r') as h5file:
+        instids = tools.collect_instids(h5file, path)
+        narcs = dict((tools.str_to_uuid(x['instid']), x['n_arcs']) \
+                         for x in h5file.get_node(path).iterrows())
+        obs = sched.schedule(h5file, path, instids)
+    assert_equal(set(obs), instids)
+    obs_arcs = [narcs[x] for x in obs]
+    assert_equal(obs_arcs, sorted(obs_arcs, reverse=True))
+
+def _telemetry_file():
+    """Returns an in-memory file with instance properties and job telemetry of
+    jobs executing one or two instances."""
+    from cyclopts.condor.telemetry import jobs_dt
+    dt = np.dtype([('instid', ('str', 16))] + \
+                      [(x, np.float64) for x in sched.cost_cols])
+    ids = [uuid.uuid4() for _ in range(5)]
+    props = np.zeros(5, dtype=dt)
+    props['instid'] = [x.bytes for x in ids]
+    props['n_arcs'] = [1, 2, 3, 4, 5]
+    props['n_constrs'] = [2, 1, 4, 3, 5]
+    props['excl_frac'] = [0, 0.5, 0, 1, 0.2]
+    mem = sched.RuntimeModel.features(props).dot([100., 20., 10., 5.])
+    wall = sched.RuntimeModel.features(props).dot([30., 2., 1., 4.])
+    
+    rows = [('{0}.0'.format(i), ids[i].bytes, 'dag', '', 0., 0., wall[i], 
+             0., wall[i], mem[i], 0) for i in range(5)]
+    # a job of instances 0 and 4, whose memory is that of the larger (4)
+    rows += [('5.0', ids[i].bytes, 'dag', '', 0., 0., wall[0] + wall[4], 
+              0., wall[0] + wall[4], mem[4], 0) for i in [0, 4]]
+    # a failed job and a job with unknown memory are not considered
+    rows += [('6.0', ids[1].bytes, 'dag', '', 0., 0., 1e6, 0., 1e6, np.nan, 
+              137)]
+    jobs = np.array(rows, dtype=jobs_dt)
+    
+    h5file = t.open_file('telemetry.h5', 'w', driver='H5FD_CORE', 
+                         driver_core_backing_store=0)
+    h5file.create_table('/', 'props', obj=props)
+    h5file.create_table('/', 'jobs', obj=jobs)
+    return h5file, ids, mem, wall
+
+def test_fit_memory_model():
+    h5file, ids, mem, wall = _telemetry_file()
+    model = sched.fit_memory_model(h5file.root.props, h5file.root.jobs)
+    assert_true(isinstance(model, sched.MemoryModel))
+    assert_true(np.allclose(model.coeffs, [100., 20., 10., 5.]))
+    h5file.close()
+
+def test_fit_walltime_model():
+    h5file, ids, mem, wall = _telemetry_file()
+    model = sched.fit_walltime_model(h5file.root.props, h5file.root.jobs)
+    assert_true(np.allclose(model.coeffs, [30., 2., 1., 4.]))
+    h5file.close()
+
+def test_requests():
+    h5file, ids, mem, wall = _telemetry_file()
+    jobs = [[ids[0]], [ids[1], ids[4]]]
+    assert_equal(sched.memory_requests(h5file, '/props', jobs), 
+                 [sched.default_memory] * 2)
+    assert_equal(sched.walltime_requests(h5file, '/props', jobs), 
+                 [sched.default_walltime] * 2)
+
+    model = sched.MemoryModel([100., 20., 10., 5.])
+    obs = sched.memory_requests(h5file, '/props', jobs, model=model, 
+                                margin=1.5, minimum=100.)
+    assert_equal(obs, [int(np.ceil(1.5 * mem[0])), int(np.ceil(1.5 * mem[4]))])
+    # no less than the minimum is requested, even if no memory is predicted
+    obs = sched.memory_requests(h5file, '/props', jobs, model=model, 
+                                margin=1.5)
+    assert_equal(obs, [512, 512])
+    model = sched.MemoryModel([-1000., 0., 0., 0.])
+    obs = sched.memory_requests(h5file, '/props', jobs, model=model)
+    assert_equal(obs, [512, 512])
+
+    model = sched.RuntimeModel([30., 2., 1., 4.])
+    obs = sched.walltime_requests(h5file, '/props', jobs, model=model, 
+                                  margin=2., minimum=100.)
+    assert_equal(obs, [100, int(np.ceil(2. * (wall[1] + wall[4])))])
+    h5file.close()
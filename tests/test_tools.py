@@ -7,6 +7,7 @@ import os
 import uuid
 import nose
 import tables as t
+import numpy as np
 from functools import reduce
 from nose.tools import assert_equal, assert_true, assert_false, assert_raises
 import subprocess
@@ -14,6 +15,7 @@ import uuid
 
 from cyclopts import exchange_family
 from cyclopts import tools
+from cyclopts import cyclopts_io as cycio
 
 exec_cmd = """cyclopts exec --db {indb} --outdb {outdb} \
 --conds "{{'inst_queries':['n_arcs=={narcs}']}}" \
@@ -93,6 +95,178 @@ class TestCombine:
             db.close()
         self.passed = True
         
+def test_combine_compat():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+    fnames = [os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4())) \
+                  for i in range(3)]
+    full = np.dtype([('a', 'i4'), ('b', 'f8')])
+    part = np.dtype([('b', 'f8')])
+    with t.open_file(fnames[0], 'w') as f:
+        f.create_table('/', 'tbl', np.array([(1, 1.)], dtype=full))
+        f.create_table('/grp', 'id_0', np.array([(1, 1.)], dtype=full), 
+                       createparents=True)
+    with t.open_file(fnames[1], 'w') as f:
+        f.create_table('/', 'tbl', np.array([(2.,), (3.,)], dtype=part))
+        f.create_table('/grp', 'id_1', np.array([(2, 2.)], dtype=full), 
+                       createparents=True)
+    
+    # small buffers force chunked appends
+    combine(iter(fnames[:2]), new_file=fnames[2], bufsize=1)
+    with t.open_file(fnames[2], 'r') as f:
+        obs = f.root.tbl.read()
+        assert_equal(list(obs['a']), [1, 0, 0])
+        assert_equal(list(obs['b']), [1., 2., 3.])
+        assert_equal(sorted(f.root.grp._v_children), ['id_0', 'id_1'])
+        assert_equal(f.root.grp.id_1.read()[0]['a'], 2)
+    for fname in fnames:
+        os.remove(fname)
+
+    rows = np.array([(1., 2)], dtype=[('b', 'f8'), ('a', 'i4')])
+    assert_raises(ValueError, tools.conform, rows, part)
+
+def test_parallel_combine():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+    dt = np.dtype([('a', 'i4'), ('b', 'f8')])
+    fnames = []
+    for i in range(7):
+        fnames.append(os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4())))
+        with t.open_file(fnames[-1], 'w') as f:
+            f.create_table('/', 'tbl', np.array([(i, i)] * (i + 1), dtype=dt))
+            f.create_table('/grp', 'id_{0}'.format(i), 
+                           np.array([(i, i)], dtype=dt), createparents=True)
+    
+    obs = {}
+    for jobs, fanin in [(1, None), (2, None), (3, 2)]:
+        fname = os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4()))
+        if jobs == 1:
+            combine(iter(fnames), new_file=fname)
+        else:
+            tools.parallel_combine(iter(fnames), new_file=fname, jobs=jobs, 
+                                   fanin=fanin)
+        with t.open_file(fname, 'r') as f:
+            obs[jobs] = (f.root.tbl.read(), 
+                         [x.read() for x in f.root.grp._f_iter_nodes()])
+        os.remove(fname)
+    for fname in fnames:
+        os.remove(fname)
+    
+    # the reduction tree does not change the layout of the output
+    for jobs in [2, 3]:
+        assert_true(np.array_equal(obs[1][0], obs[jobs][0]))
+        assert_equal(len(obs[1][1]), len(obs[jobs][1]))
+        for x, y in zip(obs[1][1], obs[jobs][1]):
+            assert_true(np.array_equal(x, y))
+
+def test_col2grp():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+    fnames = [os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4())) \
+                  for i in range(4)]
+    ids = [uuid.uuid4() for i in range(3)]
+    # the last id is not contiguous
+    order = [0, 0, 0, 1, 2, 2, 0]
+    dt = np.dtype([('instid', 'S16'), ('arc_id', 'i4'), ('pref', 'f8')])
+    arcs = np.array([(ids[x].bytes, i, i) for i, x in enumerate(order)], 
+                    dtype=dt)
+    dt = np.dtype([('solnid', 'S16'), ('arc_id', 'i4'), ('flow', 'f8')])
+    flows = np.array([(ids[x].bytes, i, i) for i, x in enumerate(order)], 
+                     dtype=dt)
+    with t.open_file(fnames[0], 'w') as f:
+        f.create_table('/Family/ResourceExchange', 'ExchangeArcs', arcs, 
+                       createparents=True)
+        f.create_table('/Species/StructuredRequest', 'Arcs', arcs, 
+                       createparents=True)
+        f.create_table('/Family/ResourceExchange', 'ExchangeNodes', arcs, 
+                       createparents=True)
+    with t.open_file(fnames[1], 'w') as f:
+        f.create_table('/Family/ResourceExchange', 'ExchangeInstSolutions', 
+                       flows, createparents=True)
+
+    # chunks split runs of ids
+    tools.col2grp(*fnames, chunksize=2)
+    paths = {fnames[2]: ['/Family/ResourceExchange/ExchangeArcs', 
+                         '/Species/StructuredRequest/Arcs'],
+             fnames[3]: ['/Family/ResourceExchange/ExchangeInstSolutions']}
+    for fname, pths in paths.items():
+        with t.open_file(fname, 'r') as f:
+            if fname == fnames[2]:
+                assert_equal(f.root.Family.ResourceExchange.ExchangeNodes.nrows, 
+                             len(order))
+            for path in pths:
+                grp = f.get_node(path)
+                assert_equal(len(grp._v_children), len(ids))
+                for i, x in enumerate(ids):
+                    rows = grp._f_get_child('id_' + x.hex).read()
+                    exp = [j for j, y in enumerate(order) if y == i]
+                    assert_equal(list(rows['arc_id']), exp)
+    for fname in fnames:
+        os.remove(fname)
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+    def is_active(self):
+        return self.active
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+class FakeChannel(object):
+    closed = False
+
+class FakeSFTP(object):
+    def __init__(self):
+        self.channel = FakeChannel()
+    def get_channel(self):
+        return self.channel
+    def close(self):
+        self.channel.closed = True
+
+class FakeSSHClient(object):
+    """a stand-in for a paramiko SSHClient connected to a local sshd"""
+    def __init__(self):
+        self.transport = None
+        self.nsftp = 0
+    def connect(self, host, username=None, key_filename=None, password=None):
+        self.host = host
+        self.transport = FakeTransport()
+    def get_transport(self):
+        return self.transport
+    def open_sftp(self):
+        self.nsftp += 1
+        return FakeSFTP()
+    def close(self):
+        self.transport.active = False
+
+def test_ssh_sessions():
+    clients = []
+    def factory():
+        clients.append(FakeSSHClient())
+        return clients[-1]
+    sessions = tools.SSHSessions(client_factory=factory, keepalive=10)
+    
+    # one client per user and host
+    c = sessions.client('localhost', 'me')
+    assert_true(c is sessions.client('localhost', 'me'))
+    assert_equal(c.transport.keepalive, 10)
+    assert_false(c is sessions.client('localhost', 'you'))
+    assert_equal(len(clients), 2)
+    
+    # sftp sessions are reused
+    sftp = sessions.sftp('localhost', 'me')
+    assert_true(sftp is sessions.sftp('localhost', 'me'))
+    assert_equal(c.nsftp, 1)
+    
+    # dropped connections are reconnected
+    c.transport.active = False
+    new = sessions.client('localhost', 'me')
+    assert_false(c is new)
+    assert_true(sftp.get_channel().closed)
+    assert_false(sftp is sessions.sftp('localhost', 'me'))
+    
+    sessions.close_all()
+    assert_false(new.transport.is_active())
+    assert_equal(len(clients), 3)
+
 def test_get_obj():    
     class Args(object):
         def __init__(self, package=None, module='cyclopts.exchange_family', 
@@ -205,3 +379,24 @@ def test_expand_args():
                (0, 1.0, 0.2), (1, 1.0, 0.2), (2, 1.0, 0.2)])
     obs = set([x for x in tools.expand_args(args)])
     assert_equal(obs, exp)
+
+def test_combine_upgrade():
+    # test_out.h5 has a Results table written before the cancelled column
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+    old = os.path.join(base, 'test_out.h5')
+    fnames = [os.path.join(base, 'tmp_{0}.h5'.format(uuid.uuid4())) \
+                  for i in range(2)]
+    with t.open_file(fnames[0], 'w') as f:
+        f.create_table('/', 'Results', 
+                       np.zeros(2, dtype=cycio.ResultTable(f).dt))
+    combine(iter([old, fnames[0]]), new_file=fnames[1])
+    with t.open_file(old, 'r') as f:
+        exp = f.root.Results.read()
+    with t.open_file(fnames[1], 'r') as f:
+        obs = f.root.Results.read()
+    assert_equal(len(obs), len(exp) + 2)
+    assert_equal(list(obs['cancelled']), [False] * len(obs))
+    for name in exp.dtype.names:
+        assert_equal(list(obs[name][:len(exp)]), list(exp[name]))
+    for fname in fnames:
+        os.remove(fname)